@@ -0,0 +1,147 @@
+"""
+Throughput of the sync and the async database paths under many concurrent clients.
+
+    python -m benchmarks.async_database --database-url URL [--stops 10000]
+        [--connections 500] [--duration 20]
+
+The same stop lookup is served by two apps: one with a sync handler running in the
+threadpool on the blocking session, the other with an async handler on the asyncpg
+session. Each app is started in a uvicorn process of its own and flooded with
+requests over `--connections` keep-alive connections. The tables are dropped and
+recreated, so point it to a scratch database.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import re
+import time
+from uuid import UUID
+
+import uvicorn
+from fastapi import Depends, FastAPI
+from open_people_transport.crud.async_services import AsyncStopService
+from open_people_transport.crud.services import StopService
+from open_people_transport.database import async_url, init_models
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .stop_index import load_database, random_stops, report
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Connections to the database kept by either engine
+POOL_SIZE = 20
+
+
+def create_app(mode: str, database_url: str) -> FastAPI:
+    app = FastAPI()
+    if mode == "sync":
+        engine = create_engine(database_url, pool_size=POOL_SIZE, future=True)
+        SessionLocal = sessionmaker(bind=engine, future=True)
+
+        def get_session():
+            with SessionLocal() as session:
+                yield session
+
+        @app.get("/stops/{stop_id}")
+        def read_stop(stop_id: UUID, db: Session = Depends(get_session)):
+            return StopService(db).get(stop_id)
+
+    else:
+        async_engine = create_async_engine(
+            async_url(database_url), pool_size=POOL_SIZE, future=True
+        )
+        AsyncSessionLocal = sessionmaker(
+            bind=async_engine, class_=AsyncSession, future=True
+        )
+
+        async def get_async_session():
+            async with AsyncSessionLocal() as session:
+                yield session
+
+        @app.get("/stops/{stop_id}")
+        async def read_stop(
+            stop_id: UUID, db: AsyncSession = Depends(get_async_session)
+        ):
+            return await AsyncStopService(db).get(stop_id)
+
+    return app
+
+
+def serve(mode: str, database_url: str) -> None:
+    app = create_app(mode, database_url)
+    uvicorn.run(app, host=HOST, port=PORT, log_level="warning", backlog=4096)
+
+
+async def fetch(paths: list[str], deadline: float, timings: list[float]) -> None:
+    """Request random paths over a single keep-alive connection until `deadline`"""
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            request = f"GET {random.choice(paths)} HTTP/1.1\r\nHost: {HOST}\r\n\r\n"
+            writer.write(request.encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            match = re.search(rb"content-length: (\d+)", head, re.IGNORECASE)
+            assert match and head.startswith(b"HTTP/1.1 200")
+            await reader.readexactly(int(match.group(1)))
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+
+async def flood(paths: list[str], connections: int, duration: float) -> list[float]:
+    timings: list[float] = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(fetch(paths, deadline, timings) for _ in range(connections)))
+    return timings
+
+
+async def wait_for_server() -> None:
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection(HOST, PORT)
+        except OSError:
+            await asyncio.sleep(0.1)
+        else:
+            writer.close()
+            return
+    raise RuntimeError("Server did not start")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--stops", type=int, default=10_000)
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+    random.seed(0)
+    init_models()
+
+    stops = random_stops(args.stops)
+    with Session(create_engine(args.database_url, future=True)) as session:
+        load_database(session, stops)
+    paths = [f"/stops/{stop.id}" for stop in stops]
+
+    for mode in ("sync", "async"):
+        server = multiprocessing.Process(target=serve, args=(mode, args.database_url))
+        server.start()
+        try:
+            asyncio.run(wait_for_server())
+            timings = asyncio.run(flood(paths, args.connections, args.duration))
+        finally:
+            server.terminate()
+            server.join()
+        print(
+            f"{mode}: {len(timings) / args.duration:8.0f} requests/s"
+            f" over {args.connections} connections"
+        )
+        report(mode, timings)
+
+
+if __name__ == "__main__":
+    main()
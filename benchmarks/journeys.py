@@ -0,0 +1,119 @@
+"""
+Journey planning on an in-memory routing graph.
+
+    python -m benchmarks.journeys [--sizes 10000 50000 100000] [--queries 200]
+
+The network is a grid of nodes with two stops each, one for every direction, with
+routes running both ways along every other row and column of the grid and between
+random far away points. Journeys are planned between random stops, and again after
+every one of a few routes has been changed, which recompiles the graph.
+"""
+import argparse
+import random
+import statistics
+import time
+from math import isqrt
+from uuid import UUID, uuid4
+
+from open_people_transport.core.models import RouteStop
+from open_people_transport.routing.graph import RoutingGraph
+
+# Distance between neighbouring nodes of the grid, in meters
+SPACING = 300
+
+
+def grid_network(
+    size: int,
+) -> tuple[list[tuple[UUID, UUID]], dict[UUID, list[RouteStop]]]:
+    side = isqrt(size // 2)
+    stops = [[(uuid4(), uuid4()) for _ in range(side)] for _ in range(side)]
+    pairs = []
+    for row in stops:
+        for forth, back in row:
+            node_id = uuid4()
+            pairs += [(forth, node_id), (back, node_id)]
+
+    def route(cells: list[tuple[int, int]], direction: int) -> list[RouteStop]:
+        route_id = uuid4()
+        return [
+            RouteStop(
+                route_id=route_id,
+                stop_id=stops[row][column][direction],
+                distance=i * SPACING,
+            )
+            for i, (row, column) in enumerate(cells)
+        ]
+
+    lines = [[(row, column) for column in range(side)] for row in range(0, side, 2)]
+    lines += [[(row, column) for row in range(side)] for column in range(1, side, 2)]
+    for _ in range(side):
+        row, column = random.randrange(side), random.randrange(side)
+        cells = []
+        while 0 <= row < side and 0 <= column < side and len(cells) < side:
+            cells.append((row, column))
+            row, column = (
+                (row + 1, column) if random.random() < 0.5 else (row, column + 1)
+            )
+        lines.append(cells)
+    routes = {}
+    for cells in lines:
+        for direction, ordered in enumerate((cells, cells[::-1])):
+            values = route(ordered, direction)
+            routes[values[0].route_id] = values
+    return pairs, routes
+
+
+def measure(graph: RoutingGraph, stop_ids: list[UUID], queries: int) -> list[float]:
+    timings = []
+    for _ in range(queries):
+        from_stop, to_stop = random.sample(stop_ids, 2)
+        start = time.perf_counter()
+        graph.plan(from_stop, to_stop)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(
+        f"  {name:<8} mean {statistics.mean(timings):8.3f} ms"
+        f"   p50 {timings[len(timings) // 2]:8.3f} ms   p99 {p99:8.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000]
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    random.seed(0)
+
+    for size in args.sizes:
+        pairs, routes = grid_network(size)
+        route_stops = [value for values in routes.values() for value in values]
+        print(
+            f"{len(pairs)} stops, {len(routes)} routes, {len(route_stops)} route stops"
+        )
+        graph = RoutingGraph()
+        start = time.perf_counter()
+        graph.build(pairs, route_stops)
+        graph.plan(pairs[0][0], pairs[1][0])
+        print(f"  graph built in {time.perf_counter() - start:.2f} s")
+        stop_ids = [stop_id for stop_id, _ in pairs]
+        report("query", measure(graph, stop_ids, args.queries))
+
+        timings = []
+        for route_id in random.sample(list(routes), 20):
+            values = routes[route_id][:-1]
+            start = time.perf_counter()
+            graph.set_route(route_id, values)
+            graph.plan(*random.sample(stop_ids, 2))
+            timings.append((time.perf_counter() - start) * 1000)
+        report("rewrite", timings)
+
+
+if __name__ == "__main__":
+    main()
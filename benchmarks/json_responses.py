@@ -0,0 +1,101 @@
+"""
+Serialization of large list responses, by FastAPI and by the fast path.
+
+    python -m benchmarks.json_responses [--stops 100000] [--requests 10]
+
+`GET /stops/` is served from a list of core stops held in memory, so only what
+happens after the service returns is measured. The default path validates the stops
+against the response model and converts them with `jsonable_encoder` before rendering
+them with the standard library, while the fast path renders them with orjson as they
+are. Requests are passed to the apps in-process, with no server or network involved.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Any
+
+from fastapi import APIRouter, FastAPI, Request, Response
+from open_people_transport.core.models import Stop
+from open_people_transport.rest.responses import FastJSONResponse, render
+
+from .stop_index import random_stops, report
+
+
+def create_app(mode: str, stops: list[Stop]) -> FastAPI:
+    app = FastAPI()
+    if mode == "default":
+        router = APIRouter(prefix="/stops")
+
+        @router.get("/", response_model=list[Stop])
+        async def read_stops():
+            return stops
+
+    else:
+        router = APIRouter(prefix="/stops", default_response_class=FastJSONResponse)
+
+        @router.get("/", response_model=list[Stop])
+        async def read_stops(request: Request, response: Response):
+            return render(request, response, stops)
+
+    app.include_router(router)
+    return app
+
+
+async def get(app: FastAPI, path: str) -> bytes:
+    """Body of the response of `app` to a GET request of `path`"""
+    scope: dict[str, Any] = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 80),
+        "client": ("localhost", 12345),
+    }
+    body = bytearray()
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        if message["type"] == "http.response.body":
+            body.extend(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return bytes(body)
+
+
+async def measure(app: FastAPI, requests: int) -> tuple[list[float], bytes]:
+    timings, body = [], b""
+    for _ in range(requests):
+        start = time.perf_counter()
+        body = await get(app, "/stops/")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stops", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+    random.seed(0)
+
+    stops = random_stops(args.stops)
+    bodies = []
+    print(f"GET /stops/ with {args.stops} stops")
+    for mode in ("default", "fast"):
+        timings, body = asyncio.run(measure(create_app(mode, stops), args.requests))
+        bodies.append(body)
+        report(mode, timings)
+    assert bodies[0] == bodies[1], "Both paths have to render the same body"
+    print(f"  {len(bodies[0]) / 1e6:.1f} MB per response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Reading lists: ORM entities versus projections of plain rows onto core models.
+
+    python -m benchmarks.projections --database-url URL [--rows 100000] [--runs 5]
+
+Routes and stops are read the way the services used to, as ORM instances copied into
+core models, and through their projections. Memory is traced on a separate run from
+the timed ones, and its peak is reported per row read. The tables are dropped and
+recreated, so point the benchmark to a scratch database.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import Any, Callable
+from uuid import uuid4
+
+from open_people_transport.core.models import Route
+from open_people_transport.crud.services import RouteService, StopService
+from open_people_transport.database import init_models
+from open_people_transport.database.models import Route as SQLRoute
+from open_people_transport.database.models import Stop as SQLStop
+from open_people_transport.database.models import Type as SQLType
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .stop_index import load_database, random_stops
+
+
+def load_routes(session: Session, count: int) -> None:
+    session.execute(insert(SQLType), [{"name": "bus"}])
+    rows = [
+        {"id": uuid4(), "number": str(i % 10**6), "type_name": "bus"}
+        for i in range(count)
+    ]
+    session.execute(insert(SQLRoute), rows)
+    session.commit()
+
+
+def read_entities(session: Session, model: Any, convert: Callable[[Any], Any]) -> list:
+    return list(map(convert, session.scalars(select(model)).all()))
+
+
+def measure(engine: Engine, read: Callable[[Session], list], runs: int) -> None:
+    best = float("inf")
+    for _ in range(runs):
+        with Session(engine, future=True) as session:
+            start = time.perf_counter()
+            rows = len(read(session))
+            best = min(best, time.perf_counter() - start)
+    with Session(engine, future=True) as session:
+        gc.collect()
+        tracemalloc.start()
+        read(session)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"    {best / rows * 1e6:6.2f} µs and {peak / rows:7.0f} B per row")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    random.seed(0)
+    init_models()
+    engine = create_engine(args.database_url, future=True)
+    with Session(engine, future=True) as session:
+        load_database(session, random_stops(args.rows))
+        load_routes(session, args.rows)
+
+    readers: dict[str, Callable[[Session], list]] = {
+        "routes, entities": lambda session: read_entities(
+            session, SQLRoute, Route.from_orm
+        ),
+        "routes, projection": lambda session: RouteService(session).list(),
+        "stops, entities": lambda session: read_entities(
+            session, SQLStop, StopService.model_to_schema
+        ),
+        "stops, projection": lambda session: StopService(session).list(),
+    }
+    print(f"Reading {args.rows} rows")
+    for name, read in readers.items():
+        print(f"  {name}")
+        measure(engine, read, args.runs)
+
+
+if __name__ == "__main__":
+    main()
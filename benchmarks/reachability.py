@@ -0,0 +1,60 @@
+"""
+Reachability searches on an in-memory routing graph.
+
+    python -m benchmarks.reachability [--size 50000] [--queries 100] [--origins 2000]
+
+Uses the grid network of the journey planning benchmark. Single searches start from
+random stops, and a sweep counts the nodes reachable from many origins, first in one
+process and then in a pool of worker processes.
+"""
+import argparse
+import random
+import time
+
+from open_people_transport.routing.graph import RoutingGraph
+
+from .journeys import grid_network, report
+
+LIMITS = [(2_000, 0), (5_000, 1), (20_000, 2)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--origins", type=int, default=2_000)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    random.seed(0)
+
+    pairs, routes = grid_network(args.size)
+    graph = RoutingGraph()
+    graph.build(pairs, [value for values in routes.values() for value in values])
+    stop_ids = [stop_id for stop_id, _ in pairs]
+    print(f"{len(pairs)} stops, {len(routes)} routes")
+
+    for distance, transfers in LIMITS:
+        timings, found = [], 0
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            found += len(
+                graph.reachable([random.choice(stop_ids)], distance, transfers)
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"  {distance} m, {transfers} transfers: {found // args.queries} stops")
+        report("search", timings)
+
+    origins = random.sample(stop_ids, args.origins)
+    start = time.perf_counter()
+    for stop_id in origins:
+        graph.reachable([stop_id], 5_000, 1)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    graph.sweep(origins, 5_000, 1, args.processes)
+    parallel = time.perf_counter() - start
+    print(f"  sweep of {args.origins} origins: {serial:.2f} s serial")
+    print(f"  sweep of {args.origins} origins: {parallel:.2f} s in a process pool")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Reading stop coordinates: parsing WKB with Shapely versus ST_Y/ST_X in the query.
+
+    python -m benchmarks.stop_coordinates [--stops 100000] [--runs 5] [--database-url URL]
+
+Stops are first turned into core models from rows as the driver returns them, either
+with the location as WKB or with the coordinates as floats. With a database URL the
+whole read of `GET /stops/` is measured as well; its tables are dropped and recreated,
+so point it to a scratch database.
+"""
+import argparse
+import random
+import time
+from typing import Any, Callable
+
+import geoalchemy2.shape
+import shapely.geometry.point
+from open_people_transport.core.models import Stop
+from open_people_transport.crud.services import StopService
+from open_people_transport.database import init_models
+from open_people_transport.database.models import Stop as SQLStop
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from .stop_index import load_database, random_stops
+
+
+def from_wkb(row: Any) -> Stop:
+    id, node_id, location = row
+    shape = geoalchemy2.shape.to_shape(location)
+    return Stop(id=id, lat=shape.y, lon=shape.x, node_id=node_id)
+
+
+def from_floats(row: Any) -> Stop:
+    id, node_id, lat, lon = row
+    return Stop(id=id, lat=lat, lon=lon, node_id=node_id)
+
+
+def measure(read: Callable[[], list[Stop]], runs: int) -> tuple[float, list[Stop]]:
+    """Best throughput of `read` in stops per second, with the stops it read"""
+    best, stops = 0.0, []
+    for _ in range(runs):
+        start = time.perf_counter()
+        stops = read()
+        best = max(best, len(stops) / (time.perf_counter() - start))
+    return best, stops
+
+
+def report(name: str, throughput: float) -> None:
+    print(f"  {name:<6} {throughput:12,.0f} stops/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stops", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+    random.seed(0)
+    stops = random_stops(args.stops)
+
+    print(f"Decoding {args.stops} rows")
+    wkb_rows = [
+        (
+            stop.id,
+            stop.node_id,
+            geoalchemy2.shape.from_shape(
+                shapely.geometry.point.Point(stop.lon, stop.lat), srid=4326
+            ),
+        )
+        for stop in stops
+    ]
+    float_rows = [(stop.id, stop.node_id, stop.lat, stop.lon) for stop in stops]
+    wkb, decoded = measure(lambda: list(map(from_wkb, wkb_rows)), args.runs)
+    report("wkb", wkb)
+    assert decoded == stops
+    floats, decoded = measure(lambda: list(map(from_floats, float_rows)), args.runs)
+    report("floats", floats)
+    assert decoded == stops
+    print(f"  {floats / wkb:.1f}x")
+
+    if args.database_url:
+        init_models()
+        engine = create_engine(args.database_url, future=True)
+        print(f"Reading {args.stops} stops")
+        with Session(engine, future=True) as session:
+            load_database(session, stops)
+            query = select(SQLStop.id, SQLStop.node_id, SQLStop.location)
+            wkb, wkb_stops = measure(
+                lambda: list(map(from_wkb, session.execute(query).all())), args.runs
+            )
+            report("wkb", wkb)
+            sql, sql_stops = measure(StopService(session).list, args.runs)
+            report("sql", sql)
+            assert sorted(wkb_stops, key=str) == sorted(sql_stops, key=str)
+            print(f"  {sql / wkb:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Nearby stop lookups: in-memory stop index versus the PostGIS query.
+
+    python -m benchmarks.stop_index [--sizes 10000 100000 1000000] [--database-url URL]
+
+Stops are scattered over a city-sized area and every query asks for the 20 nearest
+stops within 500 meters of a random point. The SQL path only runs when a database URL
+is given; its tables are dropped and recreated, so point it to a scratch database.
+"""
+import argparse
+import random
+import statistics
+import time
+from io import StringIO
+from uuid import uuid4
+
+from open_people_transport.core.models import Stop
+from open_people_transport.crud.services import StopService
+from open_people_transport.database import BaseModel, init_models
+from open_people_transport.spatial.index import StopIndex
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+SOUTH, NORTH = 55.55, 55.95
+WEST, EAST = 37.35, 37.85
+RADIUS = 500
+LIMIT = 20
+
+
+def random_point() -> tuple[float, float]:
+    return random.uniform(SOUTH, NORTH), random.uniform(WEST, EAST)
+
+
+def random_stops(count: int) -> list[Stop]:
+    node_id = uuid4()
+    return [
+        Stop(id=uuid4(), node_id=node_id, lat=round(lat, 7), lon=round(lon, 7))
+        for lat, lon in (random_point() for _ in range(count))
+    ]
+
+
+def measure(lookup, queries: int) -> list[float]:
+    timings = []
+    for _ in range(queries):
+        lat, lon = random_point()
+        start = time.perf_counter()
+        lookup(lat, lon)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(
+        f"  {name:<6} mean {statistics.mean(timings):8.3f} ms"
+        f"   p50 {timings[len(timings) // 2]:8.3f} ms   p99 {p99:8.3f} ms"
+    )
+
+
+def load_database(session: Session, stops: list[Stop]) -> None:
+    engine = session.get_bind()
+    BaseModel.metadata.drop_all(bind=engine)
+    BaseModel.metadata.create_all(bind=engine)
+    cursor = session.connection().connection.cursor()
+    cursor.execute(
+        "INSERT INTO node (id, name) VALUES (%s, 'Benchmark')", (str(stops[0].node_id),)
+    )
+    rows = StringIO()
+    for stop in stops:
+        rows.write(
+            f"{stop.id}\t{stop.node_id}\tSRID=4326;POINT({stop.lon} {stop.lat})\n"
+        )
+    rows.seek(0)
+    cursor.copy_expert("COPY stop (id, node_id, location) FROM STDIN", rows)
+    session.commit()
+    cursor.execute("ANALYZE stop")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+    random.seed(0)
+    init_models()
+    engine = args.database_url and create_engine(args.database_url, future=True)
+
+    for size in args.sizes:
+        print(f"{size} stops")
+        stops = random_stops(size)
+        index = StopIndex(0.01)
+        start = time.perf_counter()
+        index.build(stops)
+        print(f"  index built in {time.perf_counter() - start:.2f} s")
+        report(
+            "index",
+            measure(
+                lambda lat, lon: index.within(lat, lon, RADIUS, LIMIT), args.queries
+            ),
+        )
+        if engine:
+            with Session(engine, future=True) as session:
+                load_database(session, stops)
+                service = StopService(session)
+                report(
+                    "sql",
+                    measure(
+                        lambda lat, lon: service.nearby(lat, lon, RADIUS, LIMIT),
+                        args.queries,
+                    ),
+                )
+
+
+if __name__ == "__main__":
+    main()
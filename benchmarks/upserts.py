@@ -0,0 +1,97 @@
+"""
+Create-or-update writes: ORM get, change, commit and refresh versus one upsert.
+
+    python -m benchmarks.upserts --database-url URL [--writes 5000]
+
+Nodes and routes are first created and then updated, one commit per write as a PUT
+does, both the way the services used to write them and through the services. The
+tables are dropped and recreated, so point the benchmark to a scratch database.
+"""
+import argparse
+import random
+import time
+from string import digits
+from typing import Any, Callable
+
+from open_people_transport.core.models import Node, Route
+from open_people_transport.crud.services import NodeService, RouteService
+from open_people_transport.database import BaseModel, init_models
+from open_people_transport.database.models import Node as SQLNode
+from open_people_transport.database.models import Route as SQLRoute
+from open_people_transport.database.models import Type as SQLType
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+
+def orm_update(session: Session, model: Any, schema: Any) -> Callable[[Any], Any]:
+    def update(new: Any) -> Any:
+        row = session.get(model, new.id)
+        if row is None:
+            row = model(id=new.id)
+            session.add(row)
+        for name, value in new.dict().items():
+            setattr(row, name, value)
+        session.commit()
+        session.refresh(row)
+        return schema.from_orm(row)
+
+    return update
+
+
+def random_number() -> str:
+    return "".join(random.choice(digits) for _ in range(6))
+
+
+def measure(write: Callable[[Any], Any], values: list[Any]) -> float:
+    """Writes per second of `values` with `write`"""
+    start = time.perf_counter()
+    for value in values:
+        write(value)
+    return len(values) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--writes", type=int, default=5000)
+    args = parser.parse_args()
+    random.seed(0)
+    init_models()
+    engine = create_engine(args.database_url, future=True)
+    BaseModel.metadata.drop_all(bind=engine)
+    BaseModel.metadata.create_all(bind=engine)
+    with Session(engine, future=True) as session:
+        session.add(SQLType(name="bus"))
+        session.commit()
+
+    writers = {
+        "nodes": (
+            lambda session: orm_update(session, SQLNode, Node),
+            lambda session: NodeService(session).update,
+            lambda: Node(name=random_number()),
+            lambda node: node.copy(update={"name": random_number()}),
+        ),
+        "routes": (
+            lambda session: orm_update(session, SQLRoute, Route),
+            lambda session: RouteService(session).update,
+            lambda: Route(number=random_number(), type_name="bus"),
+            lambda route: route.copy(update={"number": random_number()}),
+        ),
+    }
+    print(f"{args.writes} writes of each kind")
+    for name, (orm, upsert, create, change) in writers.items():
+        print(f"  {name}")
+        for mode, writer in (("orm", orm), ("upsert", upsert)):
+            created = [create() for _ in range(args.writes)]
+            changed = list(map(change, created))
+            with Session(engine, future=True) as session:
+                write = writer(session)
+                inserts = measure(write, created)
+                updates = measure(write, changed)
+            print(
+                f"    {mode:<6} {inserts:8,.0f} inserts/s   {updates:8,.0f} updates/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
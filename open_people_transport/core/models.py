@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from decimal import Decimal
+from typing import Any, Optional
 from uuid import UUID
 
 import pydantic
@@ -56,6 +57,17 @@ class Stop(BaseModel):
         orm_mode = False
 
 
+class NearbyStop(Stop):
+    """
+    A stop found near a point, along with its distance from it.
+    """
+
+    distance: float = Field(
+        example="120.5",
+        description="Distance in meters from the requested point to this stop",
+    )
+
+
 class RouteStop(BaseModel):
     """
     A link between a route and a stop.
@@ -67,3 +79,60 @@ class RouteStop(BaseModel):
         example="100",
         description="Distance in meters from the start of the route to this stop",
     )
+
+
+class Transfer(BaseModel):
+    """
+    A walk from one stop to another one nearby.
+    """
+
+    from_stop_id: UUID
+    to_stop_id: UUID
+    distance: int = Field(example="150", description="Walking distance in meters")
+    duration: int = Field(example="125", description="Walking time in seconds")
+
+
+class JourneyLeg(BaseModel):
+    """
+    A part of a journey ridden along a single route.
+    """
+
+    route_id: UUID
+    from_stop_id: UUID
+    to_stop_id: UUID
+    distance: int = Field(example="1200", description="Distance ridden in meters")
+
+
+class Journey(BaseModel):
+    """
+    A way of getting from one stop to another along the routes, changing between
+    them at the stops of the same node.
+    """
+
+    from_stop_id: UUID
+    to_stop_id: UUID
+    distance: int = Field(example="5400", description="Total distance in meters")
+    legs: list[JourneyLeg]
+
+
+class ReachableStop(BaseModel):
+    """
+    A stop that can be reached from the origin of a reachability search.
+    """
+
+    stop_id: UUID
+    distance: int = Field(example="2400", description="Distance ridden in meters")
+    transfers: int = Field(example="1", description="Changes between routes")
+
+
+class Reachability(BaseModel):
+    """
+    All stops that can be reached from some stops within a distance and a number of
+    changes between routes.
+    """
+
+    from_stop_ids: list[UUID]
+    stops: list[ReachableStop]
+    hull: Optional[dict[str, Any]] = Field(
+        None, description="GeoJSON polygon around the reachable stops"
+    )
@@ -0,0 +1,199 @@
+"""
+Services for async sessions.
+
+Every method runs its counterpart from `services` on the sync session behind an
+`AsyncSession`, whose queries are then awaited on the event loop instead of blocking a
+worker thread, so the logic of the services is kept in one place. Streams are the
+exception, since they are iterated on the event loop while the response is sent, and
+so are journey searches, which make no queries but would hold the event loop up: they
+are left to the thread pool of the sync endpoints.
+"""
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Callable, Generic, Optional, TypeVar
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+from open_people_transport.core.models import Journey as CoreJourney
+from open_people_transport.core.models import NearbyStop as CoreNearbyStop
+from open_people_transport.core.models import Node as CoreNode
+from open_people_transport.core.models import Route as CoreRoute
+from open_people_transport.core.models import RouteStop as CoreRouteStop
+from open_people_transport.core.models import Stop as CoreStop
+from open_people_transport.core.models import Transfer as CoreTransfer
+from open_people_transport.core.models import Type as CoreType
+from open_people_transport.settings import get_settings
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .services import (
+    JourneyService,
+    NodeService,
+    RouteService,
+    RouteStopService,
+    Service,
+    StopService,
+    TransferService,
+    TypeService,
+)
+
+S = TypeVar("S", bound=Service)
+T = TypeVar("T")
+
+
+class AsyncService(Generic[S]):
+    service: type[S]
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def _run(self, method: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        def call(session: Session) -> T:
+            return method(self.service(session), *args, **kwargs)
+
+        return await self.session.run_sync(call)
+
+
+class AsyncTypeService(AsyncService[TypeService]):
+    service = TypeService
+
+    async def list(
+        self, limit: Optional[int] = None, after: Optional[str] = None
+    ) -> list[CoreType]:
+        return await self._run(TypeService.list, limit, after)
+
+    async def get(self, name: str) -> CoreType:
+        return await self._run(TypeService.get, name)
+
+    async def create(self, new: CoreType) -> CoreType:
+        return await self._run(TypeService.create, new)
+
+    async def update(self, name: str, new: CoreType) -> CoreType:
+        return await self._run(TypeService.update, name, new)
+
+    async def delete(self, name: str) -> None:
+        return await self._run(TypeService.delete, name)
+
+
+class AsyncRouteService(AsyncService[RouteService]):
+    service = RouteService
+
+    async def list(
+        self, limit: Optional[int] = None, after: Optional[UUID] = None
+    ) -> list[CoreRoute]:
+        return await self._run(RouteService.list, limit, after)
+
+    async def get(self, id: UUID) -> CoreRoute:
+        return await self._run(RouteService.get, id)
+
+    async def update(self, new: CoreRoute) -> CoreRoute:
+        return await self._run(RouteService.update, new)
+
+    async def delete(self, id: UUID) -> None:
+        return await self._run(RouteService.delete, id)
+
+
+class AsyncNodeService(AsyncService[NodeService]):
+    service = NodeService
+
+    async def list(
+        self, limit: Optional[int] = None, after: Optional[UUID] = None
+    ) -> list[CoreNode]:
+        return await self._run(NodeService.list, limit, after)
+
+    async def get(self, id: UUID) -> CoreNode:
+        return await self._run(NodeService.get, id)
+
+    async def update(self, new: CoreNode) -> CoreNode:
+        return await self._run(NodeService.update, new)
+
+    async def delete(self, id: UUID) -> None:
+        return await self._run(NodeService.delete, id)
+
+
+class AsyncStopService(AsyncService[StopService]):
+    service = StopService
+
+    async def list(
+        self, limit: Optional[int] = None, after: Optional[UUID] = None
+    ) -> list[CoreStop]:
+        return await self._run(StopService.list, limit, after)
+
+    def stream(
+        self, limit: Optional[int] = None, after: Optional[UUID] = None
+    ) -> AsyncIterator[list[CoreStop]]:
+        query = StopService.list_query(limit, after)
+        batch_size = get_settings().stream_batch_size
+        return StopService.projection.stream(self.session, query, batch_size)
+
+    async def get(self, id: UUID) -> CoreStop:
+        return await self._run(StopService.get, id)
+
+    async def update(self, new: CoreStop) -> CoreStop:
+        return await self._run(StopService.update, new)
+
+    async def delete(self, id: UUID) -> None:
+        return await self._run(StopService.delete, id)
+
+    async def nearby(
+        self, lat: float, lon: float, radius: float, limit: int
+    ) -> list[CoreNearbyStop]:
+        return await self._run(StopService.nearby, lat, lon, radius, limit)
+
+
+class AsyncRouteStopService(AsyncService[RouteStopService]):
+    service = RouteStopService
+
+    async def list(
+        self,
+        route_id: Optional[UUID] = None,
+        stop_id: Optional[UUID] = None,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> list[CoreRouteStop]:
+        return await self._run(RouteStopService.list, route_id, stop_id, limit, after)
+
+    def stream(
+        self,
+        route_id: Optional[UUID] = None,
+        stop_id: Optional[UUID] = None,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> AsyncIterator[list[CoreRouteStop]]:
+        query = RouteStopService.list_query(route_id, stop_id, limit, after)
+        batch_size = get_settings().stream_batch_size
+        return RouteStopService.projection.stream(self.session, query, batch_size)
+
+    async def get(self, route_id: UUID, stop_id: UUID) -> CoreRouteStop:
+        return await self._run(RouteStopService.get, route_id, stop_id)
+
+    async def create(
+        self,
+        route_id: UUID,
+        stop_id: UUID,
+        after_stop: Optional[UUID] = None,
+    ) -> CoreRouteStop:
+        return await self._run(RouteStopService.create, route_id, stop_id, after_stop)
+
+    async def replace(
+        self, route_id: UUID, stop_ids: list[UUID]
+    ) -> list[CoreRouteStop]:
+        return await self._run(RouteStopService.replace, route_id, stop_ids)
+
+    async def delete(self, route_id: UUID, stop_id: UUID) -> None:
+        return await self._run(RouteStopService.delete, route_id, stop_id)
+
+
+class AsyncJourneyService(AsyncService[JourneyService]):
+    service = JourneyService
+
+    async def plan(self, from_stop: UUID, to_stop: UUID) -> CoreJourney:
+        graph = await self._run(JourneyService._graph, (from_stop, to_stop))
+        return await run_in_threadpool(JourneyService.search, graph, from_stop, to_stop)
+
+
+class AsyncTransferService(AsyncService[TransferService]):
+    service = TransferService
+
+    async def list(self, stop_id: UUID) -> list[CoreTransfer]:
+        return await self._run(TransferService.list, stop_id)
@@ -63,3 +63,16 @@ class DatabaseIntegrityViolated(ResourceException):
             "resource_type": self.resource_type.__name__,
             "details": str(self.details),
         }
+
+
+@dataclass
+class InvalidFeed(ResourceException):
+    """Transit feed could not be read"""
+
+    details: Any
+
+    def asdict(self) -> dict:
+        return {
+            "description": self.__doc__,
+            "details": str(self.details),
+        }
@@ -0,0 +1,221 @@
+"""
+Coherence of the in-process caches of all workers.
+
+Triggers announce every statement that changes rows of the main tables on a PostgreSQL
+channel, with the table and the primary keys of the rows, or without them if there are
+too many. Every worker listens to the channel on a connection of its own in a thread,
+and brings its caches up to date in batches: the versions of the changed tables are
+bumped, and the stop index and the routing graph are patched with the changed rows, or
+rebuilt when too many of them changed at once.
+"""
+import json
+import logging
+import selectors
+from dataclasses import dataclass
+from functools import lru_cache
+from threading import Event, Thread
+from typing import Callable, Optional
+from uuid import UUID
+
+from open_people_transport.database import SessionLocal
+from open_people_transport.database.models import Node as SQLNode
+from open_people_transport.database.models import Route as SQLRoute
+from open_people_transport.database.models import RouteStop as SQLRouteStop
+from open_people_transport.database.models import Stop as SQLStop
+from open_people_transport.database.models import Type as SQLType
+from open_people_transport.routing.graph import get_routing_graph
+from open_people_transport.settings import get_settings
+from open_people_transport.spatial.index import get_stop_index
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from .services import JourneyService, RouteStopService, StopService
+from .versions import get_table_versions
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "table_changes"
+
+MODELS = {
+    model.__tablename__: model
+    for model in (SQLType, SQLRoute, SQLNode, SQLStop, SQLRouteStop)
+}
+
+
+@dataclass(frozen=True)
+class Change:
+    table: str
+    operation: str
+    # Primary keys of the changed rows, or None if there were too many to send
+    keys: Optional[tuple[tuple[str, ...], ...]]
+
+    @classmethod
+    def parse(cls, payload: str) -> "Change":
+        value = json.loads(payload)
+        keys = value["keys"]
+        if keys is not None:
+            keys = tuple(map(tuple, keys))
+        return cls(value["table"], value["operation"], keys)
+
+
+class ChangeListener:
+    """Thread handing the changes announced on `CHANNEL` to `apply` in batches"""
+
+    # Time to wait for more changes before applying a batch, in seconds
+    QUIET_TIME = 0.05
+    # Time to wait before connecting again after losing the connection, in seconds
+    RETRY_TIME = 5
+
+    def __init__(
+        self,
+        url: str,
+        apply: Callable[[list[Change]], None],
+        reset: Callable[[], None],
+        batch_size: int = 10_000,
+    ) -> None:
+        self.url = url
+        self.apply = apply
+        # Called instead of `apply` when changes may have been missed
+        self.reset = reset
+        self.batch_size = batch_size
+        # Set for as long as the thread listens to the channel
+        self.listening = Event()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="change-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        engine = create_engine(self.url, poolclass=NullPool, future=True)
+        connected = False
+        while not self._stopped.is_set():
+            try:
+                connection = engine.raw_connection()
+            except SQLAlchemyError:
+                logger.warning("Could not listen to table changes", exc_info=True)
+                self._stopped.wait(self.RETRY_TIME)
+                continue
+            try:
+                dbapi_connection = connection.dbapi_connection
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                if connected:
+                    # Changes made while reconnecting were not heard of
+                    self.reset()
+                connected = True
+                self.listening.set()
+                self._listen(dbapi_connection)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning("Stopped listening to table changes", exc_info=True)
+                self.listening.clear()
+                self._stopped.wait(self.RETRY_TIME)
+            finally:
+                self.listening.clear()
+                connection.invalidate()
+        engine.dispose()
+
+    def _listen(self, dbapi_connection) -> None:
+        changes: list[Change] = []
+        with selectors.DefaultSelector() as selector:
+            selector.register(dbapi_connection, selectors.EVENT_READ)
+            while not self._stopped.is_set():
+                # Changes come in bursts, which are gathered until they stop
+                if selector.select(self.QUIET_TIME if changes else 1):
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notify = dbapi_connection.notifies.pop(0)
+                        changes.append(Change.parse(notify.payload))
+                    if len(changes) < self.batch_size:
+                        continue
+                if changes:
+                    self.apply(changes)
+                    changes = []
+
+
+def apply_changes(
+    changes: list[Change], sessions: Callable[[], Session] = SessionLocal
+) -> None:
+    """
+    Bring the caches of this worker up to date with rows changed elsewhere, read with
+    sessions made by `sessions`
+    """
+    tables = {change.table for change in changes}
+    get_table_versions().bump(*(MODELS[table] for table in tables))
+    index, graph = get_stop_index(), get_routing_graph()
+    changes = [
+        change for change in changes if change.table in ("stop", "route", "route_stop")
+    ]
+    if not (index.ready or graph.ready) or not changes:
+        return
+    # Statements sent without their keys changed too many rows to patch them
+    batch_size = get_settings().change_batch_size
+    rows = sum(
+        batch_size if change.keys is None else len(change.keys) for change in changes
+    )
+    if rows >= batch_size:
+        rebuild_caches(sessions)
+        return
+    stop_ids, route_ids = set(), set()
+    for change in changes:
+        for key in change.keys or ():
+            if change.table == "stop":
+                stop_ids.add(UUID(key[0]))
+            else:
+                route_ids.add(UUID(key[0]))
+    with sessions() as session:
+        query = select(SQLStop).where(SQLStop.id.in_(stop_ids))
+        stops = {stop.id: stop for stop in session.scalars(query)}
+        for stop_id in stop_ids:
+            stop = stops.get(stop_id)
+            if stop is None:
+                if index.ready:
+                    index.remove(stop_id)
+                if graph.ready:
+                    graph.remove_stop(stop_id)
+                continue
+            if index.ready:
+                index.add(StopService.model_to_schema(stop))
+            if graph.ready:
+                graph.set_stop(stop_id, stop.node_id)
+        if not graph.ready:
+            return
+        query = select(SQLRoute.id).where(SQLRoute.id.in_(route_ids))
+        existing = set(session.scalars(query))
+        for route_id in route_ids:
+            if route_id in existing:
+                graph.set_route(route_id, RouteStopService(session).list(route_id))
+            else:
+                graph.remove_route(route_id)
+
+
+def rebuild_caches(sessions: Callable[[], Session] = SessionLocal) -> None:
+    """Invalidate all caches of this worker and rebuild its in-memory structures"""
+    get_table_versions().bump(*MODELS.values())
+    with sessions() as session:
+        if (index := get_stop_index()).ready:
+            index.build(StopService(session).list())
+        if (graph := get_routing_graph()).ready:
+            JourneyService(session).build_graph(graph)
+
+
+@lru_cache
+def get_change_listener() -> ChangeListener:
+    settings = get_settings()
+    return ChangeListener(
+        settings.notify_url or settings.postgres_url,
+        apply_changes,
+        rebuild_caches,
+        settings.change_batch_size,
+    )
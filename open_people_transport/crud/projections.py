@@ -0,0 +1,58 @@
+"""
+Read-only projections of tables onto core models.
+
+A projection selects just the columns that a core model is made of and reads them as
+plain rows on the connection of a session. No ORM instances are made, so nothing is
+put in the identity map or tracked for changes, and the session does not flush before
+the query, which makes projections suited to reads only.
+"""
+from typing import AsyncIterator, Generic, Optional, TypeVar
+
+import pydantic
+from open_people_transport.database import BaseModel
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+M = TypeVar("M", bound=pydantic.BaseModel)
+
+
+class Projection(Generic[M]):
+    def __init__(self, schema: type[M], model: type[BaseModel]) -> None:
+        self.schema = schema
+        self.model = model
+        # Every field of the schema is read from the column or the SQL expression that
+        # the model maps under the same name
+        self.columns = [
+            getattr(model, name).expression.label(name) for name in schema.__fields__
+        ]
+
+    def select(self) -> Select:
+        return select(*self.columns)
+
+    def row_to_schema(self, row: Row) -> M:
+        return self.schema(**row._mapping)
+
+    def all(self, session: Session, query: Select) -> list[M]:
+        rows = session.connection().execute(query).all()
+        return list(map(self.row_to_schema, rows))
+
+    def one_or_none(self, session: Session, query: Select) -> Optional[M]:
+        row = session.connection().execute(query).one_or_none()
+        return None if row is None else self.row_to_schema(row)
+
+    async def stream(
+        self, session: AsyncSession, query: Select, batch_size: int
+    ) -> AsyncIterator[list[M]]:
+        """
+        Results of `query` in batches of up to `batch_size`, read from a server-side
+        cursor as they are needed, so that only one batch is held at a time
+        """
+        connection = await session.connection()
+        result = await connection.stream(
+            query.execution_options(max_row_buffer=batch_size)
+        )
+        async for rows in result.partitions(batch_size):
+            yield list(map(self.row_to_schema, rows))
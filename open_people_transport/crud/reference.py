@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional, TypeVar, Union
+
+from open_people_transport.database import BaseModel
+from open_people_transport.database.replicas import reads_from_replica
+from open_people_transport.settings import get_settings
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .versions import get_table_versions
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class _Entry:
+    version: int
+    expires: float
+    value: Any
+
+
+class ReferenceCache:
+    """
+    Rows of small tables that are read far more often than they are written, by
+    primary key.
+
+    Rows are dropped once their table has been written to, and after `ttl` seconds in
+    any case, to catch up with writes this process has not heard of. Rows read from a
+    replica are not put in the cache, since it may not have caught up with the writes
+    that this process has heard of yet.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, Hashable], _Entry] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, model: type[BaseModel], key: Hashable) -> Optional[Any]:
+        table = model.__tablename__
+        (version,) = get_table_versions().get([table])
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is None or entry.version != version:
+                self.misses += 1
+                return None
+            if entry.expires < time.monotonic():
+                del self._entries[table, key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end((table, key))
+            self.hits += 1
+            return entry.value
+
+    def version(self, model: type[BaseModel]) -> int:
+        """Version of the table of `model`, to be taken before reading rows from it"""
+        (version,) = get_table_versions().get([model.__tablename__])
+        return version
+
+    def put(self, model: type[BaseModel], key: Hashable, value: T, version: int) -> T:
+        if self.size <= 0:
+            return value
+        entry = _Entry(version, time.monotonic() + self.ttl, value)
+        with self._lock:
+            self._entries[model.__tablename__, key] = entry
+            self._entries.move_to_end((model.__tablename__, key))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def load(
+        self,
+        model: type[BaseModel],
+        key: Hashable,
+        load: Callable[[], Optional[T]],
+        session: Union[Session, AsyncSession],
+    ) -> Optional[T]:
+        """
+        Row of `model` with the primary key `key`, loaded with `load` from `session` if
+        not cached
+        """
+        value = self.get(model, key)
+        if value is None:
+            version = self.version(model)
+            value = load()
+            if value is not None and not reads_from_replica(session):
+                self.put(model, key, value, version)
+        return value
+
+    def statistics(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+@lru_cache
+def get_reference_cache() -> ReferenceCache:
+    settings = get_settings()
+    return ReferenceCache(settings.reference_cache_size, settings.reference_cache_ttl)
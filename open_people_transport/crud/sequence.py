@@ -0,0 +1,180 @@
+"""
+Ordering of the stops along a route.
+
+The stops of a route are ordered by their `distance`. A stop inserted between two
+others takes the position halfway between them, found with two lookups on the
+`(route_id, distance)` index, so inserting costs O(log n) whatever the route length.
+Only once two neighbours end up right next to each other is the whole route
+renumbered with evenly spaced positions, in a single UPDATE.
+
+Those positions are only temporary: once the stops are in place, the real distances
+are measured from the stop coordinates, for the changed part of the route only.
+"""
+from typing import Iterable, Optional
+from uuid import UUID
+
+import numpy as np
+from geoalchemy2 import Geometry
+from open_people_transport.database.models import Route as SQLRoute
+from open_people_transport.database.models import RouteStop as SQLRouteStop
+from open_people_transport.database.models import Stop as SQLStop
+from open_people_transport.spatial.distance import positions, route_distances
+from sqlalchemy import Float, Integer, cast, column, func, select, update, values
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+# Gap between consecutive stops after renumbering, and when appending a stop
+STEP = 200
+
+
+class RouteStopSequence:
+    def __init__(self, session: Session, route_id: UUID) -> None:
+        self.session = session
+        self.route_id = route_id
+        self.renumbered = False
+
+    def lock(self) -> bool:
+        """
+        Lock the route until the end of the transaction, so that concurrent inserts
+        into it don't pick the same position. False if the route doesn't exist.
+        """
+        query = select(SQLRoute.id).where(SQLRoute.id == self.route_id)
+        return self.session.scalar(query.with_for_update()) is not None
+
+    def position(self, stop_id: UUID) -> Optional[int]:
+        query = select(SQLRouteStop.distance).where(
+            SQLRouteStop.route_id == self.route_id, SQLRouteStop.stop_id == stop_id
+        )
+        return self.session.scalar(query)
+
+    def place(self, stop_id: UUID, after: Optional[UUID] = None) -> Optional[int]:
+        """
+        Position for `stop_id` right after the stop `after`, or at the end of the route
+        if it's not given. None if `after` is not on the route.
+        """
+        if after is None:
+            last = self._last(stop_id)
+            return 0 if last is None else last + STEP
+        previous = self.position(after)
+        if previous is None:
+            return None
+        following = self._next(previous, stop_id)
+        if following is None:
+            return previous + STEP
+        if following - previous < 2:
+            # Out of room between the two, which renumbering is sure to make
+            self.renumber()
+            previous = self.position(after)
+            following = self._next(previous, stop_id)  # type: ignore
+        return (previous + following) // 2
+
+    def renumber(self) -> None:
+        """Spread the stops of the route evenly, keeping their order"""
+        order = (SQLRouteStop.distance, SQLRouteStop.stop_id)
+        numbered = (
+            select(
+                SQLRouteStop.stop_id,
+                ((func.row_number().over(order_by=order) - 1) * STEP).label("position"),
+            )
+            .where(SQLRouteStop.route_id == self.route_id)
+            .subquery()
+        )
+        statement = (
+            update(SQLRouteStop)
+            .where(
+                SQLRouteStop.route_id == self.route_id,
+                SQLRouteStop.stop_id == numbered.c.stop_id,
+            )
+            .values(distance=numbered.c.position)
+            .execution_options(synchronize_session="fetch")
+        )
+        self.session.execute(statement)
+        self.renumbered = True
+
+    def measure(self, stop_ids: list[UUID]) -> Optional[list[int]]:
+        """
+        Distances along a route made of the given stops, in order. None if any of them
+        doesn't exist.
+        """
+        query = select(SQLStop.id, *self._coordinates()).where(SQLStop.id.in_(stop_ids))
+        coordinates = {id: (lat, lon) for id, lat, lon in self.session.execute(query)}
+        if len(coordinates) < len(set(stop_ids)):
+            return None
+        lats, lons = np.array([coordinates[id] for id in stop_ids]).reshape(-1, 2).T
+        return positions(route_distances(lats, lons)).tolist()
+
+    def remeasure(self, start: Optional[int] = None) -> None:
+        """
+        Replace the positions of the stops from `start` onward with their distances,
+        measured from the stop before them. The whole route is measured if `start` is
+        not given, or if it has been renumbered, which moved all of its stops.
+        """
+        if self.renumbered:
+            start = None
+            self.renumbered = False
+        anchor = None if start is None else self._previous(start)
+        query = (
+            select(SQLRouteStop.stop_id, SQLRouteStop.distance, *self._coordinates())
+            .join(SQLStop)
+            .where(SQLRouteStop.route_id == self.route_id)
+            .order_by(SQLRouteStop.distance, SQLRouteStop.stop_id)
+        )
+        if anchor is not None:
+            query = query.where(SQLRouteStop.distance >= anchor)
+        rows = self.session.execute(query).all()
+        if not rows:
+            return
+        stop_ids, current, lats, lons = zip(*rows)
+        measured = positions(
+            route_distances(np.array(lats), np.array(lons)), anchor or 0
+        )
+        self._update(
+            (stop_id, int(distance))
+            for stop_id, old, distance in zip(stop_ids, current, measured)
+            if old != distance
+        )
+
+    @staticmethod
+    def _coordinates() -> tuple:
+        location = cast(SQLStop.location, Geometry(geometry_type=None))
+        return func.ST_Y(location, type_=Float), func.ST_X(location, type_=Float)
+
+    def _update(self, distances: Iterable[tuple[UUID, int]]) -> None:
+        data = list(distances)
+        if not data:
+            return
+        measured = values(
+            column("stop_id", postgresql.UUID(as_uuid=True)),
+            column("distance", Integer),
+            name="measured",
+        ).data(data)
+        statement = (
+            update(SQLRouteStop)
+            .where(
+                SQLRouteStop.route_id == self.route_id,
+                SQLRouteStop.stop_id == cast(measured.c.stop_id, postgresql.UUID),
+            )
+            .values(distance=measured.c.distance)
+            .execution_options(synchronize_session="fetch")
+        )
+        self.session.execute(statement)
+
+    def _previous(self, position: int) -> Optional[int]:
+        query = select(func.max(SQLRouteStop.distance)).where(
+            SQLRouteStop.route_id == self.route_id, SQLRouteStop.distance < position
+        )
+        return self.session.scalar(query)
+
+    def _last(self, exclude: UUID) -> Optional[int]:
+        query = select(func.max(SQLRouteStop.distance)).where(
+            SQLRouteStop.route_id == self.route_id, SQLRouteStop.stop_id != exclude
+        )
+        return self.session.scalar(query)
+
+    def _next(self, position: int, exclude: UUID) -> Optional[int]:
+        query = select(func.min(SQLRouteStop.distance)).where(
+            SQLRouteStop.route_id == self.route_id,
+            SQLRouteStop.distance > position,
+            SQLRouteStop.stop_id != exclude,
+        )
+        return self.session.scalar(query)
@@ -1,27 +1,49 @@
-from typing import Optional
+from __future__ import annotations
+
+import json
+from threading import Lock
+from typing import Any, Iterable, Optional, TypeVar
 from uuid import UUID
 
 import geoalchemy2.shape
 import shapely.geometry.point
+from geoalchemy2 import Geography, Geometry
+from open_people_transport.core.models import Journey as CoreJourney
+from open_people_transport.core.models import NearbyStop as CoreNearbyStop
 from open_people_transport.core.models import Node as CoreNode
+from open_people_transport.core.models import Reachability as CoreReachability
 from open_people_transport.core.models import Route as CoreRoute
 from open_people_transport.core.models import RouteStop as CoreRouteStop
 from open_people_transport.core.models import Stop as CoreStop
+from open_people_transport.core.models import Transfer as CoreTransfer
 from open_people_transport.core.models import Type as CoreType
 from open_people_transport.database.models import Node as SQLNode
 from open_people_transport.database.models import Route as SQLRoute
 from open_people_transport.database.models import RouteStop as SQLRouteStop
 from open_people_transport.database.models import Stop as SQLStop
+from open_people_transport.database.models import Transfer as SQLTransfer
 from open_people_transport.database.models import Type as SQLType
-from sqlalchemy import asc, desc, select
+from open_people_transport.routing.graph import RoutingGraph, get_routing_graph
+from open_people_transport.settings import get_settings
+from open_people_transport.spatial.geodesy import METERS_PER_DEGREE, haversine
+from open_people_transport.spatial.index import StopIndex, get_stop_index
+from sqlalchemy import cast, delete, func, insert, or_, select
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql import Select
 
 from .exceptions import (
     DatabaseIntegrityViolated,
     ResourceAlreadyExists,
     ResourceNotFound,
 )
+from .projections import Projection
+from .reference import get_reference_cache
+from .sequence import RouteStopSequence
+from .versions import get_table_versions
+
+M = TypeVar("M")
 
 
 class Service:
@@ -34,26 +56,59 @@ class Service:
         except IntegrityError as exc:
             raise DatabaseIntegrityViolated(CoreRoute, exc.args[0])
 
+    def _upsert(self, projection: Projection[M], values: dict[str, Any]) -> M:
+        """
+        Insert a row, or update the one with the same primary key, in one statement that
+        returns it through `projection`. Left for the caller to commit.
+        """
+        table = projection.model.__table__
+        keys = [column.name for column in table.primary_key]
+        query = postgresql.insert(table).values(values)
+        query = query.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: query.excluded[name] for name in values if name not in keys},
+        ).returning(*projection.columns)
+        try:
+            row = self.session.execute(query).one()
+        except IntegrityError as exc:
+            self.session.rollback()
+            raise DatabaseIntegrityViolated(projection.schema, exc.args[0])
+        return projection.row_to_schema(row)
+
+    @staticmethod
+    def _paginate(query: Select, key: Any, limit: Optional[int], after: Any) -> Select:
+        """Keyset pagination: rows ordered by `key`, starting right after `after`"""
+        if after is not None:
+            query = query.where(key > after)
+        if limit is not None or after is not None:
+            query = query.order_by(key).limit(limit)
+        return query
+
 
 class TypeService(Service):
-    def list(self) -> list[CoreType]:
-        query = select(SQLType)
-        values = self.session.scalars(query).all()
-        result = list(map(CoreType.from_orm, values))
-        return result
+    projection = Projection(CoreType, SQLType)
+
+    def list(
+        self, limit: Optional[int] = None, after: Optional[str] = None
+    ) -> list[CoreType]:
+        query = self._paginate(self.projection.select(), SQLType.name, limit, after)
+        return self.projection.all(self.session, query)
 
     def get(self, name: str) -> CoreType:
-        value = self.session.get(SQLType, name)
+        value = self._find(name)
         if value is None:
             raise ResourceNotFound(CoreType, name)
-        return CoreType.from_orm(value)
+        return value
 
     def create(self, new: CoreType) -> CoreType:
-        if new in self:
-            raise ResourceAlreadyExists(CoreType, new.name)
         row = SQLType(name=new.name)
         self.session.add(row)
-        self.session.commit()
+        try:
+            self.session.commit()
+        except IntegrityError:
+            self.session.rollback()
+            raise ResourceAlreadyExists(CoreType, new.name)
+        get_table_versions().bump(SQLType)
         # No refresh needed
         return CoreType.from_orm(row)
 
@@ -63,6 +118,7 @@ class TypeService(Service):
             raise ResourceNotFound(CoreType, name)
         row.name = new.name
         self._try_commit()
+        get_table_versions().bump(SQLType)
         self.session.refresh(row)
         return CoreType.from_orm(row)
 
@@ -72,35 +128,47 @@ class TypeService(Service):
             raise ResourceNotFound(CoreType, name)
         self.session.delete(row)
         self._try_commit()
+        get_table_versions().bump(SQLType)
 
     def __contains__(self, item: CoreType) -> bool:
-        row = self.session.get(SQLType, item.name)
-        return row is not None
+        return self._find(item.name) is not None
+
+    def warm_cache(self) -> None:
+        """Put all types in the reference cache"""
+        cache = get_reference_cache()
+        version = cache.version(SQLType)
+        for value in self.list():
+            cache.put(SQLType, value.name, value, version)
+
+    def _find(self, name: str) -> Optional[CoreType]:
+        def load() -> Optional[CoreType]:
+            query = self.projection.select().where(SQLType.name == name)
+            return self.projection.one_or_none(self.session, query)
+
+        return get_reference_cache().load(SQLType, name, load, self.session)
 
 
 class RouteService(Service):
-    def list(self) -> list[CoreRoute]:
-        query = select(SQLRoute)
-        values = self.session.scalars(query).all()
-        result = list(map(CoreRoute.from_orm, values))
-        return result
+    projection = Projection(CoreRoute, SQLRoute)
+
+    def list(
+        self, limit: Optional[int] = None, after: Optional[UUID] = None
+    ) -> list[CoreRoute]:
+        query = self._paginate(self.projection.select(), SQLRoute.id, limit, after)
+        return self.projection.all(self.session, query)
 
     def get(self, id: UUID) -> CoreRoute:
-        value = self.session.get(SQLRoute, id)
+        query = self.projection.select().where(SQLRoute.id == id)
+        value = self.projection.one_or_none(self.session, query)
         if value is None:
             raise ResourceNotFound(CoreRoute, id)
-        return CoreRoute.from_orm(value)
+        return value
 
     def update(self, new: CoreRoute) -> CoreRoute:
-        row = self.session.get(SQLRoute, new.id)
-        if row is None:
-            row = SQLRoute(id=new.id)
-            self.session.add(row)
-        row.number = new.number
-        row.type_name = new.type_name
+        result = self._upsert(self.projection, new.dict())
         self._try_commit()
-        self.session.refresh(row)
-        return CoreRoute.from_orm(row)
+        get_table_versions().bump(SQLRoute)
+        return result
 
     def delete(self, id: UUID) -> None:
         row = self.session.get(SQLRoute, id)
@@ -108,30 +176,32 @@ class RouteService(Service):
             raise ResourceNotFound(CoreRoute, id)
         self.session.delete(row)
         self._try_commit()
+        get_table_versions().bump(SQLRoute)
+        if (graph := get_routing_graph()).ready:
+            graph.remove_route(id)
 
 
 class NodeService(Service):
-    def list(self) -> list[CoreNode]:
-        query = select(SQLNode)
-        values = self.session.scalars(query).all()
-        result = list(map(CoreNode.from_orm, values))
-        return result
+    projection = Projection(CoreNode, SQLNode)
+
+    def list(
+        self, limit: Optional[int] = None, after: Optional[UUID] = None
+    ) -> list[CoreNode]:
+        query = self._paginate(self.projection.select(), SQLNode.id, limit, after)
+        return self.projection.all(self.session, query)
 
     def get(self, id: UUID) -> CoreNode:
-        value = self.session.get(SQLNode, id)
+        query = self.projection.select().where(SQLNode.id == id)
+        value = self.projection.one_or_none(self.session, query)
         if value is None:
             raise ResourceNotFound(CoreRoute, id)
-        return CoreNode.from_orm(value)
+        return value
 
     def update(self, new: CoreNode) -> CoreNode:
-        row = self.session.get(SQLNode, new.id)
-        if row is None:
-            row = SQLNode(id=new.id)
-            self.session.add(row)
-        row.name = new.name
+        result = self._upsert(self.projection, new.dict())
         self.session.commit()
-        self.session.refresh(row)
-        return CoreNode.from_orm(row)
+        get_table_versions().bump(SQLNode)
+        return result
 
     def delete(self, id: UUID) -> None:
         row = self.session.get(SQLNode, id)
@@ -139,32 +209,52 @@ class NodeService(Service):
             raise ResourceNotFound(CoreRoute, id)
         self.session.delete(row)
         self._try_commit()
+        get_table_versions().bump(SQLNode)
 
 
 class StopService(Service):
-    def list(self) -> list[CoreStop]:
-        query = select(SQLStop)
-        values = self.session.scalars(query).all()
-        result = list(map(self.model_to_schema, values))
-        return result
+    # Coordinates are read with ST_Y/ST_X rather than parsed from the location
+    projection = Projection(CoreStop, SQLStop)
+
+    def list(
+        self, limit: Optional[int] = None, after: Optional[UUID] = None
+    ) -> list[CoreStop]:
+        return self.projection.all(self.session, self.list_query(limit, after))
+
+    @classmethod
+    def list_query(cls, limit: Optional[int], after: Optional[UUID]) -> Select:
+        return cls._paginate(cls.projection.select(), SQLStop.id, limit, after)
 
     def get(self, id: UUID) -> CoreStop:
-        value = self.session.get(SQLStop, id)
+        query = self.projection.select().where(SQLStop.id == id)
+        value = self.projection.one_or_none(self.session, query)
         if value is None:
             raise ResourceNotFound(CoreStop, id)
-        return self.model_to_schema(value)
+        return value
 
     def update(self, new: CoreStop) -> CoreStop:
-        row = self.session.get(SQLStop, new.id)
-        if row is None:
-            row = SQLStop(id=new.id)
-            self.session.add(row)
-        row.node_id = new.node_id
         shape = shapely.geometry.point.Point(new.lon, new.lat)
-        row.location = geoalchemy2.shape.from_shape(shape)
+        location = geoalchemy2.shape.from_shape(shape)
+        values = {"id": new.id, "node_id": new.node_id, "location": location}
+        result = self._upsert(self.projection, values)
+        # Moving a stop changes the distances along every route through it
+        query = select(SQLRouteStop.route_id, SQLRouteStop.distance).where(
+            SQLRouteStop.stop_id == new.id
+        )
+        route_ids = []
+        for route_id, distance in self.session.execute(query).all():
+            RouteStopSequence(self.session, route_id).remeasure(distance)
+            route_ids.append(route_id)
+        TransferService(self.session).connect(new.id)
         self.session.commit()
-        self.session.refresh(row)
-        return self.model_to_schema(row)
+        get_table_versions().bump(SQLStop, SQLRouteStop, SQLTransfer)
+        if (index := get_stop_index()).ready:
+            index.add(result)
+        if (graph := get_routing_graph()).ready:
+            graph.set_stop(result.id, result.node_id)
+            for route_id in route_ids:
+                graph.set_route(route_id, RouteStopService(self.session).list(route_id))
+        return result
 
     def delete(self, id: UUID) -> None:
         row = self.session.get(SQLStop, id)
@@ -172,38 +262,89 @@ class StopService(Service):
             raise ResourceNotFound(CoreStop, id)
         self.session.delete(row)
         self._try_commit()
+        get_table_versions().bump(SQLStop, SQLTransfer)
+        if (index := get_stop_index()).ready:
+            index.remove(id)
+        if (graph := get_routing_graph()).ready:
+            graph.remove_stop(id)
+
+    def nearby(
+        self, lat: float, lon: float, radius: float, limit: int
+    ) -> list[CoreNearbyStop]:
+        if (index := get_stop_index()).ready:
+            return index.within(lat, lon, radius, limit)
+        query = self.nearby_query(lat, lon, radius, limit)
+        values = self.session.execute(query).all()
+        return [
+            CoreNearbyStop(**self.model_to_schema(value).dict(), distance=distance)
+            for value, distance in values
+        ]
+
+    @staticmethod
+    def nearby_query(lat: float, lon: float, radius: float, limit: int) -> Select:
+        """
+        Stops within `radius` meters from a point, nearest first, along with their
+        distances. Both the filter and the ordering are served by the spatial index.
+        """
+        point = cast(
+            func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326),
+            Geography("POINT", srid=4326),
+        )
+        return (
+            select(SQLStop, func.ST_Distance(SQLStop.location, point))
+            .where(func.ST_DWithin(SQLStop.location, point, radius))
+            .order_by(SQLStop.location.op("<->")(point))
+            .limit(limit)
+        )
 
     @staticmethod
     def model_to_schema(model: SQLStop) -> CoreStop:
-        shape = geoalchemy2.shape.to_shape(model.location)
-        if not isinstance(shape, shapely.geometry.point.Point):
-            raise RuntimeError("Could not parse a Point from WKB")
         return CoreStop(
             id=model.id,
-            lat=shape.y,
-            lon=shape.x,
+            lat=model.lat,
+            lon=model.lon,
             node_id=model.node_id,
         )
 
 
 class RouteStopService(Service):
+    projection = Projection(CoreRouteStop, SQLRouteStop)
+
     def list(
-        self, route_id: Optional[UUID] = None, stop_id: Optional[UUID] = None
+        self,
+        route_id: Optional[UUID] = None,
+        stop_id: Optional[UUID] = None,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
     ) -> list[CoreRouteStop]:
-        query = select(SQLRouteStop)
+        query = self.list_query(route_id, stop_id, limit, after)
+        return self.projection.all(self.session, query)
+
+    @classmethod
+    def list_query(
+        cls,
+        route_id: Optional[UUID],
+        stop_id: Optional[UUID],
+        limit: Optional[int],
+        after: Optional[int],
+    ) -> Select:
+        query = cls.projection.select()
         if route_id:
             query = query.where(SQLRouteStop.route_id == route_id)
         if stop_id:
             query = query.where(SQLRouteStop.stop_id == stop_id)
-        values = self.session.scalars(query).all()
-        result = list(map(CoreRouteStop.from_orm, values))
-        return result
+        if after is not None:
+            query = query.where(SQLRouteStop.distance > after)
+        return query.order_by(SQLRouteStop.distance).limit(limit)
 
     def get(self, route_id: UUID, stop_id: UUID) -> CoreRouteStop:
-        value = self.session.get(SQLRouteStop, (route_id, stop_id))
+        query = self.projection.select().where(
+            SQLRouteStop.route_id == route_id, SQLRouteStop.stop_id == stop_id
+        )
+        value = self.projection.one_or_none(self.session, query)
         if value is None:
             raise ResourceNotFound(CoreRouteStop, (route_id, stop_id))
-        return CoreRouteStop.from_orm(value)
+        return value
 
     def create(
         self,
@@ -211,45 +352,256 @@ class RouteStopService(Service):
         stop_id: UUID,
         after_stop: Optional[UUID] = None,
     ) -> CoreRouteStop:
-        row = self.session.get(SQLRouteStop, (stop_id, route_id))
+        sequence = RouteStopSequence(self.session, route_id)
+        if not sequence.lock():
+            raise ResourceNotFound(CoreRoute, route_id)
+        distance = sequence.place(stop_id, after=after_stop)
+        if distance is None:
+            self.session.rollback()
+            raise ResourceNotFound(CoreStop, after_stop)
+
+        row = self.session.get(SQLRouteStop, (route_id, stop_id))
         if row is None:
-            row = SQLRouteStop(stop_id=stop_id, route_id=route_id)
+            row = SQLRouteStop(route_id=route_id, stop_id=stop_id)
             self.session.add(row)
-
-        # TODO Proper distance calculation algorithm
-        # Current solution:
-        # * If previous stop is not specified, assume the last one as the previous.
-        # * If a next stop after the previous one exists, insert the new stop
-        #   exactly in the middle (e.g. 200 + 500 -> 350).
-        # * If not, insert 200 meters ahead of the previous (e.g. 200 -> 400).
-        prev_stop: SQLRouteStop | None
-        if after_stop:
-            prev_stop = self.session.get(SQLRouteStop, (route_id, after_stop))
-            if prev_stop is None:
-                raise ResourceNotFound(CoreStop, after_stop)
-        else:
-            query = select(SQLRouteStop).order_by(desc(SQLRouteStop.distance))
-            prev_stop = self.session.scalars(query).first()
-        prev_distance = prev_stop.distance if prev_stop else -200
-        query = (
-            select(SQLRouteStop)
-            .where(SQLRouteStop.distance > prev_distance)
-            .order_by(asc(SQLRouteStop.distance))
+        moved_from = row.distance
+        row.distance = distance
+        try:
+            self.session.flush()
+        except IntegrityError as exc:
+            self.session.rollback()
+            raise DatabaseIntegrityViolated(CoreRouteStop, exc.args[0])
+        # Stops after both the old and the new place of the stop are now further or
+        # closer to the start of the route
+        sequence.remeasure(
+            distance if moved_from is None else min(moved_from, distance)
         )
-        next_stop: SQLRouteStop | None = self.session.scalars(query).first()
-        if next_stop:
-            current_distance = (prev_distance + next_stop.distance) // 2
-        else:
-            current_distance = prev_distance + 200
-
-        row.distance = current_distance
-        self.session.commit()
+        self._try_commit()
+        get_table_versions().bump(SQLRouteStop)
         self.session.refresh(row)
+        self._update_graph(route_id)
         return CoreRouteStop.from_orm(row)
 
+    def replace(self, route_id: UUID, stop_ids: list[UUID]) -> list[CoreRouteStop]:
+        """
+        Replace the whole ordered list of stops of a route in a single transaction:
+        stops left out are deleted and the rest are upserted with one statement.
+        """
+        # Locked like when inserting a single stop, so that the two don't interleave
+        sequence = RouteStopSequence(self.session, route_id)
+        if not sequence.lock():
+            self.session.rollback()
+            raise ResourceNotFound(CoreRoute, route_id)
+        seen: set[UUID] = set()
+        for stop_id in stop_ids:
+            if stop_id in seen:
+                self.session.rollback()
+                raise ResourceAlreadyExists(CoreRouteStop, (route_id, stop_id))
+            seen.add(stop_id)
+
+        distances = sequence.measure(stop_ids)
+        if distances is None:
+            self.session.rollback()
+            raise ResourceNotFound(CoreStop, stop_ids)
+        rows = [
+            {"route_id": route_id, "stop_id": stop_id, "distance": distance}
+            for stop_id, distance in zip(stop_ids, distances)
+        ]
+        values = []
+        try:
+            self.session.execute(
+                delete(SQLRouteStop).where(
+                    SQLRouteStop.route_id == route_id,
+                    SQLRouteStop.stop_id.not_in(stop_ids),
+                )
+            )
+            if rows:
+                query = postgresql.insert(SQLRouteStop).values(rows)
+                query = query.on_conflict_do_update(
+                    index_elements=[SQLRouteStop.route_id, SQLRouteStop.stop_id],
+                    set_={"distance": query.excluded.distance},
+                ).returning(*SQLRouteStop.__table__.columns)
+                values = self.session.execute(query).all()
+        except IntegrityError as exc:
+            self.session.rollback()
+            raise DatabaseIntegrityViolated(CoreRouteStop, exc.args[0])
+        self.session.commit()
+        get_table_versions().bump(SQLRouteStop)
+        result = sorted(map(CoreRouteStop.from_orm, values), key=lambda v: v.distance)
+        if (graph := get_routing_graph()).ready:
+            graph.set_route(route_id, result)
+        return result
+
     def delete(self, route_id: UUID, stop_id: UUID) -> None:
         row = self.session.get(SQLRouteStop, (route_id, stop_id))
         if not row:
             raise ResourceNotFound(CoreRouteStop, (route_id, stop_id))
         self.session.delete(row)
+        self.session.flush()
+        RouteStopSequence(self.session, route_id).remeasure(row.distance)
         self._try_commit()
+        get_table_versions().bump(SQLRouteStop)
+        self._update_graph(route_id)
+
+    def _update_graph(self, route_id: UUID) -> None:
+        if (graph := get_routing_graph()).ready:
+            graph.set_route(route_id, self.list(route_id=route_id))
+
+
+# Held while the routing graph is first built, so that it is only built once
+_building = Lock()
+
+
+class JourneyService(Service):
+    def plan(self, from_stop: UUID, to_stop: UUID) -> CoreJourney:
+        return self.search(self._graph((from_stop, to_stop)), from_stop, to_stop)
+
+    @staticmethod
+    def search(graph: RoutingGraph, from_stop: UUID, to_stop: UUID) -> CoreJourney:
+        """The shortest journey on `graph`, which needs no session to be found"""
+        journey = graph.plan(from_stop, to_stop)
+        if journey is None:
+            raise ResourceNotFound(CoreJourney, (from_stop, to_stop))
+        return journey
+
+    def reachable(
+        self,
+        from_stops: list[UUID],
+        max_distance: int,
+        max_transfers: int,
+        hull: bool = False,
+    ) -> CoreReachability:
+        graph = self._graph(from_stops)
+        key = ("reachable", frozenset(from_stops), max_distance, max_transfers, hull)
+
+        def compute() -> CoreReachability:
+            stops = graph.reachable(from_stops, max_distance, max_transfers)
+            return CoreReachability(
+                from_stop_ids=from_stops,
+                stops=stops,
+                hull=self.hull([stop.stop_id for stop in stops]) if hull else None,
+            )
+
+        return graph.cached(key, compute)
+
+    def hull(self, stop_ids: list[UUID]) -> Optional[dict[str, Any]]:
+        """GeoJSON polygon hugging the locations of some stops"""
+        geometry = func.ST_Collect(cast(SQLStop.location, Geometry(geometry_type=None)))
+        query = select(func.ST_AsGeoJSON(func.ST_ConcaveHull(geometry, 0.8))).where(
+            SQLStop.id.in_(stop_ids)
+        )
+        value = self.session.scalar(query)
+        return json.loads(value) if value else None
+
+    def _graph(self, stop_ids: Iterable[UUID]) -> RoutingGraph:
+        """
+        The routing graph, making sure it knows of all `stop_ids`. Unless it was built
+        at startup, it is built when first needed and kept up to date from then on.
+        """
+        graph = get_routing_graph()
+        if not graph.ready:
+            with _building:
+                if not graph.ready:
+                    self.build_graph(graph)
+        for stop_id in stop_ids:
+            if stop_id not in graph:
+                raise ResourceNotFound(CoreStop, stop_id)
+        return graph
+
+    def build_graph(self, graph: RoutingGraph) -> RoutingGraph:
+        tables = [model.__tablename__ for model in (SQLStop, SQLRoute, SQLRouteStop)]
+        versions = get_table_versions()
+        while True:
+            built = versions.get(tables)
+            stops = self.session.execute(select(SQLStop.id, SQLStop.node_id)).all()
+            graph.build(stops, RouteStopService(self.session).list())
+            # Changes committed while the rows were read left the graph alone, since
+            # it wasn't ready yet, so it is read again if there were any
+            if versions.get(tables) == built:
+                return graph
+
+
+class TransferService(Service):
+    # Transfers inserted at once when rebuilding the table
+    CHUNK_SIZE = 10_000
+    projection = Projection(CoreTransfer, SQLTransfer)
+
+    def list(self, stop_id: UUID) -> list[CoreTransfer]:
+        """Walks from a stop to the ones around it, shortest first"""
+        if self.session.get(SQLStop, stop_id) is None:
+            raise ResourceNotFound(CoreStop, stop_id)
+        query = (
+            self.projection.select()
+            .where(SQLTransfer.from_stop_id == stop_id)
+            .order_by(SQLTransfer.distance, SQLTransfer.to_stop_id)
+        )
+        return self.projection.all(self.session, query)
+
+    def connect(self, stop_id: UUID) -> None:
+        """
+        Replace the transfers from and to a stop that has just been added or moved.
+        Left for the caller to commit.
+        """
+        self.session.execute(
+            delete(SQLTransfer).where(
+                or_(
+                    SQLTransfer.from_stop_id == stop_id,
+                    SQLTransfer.to_stop_id == stop_id,
+                )
+            )
+        )
+        radius = self._radius()
+        stop, other = aliased(SQLStop), aliased(SQLStop)
+        query = select(stop.lat, stop.lon, other.id, other.lat, other.lon).where(
+            stop.id == stop_id,
+            other.id != stop_id,
+            # Measured on a sphere, like below, with some room for the two to differ
+            func.ST_DWithin(stop.location, other.location, radius + 1, False),
+        )
+        values = []
+        for lat, lon, other_id, other_lat, other_lon in self.session.execute(query):
+            # The same as when rebuilding, so that both find the same transfers
+            distance = haversine(lat, lon, other_lat, other_lon)
+            if distance <= radius:
+                values.append(self._transfer(stop_id, other_id, distance))
+                values.append(self._transfer(other_id, stop_id, distance))
+        if values:
+            self.session.execute(insert(SQLTransfer), values)
+
+    def rebuild(self) -> int:
+        """
+        Find all transfers anew, returning their number. Stops are put on a grid of
+        cells as large as the walking radius, so only the stops in the neighboring
+        cells of every stop have to be measured.
+        """
+        radius = self._radius()
+        index = StopIndex(radius / METERS_PER_DEGREE)
+        index.build(StopService(self.session).list())
+        self.session.execute(delete(SQLTransfer))
+        count = 0
+        values = []
+        for from_stop, to_stop, distance in index.pairs(radius):
+            values.append(self._transfer(from_stop, to_stop, distance))
+            if len(values) == self.CHUNK_SIZE:
+                self.session.execute(insert(SQLTransfer), values)
+                count += len(values)
+                values = []
+        if values:
+            self.session.execute(insert(SQLTransfer), values)
+            count += len(values)
+        self.session.commit()
+        get_table_versions().bump(SQLTransfer)
+        return count
+
+    @staticmethod
+    def _radius() -> float:
+        return get_settings().transfer_radius
+
+    @staticmethod
+    def _transfer(from_stop: UUID, to_stop: UUID, distance: float) -> dict[str, Any]:
+        return {
+            "from_stop_id": from_stop,
+            "to_stop_id": to_stop,
+            "distance": round(distance),
+            "duration": round(distance / get_settings().walking_speed),
+        }
@@ -0,0 +1,33 @@
+from collections import defaultdict
+from functools import lru_cache
+from threading import Lock
+from typing import Iterable
+
+from open_people_transport.database import BaseModel
+
+
+class TableVersions:
+    """
+    Version counters of the tables, bumped whenever their rows are written to.
+
+    Anything derived from the rows of some tables stays valid for as long as their
+    versions stay the same.
+    """
+
+    def __init__(self) -> None:
+        self._versions: defaultdict[str, int] = defaultdict(int)
+        self._lock = Lock()
+
+    def get(self, tables: Iterable[str]) -> tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions[table] for table in tables)
+
+    def bump(self, *models: type[BaseModel]) -> None:
+        with self._lock:
+            for model in models:
+                self._versions[model.__tablename__] += 1
+
+
+@lru_cache
+def get_table_versions() -> TableVersions:
+    return TableVersions()
@@ -1,9 +1,19 @@
+from functools import lru_cache
+from typing import AsyncIterator
+
 from inflection import underscore
 from open_people_transport.settings import get_settings
 from sqlalchemy import MetaData, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import as_declarative, declared_attr, sessionmaker
 
-engine = create_engine(get_settings().postgres_url, future=True)
+from .pool import engine_options, limit_statements, pool_statistics
+
+engine = create_engine(
+    get_settings().postgres_url, future=True, **engine_options(get_settings())
+)
+limit_statements(engine, get_settings())
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
 
@@ -29,3 +39,46 @@ def init_models():
 def get_session():
     with SessionLocal() as session:
         yield session
+
+
+def async_url(url: str) -> str:
+    """The same database URL, but for the asyncpg driver"""
+    return str(make_url(url).set(drivername="postgresql+asyncpg"))
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    settings = get_settings()
+    async_engine = create_async_engine(
+        async_url(settings.postgres_url),
+        future=True,
+        **engine_options(settings, asynchronous=True),
+    )
+    limit_statements(async_engine.sync_engine, settings)
+    return async_engine
+
+
+@lru_cache
+def get_async_sessionmaker() -> sessionmaker:
+    # Attributes can't be loaded lazily without blocking the event loop, so they are
+    # kept as they are after a commit instead
+    return sessionmaker(
+        bind=get_async_engine(),
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+        future=True,
+    )
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with get_async_sessionmaker()() as session:
+        yield session
+
+
+def get_pool_statistics() -> dict[str, dict[str, float]]:
+    """Pools of the engines of this worker"""
+    return {
+        "sync": pool_statistics(engine.pool),
+        "async": pool_statistics(get_async_engine().pool),
+    }
@@ -0,0 +1,24 @@
+"""Add spatial index on Stop location
+
+Revision ID: 3f5d2a9c81e4
+Revises: 9ecb9160838d
+Create Date: 2022-07-04 16:12:48.201937
+
+"""
+import geoalchemy2
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f5d2a9c81e4"
+down_revision = "9ecb9160838d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_stop_location", "stop", ["location"], postgresql_using="gist")
+
+
+def downgrade() -> None:
+    op.drop_index("idx_stop_location", "stop")
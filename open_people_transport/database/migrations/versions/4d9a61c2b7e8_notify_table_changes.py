@@ -0,0 +1,93 @@
+"""Notify table changes
+
+Revision ID: 4d9a61c2b7e8
+Revises: e5c18a7b3f06
+Create Date: 2022-07-12 11:06:24.518390
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4d9a61c2b7e8"
+down_revision = "e5c18a7b3f06"
+branch_labels = None
+depends_on = None
+
+# Primary key columns of the tables whose changes are notified
+KEYS = {
+    "type": ["name"],
+    "route": ["id"],
+    "node": ["id"],
+    "stop": ["id"],
+    "route_stop": ["route_id", "stop_id"],
+}
+
+# Keys sent along with a change at most, which keeps the payload well under the 8000
+# bytes a notification can hold. Larger changes are sent without their keys.
+MAX_KEYS = 50
+
+# Transition tables of the triggers, which can't be shared by more than one event
+REFERENCING = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+}
+
+
+def upgrade() -> None:
+    # Every statement is announced on the table_changes channel with its table and the
+    # primary keys of the rows it changed, both before and after an update. A trigger
+    # for each row would send a notification per row, and before PostgreSQL 13 every
+    # one of them is compared to all the ones sent before in the same transaction.
+    op.execute(
+        f"""
+        CREATE FUNCTION notify_table_changes() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changed jsonb := '[]';
+            keys jsonb;
+        BEGIN
+            -- Only as many rows as it takes to tell that there are too many
+            IF TG_OP <> 'INSERT' THEN
+                SELECT changed || coalesce(jsonb_agg(to_jsonb(old_row)), '[]')
+                INTO changed FROM (SELECT * FROM old_rows LIMIT {MAX_KEYS + 1}) old_row;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                SELECT changed || coalesce(jsonb_agg(to_jsonb(new_row)), '[]')
+                INTO changed FROM (SELECT * FROM new_rows LIMIT {MAX_KEYS + 1}) new_row;
+            END IF;
+            SELECT jsonb_agg(DISTINCT row_key.key) INTO keys
+            FROM jsonb_array_elements(changed) AS changed_row,
+            LATERAL (
+                SELECT jsonb_agg(changed_row.value -> name ORDER BY ordinal) AS key
+                FROM unnest(TG_ARGV) WITH ORDINALITY AS _(name, ordinal)
+            ) AS row_key;
+            IF keys IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF jsonb_array_length(keys) > {MAX_KEYS} THEN
+                keys := NULL;
+            END IF;
+            PERFORM pg_notify('table_changes', jsonb_build_object(
+                'table', TG_TABLE_NAME, 'operation', TG_OP, 'keys', keys
+            )::text);
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    for table, columns in KEYS.items():
+        arguments = ", ".join(f"'{column}'" for column in columns)
+        for operation, referencing in REFERENCING.items():
+            op.execute(
+                f"CREATE TRIGGER notify_{operation.lower()} "
+                f"AFTER {operation} ON {table} REFERENCING {referencing} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION notify_table_changes({arguments})"
+            )
+
+
+def downgrade() -> None:
+    for table in KEYS:
+        for operation in REFERENCING:
+            op.execute(f"DROP TRIGGER notify_{operation.lower()} ON {table}")
+    op.execute("DROP FUNCTION notify_table_changes()")
@@ -0,0 +1,26 @@
+"""Add index on RouteStop order
+
+Revision ID: b81e4f0c9d27
+Revises: 3f5d2a9c81e4
+Create Date: 2022-07-06 11:24:05.613482
+
+"""
+import geoalchemy2
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b81e4f0c9d27"
+down_revision = "3f5d2a9c81e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_route_stop_route_id_distance", "route_stop", ["route_id", "distance"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_route_stop_route_id_distance", "route_stop")
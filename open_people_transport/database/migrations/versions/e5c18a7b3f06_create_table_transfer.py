@@ -0,0 +1,35 @@
+"""Create table Transfer
+
+Revision ID: e5c18a7b3f06
+Revises: b81e4f0c9d27
+Create Date: 2022-07-08 16:42:51.208317
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "e5c18a7b3f06"
+down_revision = "b81e4f0c9d27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "transfer",
+        sa.Column("from_stop_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("to_stop_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("distance", sa.Integer(), nullable=False),
+        sa.Column("duration", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["from_stop_id"], ["stop.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["to_stop_id"], ["stop.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("from_stop_id", "to_stop_id"),
+    )
+    op.create_index("ix_transfer_to_stop_id", "transfer", ["to_stop_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transfer_to_stop_id", "transfer")
+    op.drop_table("transfer")
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import uuid
-from typing import TypeAlias
+from typing import Any, TypeAlias
 
-from geoalchemy2 import Geography, WKBElement
-from sqlalchemy import Column, ForeignKey
+from geoalchemy2 import Geography, Geometry, WKBElement
+from sqlalchemy import Column, ForeignKey, Index, cast, func
 from sqlalchemy.dialects import postgresql
-from sqlalchemy.orm import relationship
-from sqlalchemy.types import Integer, String
+from sqlalchemy.orm import column_property, relationship
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.types import Float, Integer, String
 from uuid_extensions import uuid7
 
 from . import BaseModel
@@ -15,6 +16,10 @@ from . import BaseModel
 UUID: TypeAlias = postgresql.UUID | uuid.UUID
 
 
+def _coordinate(function: Any, location: Column) -> ColumnElement:
+    return function(cast(location, Geometry(geometry_type=None)), type_=Float)
+
+
 class Type(BaseModel):
     name: str = Column(String(12), primary_key=True)  # type: ignore
     routes: list[Route] = relationship("Route", back_populates="type")  # type: ignore
@@ -25,7 +30,9 @@ class Route(BaseModel):
     number: str = Column(String(6), nullable=False)  # type: ignore
     type_name: str = Column(String(12), ForeignKey(Type.name), nullable=False)  # type: ignore
     type: Type = relationship("Type", back_populates="routes")  # type: ignore
-    route_stops: list[RouteStop] = relationship("RouteStop", back_populates="route")  # type: ignore
+    route_stops: list[RouteStop] = relationship(
+        "RouteStop", back_populates="route", order_by="RouteStop.distance"
+    )  # type: ignore
 
 
 class Node(BaseModel):
@@ -37,16 +44,22 @@ class Node(BaseModel):
 class Stop(BaseModel):
     id: UUID = Column(postgresql.UUID(as_uuid=True), primary_key=True, default=uuid7)  # type: ignore
     location: WKBElement = Column(
-        Geography("POINT", srid=4326, spatial_index=False),
+        Geography("POINT", srid=4326, spatial_index=True),
         nullable=False,
         unique=True,
     )  # type: ignore
+    # Coordinates are read by the database along with the row, so that the location
+    # does not have to be parsed from WKB to be served
+    lat: float = column_property(_coordinate(func.ST_Y, location).label("lat"))  # type: ignore
+    lon: float = column_property(_coordinate(func.ST_X, location).label("lon"))  # type: ignore
     node_id: UUID = Column(ForeignKey(Node.id), nullable=False)  # type: ignore
     node: Node = relationship("Node", back_populates="stops")  # type: ignore
     route_stops: list[RouteStop] = relationship("RouteStop", back_populates="stop")  # type: ignore
 
 
 class RouteStop(BaseModel):
+    __table_args__ = (Index("ix_route_stop_route_id_distance", "route_id", "distance"),)
+
     route_id: UUID = Column(
         postgresql.UUID(as_uuid=True), ForeignKey(Route.id), primary_key=True  # type: ignore
     )  # type: ignore
@@ -56,3 +69,20 @@ class RouteStop(BaseModel):
     distance: int = Column(Integer, nullable=False)  # type: ignore
     route: Route = relationship("Route", back_populates="route_stops")  # type: ignore
     stop: Stop = relationship("Stop", back_populates="route_stops")  # type: ignore
+
+
+class Transfer(BaseModel):
+    __table_args__ = (Index("ix_transfer_to_stop_id", "to_stop_id"),)
+
+    from_stop_id: UUID = Column(
+        postgresql.UUID(as_uuid=True),
+        ForeignKey(Stop.id, ondelete="CASCADE"),
+        primary_key=True,
+    )  # type: ignore
+    to_stop_id: UUID = Column(
+        postgresql.UUID(as_uuid=True),
+        ForeignKey(Stop.id, ondelete="CASCADE"),
+        primary_key=True,
+    )  # type: ignore
+    distance: int = Column(Integer, nullable=False)  # type: ignore
+    duration: int = Column(Integer, nullable=False)  # type: ignore
@@ -0,0 +1,152 @@
+"""
+Connection pools of the engines, set up from the settings.
+
+Both engines check connections out of a pool that keeps count of how often a checkout
+found the pool exhausted and how long it waited for a connection to be returned, so
+the pool of every worker can be sized by the load it actually sees.
+"""
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Optional
+
+import asyncpg
+from open_people_transport.settings import Settings
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+
+@dataclass
+class PoolCounters:
+    # Connections handed out by the pool
+    checkouts: int = 0
+    # Checkouts that found the pool and its overflow exhausted
+    waits: int = 0
+    # Time spent in checkouts that had to wait, in seconds
+    wait_time: float = 0
+    longest_wait: float = 0
+    # Checkouts that gave up after waiting for the pool timeout
+    timeouts: int = 0
+    lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    def record(self, waited: bool, elapsed: float, timed_out: bool) -> None:
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += elapsed
+                self.longest_wait = max(self.longest_wait, elapsed)
+
+    def snapshot(self) -> dict[str, float]:
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+                "longest_wait": self.longest_wait,
+                "timeouts": self.timeouts,
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """Queue pool counting checkouts and the time they wait for a connection"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.counters = PoolCounters()
+
+    def recreate(self) -> "MeteredQueuePool":
+        pool = super().recreate()
+        pool.counters = self.counters
+        return pool
+
+    def _do_get(self):
+        exhausted = self._pool.empty() and -1 < self._max_overflow <= self._overflow
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.counters.record(exhausted, time.perf_counter() - start, True)
+            raise
+        self.counters.record(exhausted, time.perf_counter() - start, False)
+        return connection
+
+
+class MeteredAsyncQueuePool(MeteredQueuePool, AsyncAdaptedQueuePool):
+    """`MeteredQueuePool` for engines of asyncio drivers"""
+
+
+class UnnamedStatementConnection(asyncpg.Connection):
+    """
+    asyncpg connection preparing every statement unnamed, so that none is left behind
+    on a server connection that PgBouncer goes on to hand to another client
+    """
+
+    async def prepare(self, query: str, *, name: Optional[str] = None, **kwargs: Any):
+        # The unnamed statement lasts until the next one is prepared, which is all
+        # SQLAlchemy needs of it, as it executes every statement straight after
+        return await super().prepare(query, name=name or "", **kwargs)
+
+
+def engine_options(settings: Settings, asynchronous: bool = False) -> dict[str, Any]:
+    """Keyword arguments to create the engine of either driver with"""
+    options: dict[str, Any] = {
+        "poolclass": MeteredAsyncQueuePool if asynchronous else MeteredQueuePool,
+        "pool_size": settings.pool_size,
+        "max_overflow": settings.pool_max_overflow,
+        "pool_timeout": settings.pool_timeout,
+        "pool_recycle": settings.pool_recycle,
+        "pool_pre_ping": settings.pool_pre_ping,
+    }
+    connect_args: dict[str, Any] = {}
+    if settings.pgbouncer:
+        # PgBouncer hands every transaction to any of its server connections, which
+        # don't have the statements prepared on another one. Startup options can't go
+        # through it either, so the statement timeout is set per transaction instead.
+        if asynchronous:
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["connection_class"] = UnnamedStatementConnection
+    elif settings.statement_timeout:
+        timeout = str(settings.statement_timeout)
+        if asynchronous:
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def limit_statements(engine: Engine, settings: Settings) -> None:
+    """Set the statement timeout at the start of every transaction behind PgBouncer"""
+    if not (settings.pgbouncer and settings.statement_timeout):
+        return
+
+    @event.listens_for(engine, "begin")
+    def set_statement_timeout(connection):
+        # Run on the DBAPI connection, whose first statement begins the transaction,
+        # and the setting ends with it instead of leaking to other clients of the
+        # server connection. A connection checked out once may begin many of them.
+        cursor = connection.connection.cursor()
+        cursor.execute(f"SET LOCAL statement_timeout = {settings.statement_timeout}")
+        cursor.close()
+
+
+def pool_statistics(pool: Pool) -> dict[str, float]:
+    """Current state of `pool` along with its counters"""
+    statistics: dict[str, float] = {}
+    if isinstance(pool, QueuePool):
+        statistics |= {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+    if isinstance(pool, MeteredQueuePool):
+        statistics |= pool.counters.snapshot()
+    return statistics
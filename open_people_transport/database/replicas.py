@@ -0,0 +1,151 @@
+"""
+Routing of read-only requests to replicas of the database.
+
+Reads are spread over the replicas that passed their last health check in turn, and
+fall back to the primary when none did. A client that wrote to the primary gets a
+cookie that keeps its reads on the primary for a while, so it sees its own writes
+before they reach the replicas.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import count
+from typing import AsyncIterator, Optional, Union
+
+from fastapi import Depends, Request, Response
+from open_people_transport.settings import get_settings
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from . import async_url, get_async_session, get_async_sessionmaker
+from .pool import engine_options, limit_statements
+
+# Cookie holding the time until which the reads of the client go to the primary
+STICKY_COOKIE = "read_primary_until"
+
+# Key of `Session.info` that marks the sessions of replicas
+REPLICA = "replica"
+
+
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    healthy: bool = True
+
+
+class ReplicaRouter:
+    def __init__(self, engines: list[AsyncEngine]) -> None:
+        self.replicas = [Replica(engine) for engine in engines]
+        self._turns = count()
+        self._monitor: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """Engine of the next healthy replica, or None if there is none"""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turns) % len(healthy)].engine
+
+    async def check(self, timeout: float) -> None:
+        await asyncio.gather(
+            *(self._check(replica, timeout) for replica in self.replicas)
+        )
+
+    async def _check(self, replica: Replica, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._ping(replica.engine), timeout)
+        except (SQLAlchemyError, OSError, asyncio.TimeoutError):
+            replica.healthy = False
+        else:
+            replica.healthy = True
+
+    @staticmethod
+    async def _ping(engine: AsyncEngine) -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    def start(self, interval: float) -> None:
+        """Check the health of the replicas every `interval` seconds from now on"""
+        if self.replicas and self._monitor is None:
+            self._monitor = asyncio.create_task(self._run_checks(interval))
+
+    async def _run_checks(self, interval: float) -> None:
+        while True:
+            await self.check(interval)
+            await asyncio.sleep(interval)
+
+
+@lru_cache
+def get_replica_router() -> ReplicaRouter:
+    settings = get_settings()
+    engines = []
+    for url in settings.replica_urls:
+        engine = create_async_engine(
+            async_url(url), future=True, **engine_options(settings, asynchronous=True)
+        )
+        limit_statements(engine.sync_engine, settings)
+        engines.append(engine)
+    return ReplicaRouter(engines)
+
+
+def reads_from_replica(session: Union[Session, AsyncSession]) -> bool:
+    """
+    Whether `session` reads from a replica, which may lag behind the primary and the
+    table versions of this process, so that what it reads mustn't be cached as current
+    """
+    return session.info.get(REPLICA, False)
+
+
+def reads_from_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def stick_to_primary(response: Response) -> None:
+    stickiness = get_settings().replica_stickiness
+    response.set_cookie(
+        STICKY_COOKIE,
+        str(time.time() + stickiness),
+        max_age=int(stickiness) + 1,
+        httponly=True,
+    )
+
+
+@asynccontextmanager
+async def open_read_session(
+    request: Request, session: AsyncSession, router: ReplicaRouter
+) -> AsyncIterator[AsyncSession]:
+    """A session on a replica, or `session` on the primary if the client just wrote"""
+    engine = None if reads_from_primary(request) else router.pick()
+    if engine is None:
+        yield session
+        return
+    async with get_async_sessionmaker()(
+        bind=engine, info={REPLICA: True}
+    ) as replica_session:
+        yield replica_session
+
+
+async def get_read_session(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    router: ReplicaRouter = Depends(get_replica_router),
+) -> AsyncIterator[AsyncSession]:
+    async with open_read_session(request, session, router) as read_session:
+        yield read_session
+
+
+async def get_write_session(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    router: ReplicaRouter = Depends(get_replica_router),
+) -> AsyncSession:
+    if router.replicas:
+        stick_to_primary(response)
+    return session
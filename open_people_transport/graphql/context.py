@@ -1,13 +1,67 @@
-from fastapi import Depends
-from open_people_transport.database import get_session
-from sqlalchemy.orm import Session
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends, Request, Response
+from graphql import GraphQLError, OperationType, get_operation_ast, parse
+from open_people_transport.database import get_async_session
+from open_people_transport.database.replicas import (
+    ReplicaRouter,
+    get_replica_router,
+    open_read_session,
+    stick_to_primary,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 from strawberry.fastapi import BaseContext
 
+from .loaders import Loaders
+
 
 class Context(BaseContext):
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession):
         self.session = session
+        self.loaders = Loaders(session)
+
+
+@lru_cache(maxsize=1024)
+def is_mutation(query: str, operation_name: Optional[str]) -> bool:
+    try:
+        operation = get_operation_ast(parse(query), operation_name)
+    except GraphQLError:
+        return False
+    return operation is not None and operation.operation == OperationType.MUTATION
+
+
+async def writes(request: Request) -> bool:
+    """Whether the GraphQL request runs a mutation"""
+    if request.method == "GET":
+        data = dict(request.query_params)
+    elif "application/json" in request.headers.get("content-type", ""):
+        try:
+            data = await request.json()
+        except ValueError:
+            return False
+    else:
+        # File uploads are only ever sent to mutations
+        return True
+    query = data.get("query") if isinstance(data, dict) else None
+    if not isinstance(query, str):
+        return False
+    return is_mutation(query, data.get("operationName"))
 
 
-async def get_context(session=Depends(get_session)):
-    return Context(session)
+async def get_context(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    router: ReplicaRouter = Depends(get_replica_router),
+) -> AsyncIterator[Context]:
+    # Queries are read from a replica, mutations written to the primary along with
+    # what they read and return
+    if not router.replicas:
+        yield Context(session)
+    elif await writes(request):
+        stick_to_primary(response)
+        yield Context(session)
+    else:
+        async with open_read_session(request, session, router) as read_session:
+            yield Context(read_session)
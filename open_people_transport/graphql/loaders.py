@@ -0,0 +1,151 @@
+from collections import defaultdict
+from functools import partial
+from typing import Any
+
+from sqlalchemy import Column, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import RelationshipProperty, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.base import NO_VALUE
+from sqlalchemy.orm.util import identity_key
+from strawberry.dataloader import DataLoader
+
+from .pagination import Page
+
+
+class Loaders:
+    """
+    Per-request batch loaders for model relationships.
+
+    Every relationship gets its own data loader, so that all the lookups requested at
+    one level of a GraphQL query are fetched with a single `WHERE ... IN (...)`. So do
+    the lookups of rows of every model by primary key.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self._loaders: dict[RelationshipProperty, DataLoader] = {}
+        self._get_loaders: dict[type, DataLoader] = {}
+        self._page_loaders: dict[
+            tuple[RelationshipProperty, Column, Page], DataLoader
+        ] = {}
+
+    async def load(self, instance: Any, attribute: str) -> Any:
+        state = inspect(instance)
+        value = state.attrs[attribute].loaded_value
+        if value is not NO_VALUE:
+            return value
+        relationship = state.mapper.relationships[attribute]
+        ((local, _),) = relationship.local_remote_pairs
+        key = getattr(instance, state.mapper.get_property_by_column(local).key)
+        value = self._identity_lookup(relationship, key)
+        if value is None:
+            value = await self._loader(relationship).load(key)
+        set_committed_value(instance, attribute, value)
+        return value
+
+    async def get(self, model: type, key: Any) -> Any:
+        """The row of `model` with the primary key `key`, like `AsyncSession.get`"""
+        value = self._identity_get(model, key)
+        if value is None:
+            value = await self._get_loader(model).load(key)
+        return value
+
+    async def load_page(
+        self, instance: Any, attribute: str, key: Column, page: Page
+    ) -> list[Any]:
+        """Load a page of a collection, with one lookahead row past its end"""
+        state = inspect(instance)
+        relationship = state.mapper.relationships[attribute]
+        ((local, _),) = relationship.local_remote_pairs
+        parent = getattr(instance, state.mapper.get_property_by_column(local).key)
+        return await self._page_loader(relationship, key, page).load(parent)
+
+    def _identity_lookup(self, relationship: RelationshipProperty, key: Any) -> Any:
+        """Find a many-to-one target that is already loaded, like a lazy load would"""
+        if relationship.uselist:
+            return None
+        ((_, remote),) = relationship.local_remote_pairs
+        primary_key = relationship.mapper.primary_key
+        if len(primary_key) != 1 or primary_key[0] is not remote:
+            return None
+        return self._identity_get(relationship.mapper.class_, key)
+
+    def _identity_get(self, model: type, key: Any) -> Any:
+        value = self.session.identity_map.get(identity_key(model, key))
+        if value is None or inspect(value).expired_attributes:
+            return None
+        return value
+
+    def _get_loader(self, model: type) -> DataLoader:
+        if model not in self._get_loaders:
+            load_fn = partial(self._get_batch, model)
+            self._get_loaders[model] = DataLoader(load_fn=load_fn)
+        return self._get_loaders[model]
+
+    async def _get_batch(self, model: type, keys: list[Any]) -> list[Any]:
+        mapper = inspect(model)
+        (primary_key,) = mapper.primary_key
+        statement = select(model).where(primary_key.in_(keys))
+        values = (await self.session.execute(statement)).scalars().all()
+        attribute = mapper.get_property_by_column(primary_key).key
+        found = {getattr(value, attribute): value for value in values}
+        return [found.get(key) for key in keys]
+
+    def _loader(self, relationship: RelationshipProperty) -> DataLoader:
+        if relationship not in self._loaders:
+            load_fn = partial(self._load_batch, relationship)
+            self._loaders[relationship] = DataLoader(load_fn=load_fn)
+        return self._loaders[relationship]
+
+    async def _load_batch(
+        self, relationship: RelationshipProperty, keys: list[Any]
+    ) -> list[Any]:
+        ((_, remote),) = relationship.local_remote_pairs
+        statement = select(relationship.mapper).where(remote.in_(keys))
+        if relationship.order_by:
+            statement = statement.order_by(*relationship.order_by)
+        values = (await self.session.execute(statement)).scalars().all()
+        attribute = relationship.mapper.get_property_by_column(remote).key
+
+        if relationship.uselist:
+            groups = defaultdict(list)
+            for value in values:
+                groups[getattr(value, attribute)].append(value)
+            return [groups[key] for key in keys]
+        found = {getattr(value, attribute): value for value in values}
+        return [found.get(key) for key in keys]
+
+    def _page_loader(
+        self, relationship: RelationshipProperty, key: Column, page: Page
+    ) -> DataLoader:
+        if (relationship, key, page) not in self._page_loaders:
+            load_fn = partial(self._load_page_batch, relationship, key, page)
+            self._page_loaders[relationship, key, page] = DataLoader(load_fn=load_fn)
+        return self._page_loaders[relationship, key, page]
+
+    async def _load_page_batch(
+        self,
+        relationship: RelationshipProperty,
+        key: Column,
+        page: Page,
+        parents: list[Any],
+    ) -> list[list[Any]]:
+        # Number the rows of every parent separately, then cut each one at the page
+        ((_, remote),) = relationship.local_remote_pairs
+        rank = func.row_number().over(partition_by=remote, order_by=page.order(key))
+        statement = select(relationship.mapper, rank.label("rank"))
+        statement = page.filter(statement.where(remote.in_(parents)), key)
+        subquery = statement.subquery()
+        statement = select(aliased(relationship.mapper, subquery)).order_by(
+            subquery.c.rank
+        )
+        if page.size is not None:
+            statement = statement.where(subquery.c.rank <= page.size + 1)
+        values = (await self.session.execute(statement)).scalars().all()
+        attribute = relationship.mapper.get_property_by_column(remote).key
+
+        groups = defaultdict(list)
+        for value in values:
+            groups[getattr(value, attribute)].append(value)
+        return [groups[parent] for parent in parents]
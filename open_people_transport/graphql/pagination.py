@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Iterable, Optional, TypeVar
+
+import strawberry
+from sqlalchemy import Column
+from sqlalchemy.sql import Select
+
+T = TypeVar("T")
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    has_previous_page: bool
+    start_cursor: Optional[str]
+    end_cursor: Optional[str]
+
+
+@strawberry.type
+class Edge(Generic[T]):
+    cursor: str
+    node: T
+
+
+@strawberry.type
+class Connection(Generic[T]):
+    edges: list[Edge[T]]
+    page_info: PageInfo
+
+
+def encode_cursor(value: Any) -> str:
+    return urlsafe_b64encode(str(value).encode()).decode()
+
+
+def decode_cursor(cursor: str, key: Column) -> Any:
+    try:
+        return key.type.python_type(urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        raise RuntimeError("Invalid cursor")
+
+
+@dataclass(frozen=True)
+class Page:
+    """
+    Relay-style pagination arguments, applied as a keyset over a single column.
+    """
+
+    first: Optional[int] = None
+    after: Optional[str] = None
+    last: Optional[int] = None
+    before: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.first is not None and self.last is not None:
+            raise RuntimeError("Only one of `first` and `last` may be given")
+        if (self.size or 0) < 0:
+            raise RuntimeError("Page size may not be negative")
+
+    @property
+    def backwards(self) -> bool:
+        return self.last is not None
+
+    @property
+    def size(self) -> Optional[int]:
+        return self.last if self.backwards else self.first
+
+    def order(self, key: Column) -> Any:
+        return key.desc() if self.backwards else key.asc()
+
+    def filter(self, statement: Select, key: Column) -> Select:
+        if self.after is not None:
+            statement = statement.where(key > decode_cursor(self.after, key))
+        if self.before is not None:
+            statement = statement.where(key < decode_cursor(self.before, key))
+        return statement
+
+    def apply(self, statement: Select, key: Column) -> Select:
+        """Restrict `statement` to the page, fetching one extra row to look ahead"""
+        statement = self.filter(statement, key).order_by(self.order(key))
+        if self.size is not None:
+            statement = statement.limit(self.size + 1)
+        return statement
+
+    def connection(
+        self, values: Iterable[Any], key: Column, node: Callable[[Any], T]
+    ) -> Connection[T]:
+        values = list(values)
+        has_more = self.size is not None and len(values) > self.size
+        values = values[: self.size]
+        if self.backwards:
+            values.reverse()
+        edges = [
+            Edge(cursor=encode_cursor(getattr(value, key.key)), node=node(value))
+            for value in values
+        ]
+        return Connection(
+            edges=edges,
+            page_info=PageInfo(
+                has_next_page=has_more and not self.backwards,
+                has_previous_page=has_more and self.backwards,
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+            ),
+        )
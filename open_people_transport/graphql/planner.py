@@ -0,0 +1,67 @@
+from typing import Any, Iterable, Iterator, Optional
+
+from inflection import underscore
+from sqlalchemy import inspect
+from sqlalchemy.orm import Load, Mapper, RelationshipProperty
+from strawberry.types.nodes import SelectedField, Selection
+
+# Relationships nested deeper than this are left to the data loaders
+MAX_DEPTH = 3
+
+
+def eager_load(model: Any, selections: list[Selection]) -> list[Load]:
+    """
+    Translate a GraphQL selection set into loader options for a statement selecting
+    `model`, so that the requested relationships are fetched along with it.
+
+    Collections are loaded with `selectinload` (one extra query each, no row
+    explosion), many-to-one relationships with `joinedload`. Back references are
+    skipped, since their targets are already in the identity map, which also breaks
+    the cycles the schema allows.
+    """
+    return list(_options(inspect(model), selections, None, None, 0))
+
+
+def connection_nodes(selections: list[Selection]) -> list[Selection]:
+    """Selections made on the nodes of a connection"""
+    return [
+        selection
+        for edges in _fields(selections)
+        if edges.name == "edges"
+        for node in _fields(edges.selections)
+        if node.name == "node"
+        for selection in node.selections
+    ]
+
+
+def _options(
+    mapper: Mapper,
+    selections: list[Selection],
+    parent: Optional[Load],
+    origin: Optional[RelationshipProperty],
+    depth: int,
+) -> Iterator[Load]:
+    for field in _fields(selections):
+        relationship = mapper.relationships.get(underscore(field.name))
+        if relationship is None:
+            continue
+        if origin is not None and origin.back_populates == relationship.key:
+            continue
+        attribute = getattr(mapper.class_, relationship.key)
+        if relationship.uselist:
+            option = (parent or Load(mapper)).selectinload(attribute)
+        else:
+            option = (parent or Load(mapper)).joinedload(attribute)
+        yield option
+        if depth + 1 < MAX_DEPTH:
+            yield from _options(
+                relationship.mapper, field.selections, option, relationship, depth + 1
+            )
+
+
+def _fields(selections: Iterable[Selection]) -> Iterator[SelectedField]:
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            yield selection
+        else:
+            yield from _fields(selection.selections)
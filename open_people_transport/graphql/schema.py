@@ -7,20 +7,51 @@ import geoalchemy2.shape
 import shapely.geometry.point
 import strawberry
 import strawberry.types
+from open_people_transport.core.models import Journey as CoreJourney
+from open_people_transport.core.models import JourneyLeg as CoreJourneyLeg
+from open_people_transport.core.models import Type as CoreType
+from open_people_transport.crud.async_services import (
+    AsyncJourneyService,
+    AsyncRouteStopService,
+)
+from open_people_transport.crud.exceptions import ResourceException, ResourceNotFound
+from open_people_transport.crud.reference import get_reference_cache
+from open_people_transport.crud.services import (
+    RouteStopService,
+    StopService,
+    TransferService,
+)
+from open_people_transport.crud.versions import get_table_versions
 from open_people_transport.database.models import Node as SQLNode
 from open_people_transport.database.models import Route as SQLRoute
 from open_people_transport.database.models import RouteStop as SQLRouteStop
 from open_people_transport.database.models import Stop as SQLStop
+from open_people_transport.database.models import Transfer as SQLTransfer
 from open_people_transport.database.models import Type as SQLType
-from sqlalchemy import desc, select
+from open_people_transport.database.replicas import reads_from_replica
+from open_people_transport.routing.graph import get_routing_graph
+from open_people_transport.spatial.index import get_stop_index
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 from strawberry import Private, Schema
+from strawberry.types.nodes import Selection
 
 from .context import Context
+from .pagination import Connection, Page
+from .planner import connection_nodes, eager_load
 
 Info: TypeAlias = strawberry.types.Info[Context, Any]
 
 
+def selections(info: Info) -> list[Selection]:
+    return info.selected_fields[0].selections
+
+
+def connection_selections(info: Info) -> list[Selection]:
+    return connection_nodes(selections(info))
+
+
 @strawberry.type
 class Type:
     name: str
@@ -28,8 +59,24 @@ class Type:
     model: Private[SQLType]
 
     @strawberry.field
-    def routes(self) -> list[Route]:
-        return list(map(Route.from_model, self.model.routes))
+    async def routes(self, info: Info) -> list[Route]:
+        models = await info.context.loaders.load(self.model, "routes")
+        return list(map(Route.from_model, models))
+
+    @strawberry.field
+    async def routes_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[Route]:
+        page = Page(first, after, last, before)
+        models = await info.context.loaders.load_page(
+            self.model, "routes", SQLRoute.id, page
+        )
+        return page.connection(models, SQLRoute.id, Route.from_model)
 
     @classmethod
     def from_model(cls, model: SQLType):
@@ -38,6 +85,14 @@ class Type:
             name=model.name,
         )
 
+    @classmethod
+    def from_core(cls, value: CoreType):
+        # A detached model still lets the routes of the type be loaded
+        return cls(
+            model=SQLType(name=value.name),
+            name=value.name,
+        )
+
 
 @strawberry.type
 class Route:
@@ -47,12 +102,36 @@ class Route:
     model: Private[SQLRoute]
 
     @strawberry.field
-    def type(self) -> Type:
-        return Type.from_model(self.model.type)
+    async def type(self, info: Info) -> Type:
+        cache = get_reference_cache()
+        value = cache.get(SQLType, self.model.type_name)
+        if value is None:
+            version = cache.version(SQLType)
+            model = await info.context.loaders.load(self.model, "type")
+            value = CoreType.from_orm(model)
+            if not reads_from_replica(info.context.session):
+                cache.put(SQLType, model.name, value, version)
+        return Type.from_core(value)
 
     @strawberry.field
-    def route_stops(self) -> list[RouteStop]:
-        return list(map(RouteStop.from_model, self.model.route_stops))
+    async def route_stops(self, info: Info) -> list[RouteStop]:
+        models = await info.context.loaders.load(self.model, "route_stops")
+        return list(map(RouteStop.from_model, models))
+
+    @strawberry.field
+    async def route_stops_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[RouteStop]:
+        page = Page(first, after, last, before)
+        models = await info.context.loaders.load_page(
+            self.model, "route_stops", SQLRouteStop.distance, page
+        )
+        return page.connection(models, SQLRouteStop.distance, RouteStop.from_model)
 
     @classmethod
     def from_model(cls, model: SQLRoute):
@@ -71,8 +150,24 @@ class Node:
     model: Private[SQLNode]
 
     @strawberry.field
-    def stops(self) -> list[Stop]:
-        return list(map(Stop.from_model, self.model.stops))
+    async def stops(self, info: Info) -> list[Stop]:
+        models = await info.context.loaders.load(self.model, "stops")
+        return list(map(Stop.from_model, models))
+
+    @strawberry.field
+    async def stops_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[Stop]:
+        page = Page(first, after, last, before)
+        models = await info.context.loaders.load_page(
+            self.model, "stops", SQLStop.id, page
+        )
+        return page.connection(models, SQLStop.id, Stop.from_model)
 
     @classmethod
     def from_model(cls, model: SQLNode):
@@ -92,23 +187,37 @@ class Stop:
     model: Private[SQLStop]
 
     @strawberry.field
-    def node(self) -> Node:
-        return Node.from_model(self.model.node)
+    async def node(self, info: Info) -> Node:
+        model = await info.context.loaders.load(self.model, "node")
+        return Node.from_model(model)
+
+    @strawberry.field
+    async def route_stops(self, info: Info) -> list[RouteStop]:
+        models = await info.context.loaders.load(self.model, "route_stops")
+        return list(map(RouteStop.from_model, models))
 
     @strawberry.field
-    def route_stops(self) -> list[RouteStop]:
-        return list(map(RouteStop.from_model, self.model.route_stops))
+    async def route_stops_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[RouteStop]:
+        page = Page(first, after, last, before)
+        models = await info.context.loaders.load_page(
+            self.model, "route_stops", SQLRouteStop.route_id, page
+        )
+        return page.connection(models, SQLRouteStop.route_id, RouteStop.from_model)
 
     @classmethod
     def from_model(cls, model: SQLStop):
-        shape = geoalchemy2.shape.to_shape(model.location)
-        if not isinstance(shape, shapely.geometry.point.Point):
-            raise RuntimeError("Could not parse a Point from WKB")
         return cls(
             model=model,
             id=model.id,
-            lat=shape.x,
-            lng=shape.y,
+            lat=model.lat,
+            lng=model.lon,
         )
 
 
@@ -125,12 +234,14 @@ class RouteStop:
     model: Private[SQLRouteStop]
 
     @strawberry.field
-    def route(self) -> Route:
-        return Route.from_model(self.model.route)
+    async def route(self, info: Info) -> Route:
+        model = await info.context.loaders.load(self.model, "route")
+        return Route.from_model(model)
 
     @strawberry.field
-    def stop(self) -> Stop:
-        return Stop.from_model(self.model.stop)
+    async def stop(self, info: Info) -> Stop:
+        model = await info.context.loaders.load(self.model, "stop")
+        return Stop.from_model(model)
 
     @classmethod
     def from_model(cls, model: SQLRouteStop):
@@ -140,149 +251,347 @@ class RouteStop:
         )
 
 
+@strawberry.type
+class JourneyLeg:
+    distance: int
+
+    route_id: Private[UUID]
+    from_stop_id: Private[UUID]
+    to_stop_id: Private[UUID]
+
+    @strawberry.field
+    async def route(self, info: Info) -> Route:
+        model = await info.context.loaders.get(SQLRoute, self.route_id)
+        return Route.from_model(model)
+
+    @strawberry.field
+    async def from_stop(self, info: Info) -> Stop:
+        model = await info.context.loaders.get(SQLStop, self.from_stop_id)
+        return Stop.from_model(model)
+
+    @strawberry.field
+    async def to_stop(self, info: Info) -> Stop:
+        model = await info.context.loaders.get(SQLStop, self.to_stop_id)
+        return Stop.from_model(model)
+
+    @classmethod
+    def from_core(cls, value: CoreJourneyLeg):
+        return cls(
+            distance=value.distance,
+            route_id=value.route_id,
+            from_stop_id=value.from_stop_id,
+            to_stop_id=value.to_stop_id,
+        )
+
+
+@strawberry.type
+class Journey:
+    distance: int
+    legs: list[JourneyLeg]
+
+    @classmethod
+    def from_core(cls, value: CoreJourney):
+        return cls(
+            distance=value.distance,
+            legs=list(map(JourneyLeg.from_core, value.legs)),
+        )
+
+
 @strawberry.type
 class Query:
     @strawberry.field
-    def types(self, info: Info) -> list[Type]:
-        statement = select(SQLType)
-        values = info.context.session.execute(statement).scalars().all()
+    async def types(self, info: Info) -> list[Type]:
+        statement = select(SQLType).options(*eager_load(SQLType, selections(info)))
+        values = (await info.context.session.execute(statement)).scalars().all()
         return list(map(Type.from_model, values))
 
     @strawberry.field
-    def routes(self, info: Info) -> list[Route]:
-        statement = select(SQLRoute)
-        values = info.context.session.execute(statement).scalars().all()
+    async def types_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[Type]:
+        page = Page(first, after, last, before)
+        statement = page.apply(select(SQLType), SQLType.name).options(
+            *eager_load(SQLType, connection_selections(info))
+        )
+        values = (await info.context.session.execute(statement)).scalars().all()
+        return page.connection(values, SQLType.name, Type.from_model)
+
+    @strawberry.field
+    async def routes(self, info: Info) -> list[Route]:
+        statement = select(SQLRoute).options(*eager_load(SQLRoute, selections(info)))
+        values = (await info.context.session.execute(statement)).scalars().all()
         return list(map(Route.from_model, values))
 
     @strawberry.field
-    def nodes(self, info: Info) -> list[Node]:
-        statement = select(SQLNode)
-        values = info.context.session.execute(statement).scalars().all()
+    async def routes_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[Route]:
+        page = Page(first, after, last, before)
+        statement = page.apply(select(SQLRoute), SQLRoute.id).options(
+            *eager_load(SQLRoute, connection_selections(info))
+        )
+        values = (await info.context.session.execute(statement)).scalars().all()
+        return page.connection(values, SQLRoute.id, Route.from_model)
+
+    @strawberry.field
+    async def nodes(self, info: Info) -> list[Node]:
+        statement = select(SQLNode).options(*eager_load(SQLNode, selections(info)))
+        values = (await info.context.session.execute(statement)).scalars().all()
         return list(map(Node.from_model, values))
 
     @strawberry.field
-    def stops(self, info: Info) -> list[Stop]:
-        statement = select(SQLStop)
-        values = info.context.session.execute(statement).scalars().all()
+    async def nodes_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[Node]:
+        page = Page(first, after, last, before)
+        statement = page.apply(select(SQLNode), SQLNode.id).options(
+            *eager_load(SQLNode, connection_selections(info))
+        )
+        values = (await info.context.session.execute(statement)).scalars().all()
+        return page.connection(values, SQLNode.id, Node.from_model)
+
+    @strawberry.field
+    async def stops(self, info: Info) -> list[Stop]:
+        statement = select(SQLStop).options(*eager_load(SQLStop, selections(info)))
+        values = (await info.context.session.execute(statement)).scalars().all()
+        return list(map(Stop.from_model, values))
+
+    @strawberry.field
+    async def stops_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> Connection[Stop]:
+        page = Page(first, after, last, before)
+        statement = page.apply(select(SQLStop), SQLStop.id).options(
+            *eager_load(SQLStop, connection_selections(info))
+        )
+        values = (await info.context.session.execute(statement)).scalars().all()
+        return page.connection(values, SQLStop.id, Stop.from_model)
+
+    @strawberry.field
+    async def nearby_stops(
+        self,
+        info: Info,
+        lat: float,
+        lng: float,
+        radius: float = 500,
+        limit: int = 20,
+    ) -> list[Stop]:
+        statement = StopService.nearby_query(lat, lng, radius, limit).options(
+            *eager_load(SQLStop, selections(info))
+        )
+        values = (await info.context.session.execute(statement)).scalars().all()
         return list(map(Stop.from_model, values))
 
     @strawberry.field
-    def route_stops(self, info: Info) -> list[RouteStop]:
-        statement = select(SQLRouteStop)
-        values = info.context.session.execute(statement).scalars().all()
+    async def route_stops(self, info: Info) -> list[RouteStop]:
+        statement = select(SQLRouteStop).options(
+            *eager_load(SQLRouteStop, selections(info))
+        )
+        values = (await info.context.session.execute(statement)).scalars().all()
         return list(map(RouteStop.from_model, values))
 
+    @strawberry.field
+    async def journey(
+        self,
+        info: Info,
+        from_stop: UUID,
+        to_stop: UUID,
+    ) -> Optional[Journey]:
+        try:
+            value = await AsyncJourneyService(info.context.session).plan(
+                from_stop, to_stop
+            )
+        except ResourceNotFound as exc:
+            if exc.resource_type is CoreJourney:
+                return None
+            raise RuntimeError("Stop not found")
+        return Journey.from_core(value)
+
 
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    def add_type(self, info: Info, name: str) -> Type:
-        model = SQLType(name=name)
-        info.context.session.add(model)
-        try:
-            info.context.session.commit()
-        except IntegrityError:
-            raise RuntimeError("Type with this name already exists")
-        return Type.from_model(model)
+    async def add_type(self, info: Info, name: str) -> Type:
+        def add(session: Session) -> SQLType:
+            model = SQLType(name=name)
+            session.add(model)
+            try:
+                session.commit()
+            except IntegrityError:
+                raise RuntimeError("Type with this name already exists")
+            get_table_versions().bump(SQLType)
+            return model
+
+        return Type.from_model(await info.context.session.run_sync(add))
 
     @strawberry.mutation
-    def add_route(
+    async def add_route(
         self,
         info: Info,
         number: str,
         type_name: str,
         stops: Optional[list[UUID]] = None,
     ) -> Route:
-        model = SQLRoute(number=number, type_name=type_name)
-        info.context.session.add(model)
-        if stops:
-            for i, stop_id in enumerate(stops):
-                route_stop = SQLRouteStop(
-                    distance=i * 100, route_id=model.id, stop_id=stop_id
-                )
-                info.context.session.add(route_stop)
+        def add(session: Session) -> SQLRoute:
+            model = SQLRoute(number=number, type_name=type_name)
+            session.add(model)
+            try:
+                session.flush()
+                # Commits the route along with its stops
+                RouteStopService(session).replace(model.id, stops or [])
+            except (IntegrityError, ResourceException):
+                session.rollback()
+                raise RuntimeError("Invalid or conflicting mutation arguments")
+            get_table_versions().bump(SQLRoute)
+            session.refresh(model)
+            return model
+
+        return Route.from_model(await info.context.session.run_sync(add))
+
+    @strawberry.mutation
+    async def set_route_stops(
+        self,
+        info: Info,
+        route_id: UUID,
+        stops: list[UUID],
+    ) -> list[RouteStop]:
         try:
-            info.context.session.commit()
-        except IntegrityError:
+            await AsyncRouteStopService(info.context.session).replace(route_id, stops)
+        except ResourceException:
             raise RuntimeError("Invalid or conflicting mutation arguments")
-        info.context.session.refresh(model)
-        return Route.from_model(model)
+        statement = (
+            select(SQLRouteStop)
+            .where(SQLRouteStop.route_id == route_id)
+            .order_by(SQLRouteStop.distance)
+            .options(*eager_load(SQLRouteStop, selections(info)))
+        )
+        values = (await info.context.session.execute(statement)).scalars().all()
+        return list(map(RouteStop.from_model, values))
 
     @strawberry.mutation
-    def add_node(
+    async def add_node(
         self,
         info: Info,
         name: str,
         stops: Optional[list[StopInput]] = None,
     ) -> Node:
-        model = SQLNode(name=name)
-        info.context.session.add(model)
-        if stops:
-            for stop in stops:
-                point = shapely.geometry.point.Point(stop.lng, stop.lat)
-                location = geoalchemy2.shape.from_shape(point)
-                stop_model = SQLStop(location=location, node_id=model.id)
-                info.context.session.add(stop_model)
-        try:
-            info.context.session.commit()
-        except IntegrityError:
-            raise RuntimeError("Invalid or conflicting mutation arguments")
-        info.context.session.refresh(model)
-        return Node.from_model(model)
+        def add(session: Session) -> SQLNode:
+            model = SQLNode(name=name)
+            session.add(model)
+            if stops:
+                for stop in stops:
+                    point = shapely.geometry.point.Point(stop.lng, stop.lat)
+                    location = geoalchemy2.shape.from_shape(point)
+                    stop_model = SQLStop(location=location, node=model)
+                    session.add(stop_model)
+            try:
+                session.flush()
+                for stop_model in model.stops:
+                    TransferService(session).connect(stop_model.id)
+                session.commit()
+            except IntegrityError:
+                raise RuntimeError("Invalid or conflicting mutation arguments")
+            get_table_versions().bump(SQLNode, SQLStop, SQLTransfer)
+            session.refresh(model)
+            if (index := get_stop_index()).ready:
+                for stop_model in model.stops:
+                    index.add(StopService.model_to_schema(stop_model))
+            if (graph := get_routing_graph()).ready:
+                for stop_model in model.stops:
+                    graph.set_stop(stop_model.id, model.id)
+            return model
+
+        return Node.from_model(await info.context.session.run_sync(add))
 
     @strawberry.mutation
-    def add_stop(
+    async def add_stop(
         self,
         info: Info,
         node_id: UUID,
         lat: float,
         lng: float,
     ) -> Stop:
-        point = shapely.geometry.point.Point(lng, lat)
-        location = geoalchemy2.shape.from_shape(point)
-        model = SQLStop(location=location, node_id=node_id)
-        info.context.session.add(model)
-        try:
-            info.context.session.commit()
-        except IntegrityError:
-            raise RuntimeError("Invalid or conflicting mutation arguments")
-        info.context.session.refresh(model)
-        return Stop.from_model(model)
+        def add(session: Session) -> SQLStop:
+            point = shapely.geometry.point.Point(lng, lat)
+            location = geoalchemy2.shape.from_shape(point)
+            model = SQLStop(location=location, node_id=node_id)
+            session.add(model)
+            try:
+                session.flush()
+                TransferService(session).connect(model.id)
+                session.commit()
+            except IntegrityError:
+                raise RuntimeError("Invalid or conflicting mutation arguments")
+            get_table_versions().bump(SQLStop, SQLTransfer)
+            session.refresh(model)
+            if (index := get_stop_index()).ready:
+                index.add(StopService.model_to_schema(model))
+            if (graph := get_routing_graph()).ready:
+                graph.set_stop(model.id, model.node_id)
+            return model
+
+        return Stop.from_model(await info.context.session.run_sync(add))
 
     @strawberry.mutation
-    def add_route_stop(
+    async def add_route_stop(
         self,
         info: Info,
         route_id: UUID,
         stop_id: UUID,
+        after_stop: Optional[UUID] = None,
     ) -> RouteStop:
-        statement = (
-            select(SQLRouteStop)
-            .where(SQLRouteStop.route_id == route_id)
-            .order_by(desc(SQLRouteStop.distance))
-        )
-        last_stop = info.context.session.execute(statement).scalars().first()
-        distance = last_stop.distance + 100 if last_stop else 0
-        model = SQLRouteStop(route_id=route_id, stop_id=stop_id, distance=distance)
-        info.context.session.add(model)
         try:
-            info.context.session.commit()
-        except IntegrityError:
+            await AsyncRouteStopService(info.context.session).create(
+                route_id, stop_id, after_stop
+            )
+        except ResourceException:
+            await info.context.session.rollback()
             raise RuntimeError("Invalid or conflicting mutation arguments")
-        info.context.session.refresh(model)
+        model = await info.context.session.get(SQLRouteStop, (route_id, stop_id))
         return RouteStop.from_model(model)
 
     @strawberry.mutation
-    def delete_unique(self, info: Info, uuid: UUID) -> None:
-        for ModelType in (SQLRoute, SQLNode, SQLStop):  # type: ignore
-            if model := info.context.session.get(ModelType, uuid):  # type: ignore
-                info.context.session.delete(model)
-                try:
-                    info.context.session.commit()
-                except IntegrityError:
-                    raise RuntimeError("Found, but could not delete the unit")
-                return
-        raise RuntimeError("Unique unit not found")
+    async def delete_unique(self, info: Info, uuid: UUID) -> None:
+        def delete(session: Session) -> None:
+            for ModelType in (SQLRoute, SQLNode, SQLStop):  # type: ignore
+                if model := session.get(ModelType, uuid):  # type: ignore
+                    session.delete(model)
+                    try:
+                        session.commit()
+                    except IntegrityError:
+                        raise RuntimeError("Found, but could not delete the unit")
+                    get_table_versions().bump(ModelType, SQLTransfer)
+                    if ModelType is SQLStop and (index := get_stop_index()).ready:
+                        index.remove(uuid)
+                    if (graph := get_routing_graph()).ready:
+                        if ModelType is SQLStop:
+                            graph.remove_stop(uuid)
+                        elif ModelType is SQLRoute:
+                            graph.remove_route(uuid)
+                    return
+            raise RuntimeError("Unique unit not found")
+
+        await info.context.session.run_sync(delete)
 
 
 schema = Schema(Query, Mutation)
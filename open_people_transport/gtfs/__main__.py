@@ -0,0 +1,36 @@
+import argparse
+import json
+
+from open_people_transport.crud.services import TransferService
+from open_people_transport.database import SessionLocal
+
+from .exporter import export_feed
+from .importer import import_feed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m open_people_transport.gtfs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="import a zipped GTFS feed")
+    import_parser.add_argument("feed", help="path to the feed")
+    import_parser.add_argument(
+        "--feed-id", default="gtfs", help="namespace for the ids of the feed entities"
+    )
+    export_parser = commands.add_parser("export", help="export a zipped GTFS feed")
+    export_parser.add_argument("feed", help="path to write the feed to")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        with SessionLocal() as session:
+            result = import_feed(session, args.feed, args.feed_id)
+            # Done in the background by the API, once its response is sent
+            result["transfers"] = TransferService(session).rebuild()
+        print(json.dumps(result))
+    elif args.command == "export":
+        with SessionLocal() as session, open(args.feed, "wb") as file:
+            for chunk in export_feed(session):
+                file.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Streaming export of the network as a GTFS feed.
+
+Every feed file is produced row by row from a server-side cursor and compressed into a
+zip archive written to an in-memory sink, which is emptied each time a few rows have
+been added. The archive is therefore never held in memory as a whole, and the first
+bytes are ready as soon as the first query returns.
+
+The network has no timetables, so every route is exported as a single trip running
+every day. Its stop times are made up from the distance along the route at a nominal
+speed, since feeds have to time at least the first and the last stop of every trip.
+"""
+import csv
+import io
+import zipfile
+from typing import Iterable, Iterator
+
+from open_people_transport.settings import get_settings
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .importer import ROUTE_TYPES
+
+# Rows fetched from the database and compressed at once
+CHUNK_SIZE = 1000
+
+SERVICE_ID = "always"
+
+ROUTE_TYPE_CODES = {name: code for code, name in ROUTE_TYPES.items()}
+
+QUERIES = {
+    "stations": """
+        SELECT node.id, node.name,
+               ST_Y(ST_Centroid(ST_Collect(stop.location::geometry))),
+               ST_X(ST_Centroid(ST_Collect(stop.location::geometry)))
+        FROM node JOIN stop ON stop.node_id = node.id
+        GROUP BY node.id
+        ORDER BY node.id
+    """,
+    "stops": """
+        SELECT stop.id, node.name,
+               ST_Y(stop.location::geometry), ST_X(stop.location::geometry),
+               stop.node_id
+        FROM stop JOIN node ON node.id = stop.node_id
+        ORDER BY stop.id
+    """,
+    "routes": """
+        SELECT id, number, type_name FROM route ORDER BY id
+    """,
+    "stop_times": """
+        SELECT route_id, stop_id,
+               row_number() OVER (PARTITION BY route_id ORDER BY distance),
+               distance
+        FROM route_stop
+        ORDER BY route_id, distance
+    """,
+}
+
+
+HEADERS = {
+    "agency.txt": ("agency_id", "agency_name", "agency_url", "agency_timezone"),
+    "calendar.txt": (
+        "service_id",
+        "monday",
+        "tuesday",
+        "wednesday",
+        "thursday",
+        "friday",
+        "saturday",
+        "sunday",
+        "start_date",
+        "end_date",
+    ),
+    "stops.txt": (
+        "stop_id",
+        "stop_name",
+        "stop_lat",
+        "stop_lon",
+        "location_type",
+        "parent_station",
+    ),
+    "routes.txt": ("route_id", "agency_id", "route_short_name", "route_type"),
+    "trips.txt": ("route_id", "service_id", "trip_id"),
+    "stop_times.txt": (
+        "trip_id",
+        "arrival_time",
+        "departure_time",
+        "stop_id",
+        "stop_sequence",
+        "shape_dist_traveled",
+    ),
+}
+
+
+class _Sink:
+    """Write-only file that hands out whatever has been written to it so far"""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _rows(session: Session, query: str) -> Iterator[tuple]:
+    result = session.execute(text(query), execution_options={"stream_results": True})
+    for partition in result.partitions(CHUNK_SIZE):
+        yield from partition
+
+
+def _files(session: Session) -> Iterator[tuple[str, Iterable[tuple]]]:
+    settings = get_settings()
+    agency = (
+        "1",
+        settings.gtfs_agency_name,
+        settings.gtfs_agency_url,
+        settings.gtfs_agency_timezone,
+    )
+    yield "agency.txt", [agency]
+    yield "calendar.txt", [(SERVICE_ID, *[1] * 7, "20000101", "20991231")]
+    yield "stops.txt", _stops(session)
+    yield "routes.txt", (
+        (id, "1", number, ROUTE_TYPE_CODES.get(type_name, 3))
+        for id, number, type_name in _rows(session, QUERIES["routes"])
+    )
+    yield "trips.txt", (
+        (id, SERVICE_ID, id) for id, _, _ in _rows(session, QUERIES["routes"])
+    )
+    yield "stop_times.txt", _stop_times(session)
+
+
+def _time(seconds: float) -> str:
+    """GTFS time of day, with hours going past 24 for trips running after midnight"""
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def _stop_times(session: Session) -> Iterator[tuple]:
+    settings = get_settings()
+    rows = _rows(session, QUERIES["stop_times"])
+    for route_id, stop_id, sequence, distance in rows:
+        time = _time(settings.gtfs_trip_start + distance / settings.gtfs_trip_speed)
+        yield route_id, time, time, stop_id, sequence, distance
+
+
+def _stops(session: Session) -> Iterator[tuple]:
+    for id, name, lat, lon in _rows(session, QUERIES["stations"]):
+        yield id, name, lat, lon, 1, ""
+    for id, name, lat, lon, node_id in _rows(session, QUERIES["stops"]):
+        yield id, name, lat, lon, 0, node_id
+
+
+def export_feed(session: Session) -> Iterator[bytes]:
+    """Generate a zipped GTFS feed of the whole network, piece by piece"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as feed:
+        for name, rows in _files(session):
+            with feed.open(name, "w", force_zip64=True) as file:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(HEADERS[name])
+                for number, row in enumerate(rows, start=1):
+                    writer.writerow(row)
+                    if number % CHUNK_SIZE == 0:
+                        file.write(buffer.getvalue().encode())
+                        buffer.seek(0)
+                        buffer.truncate()
+                        yield sink.take()
+                file.write(buffer.getvalue().encode())
+            yield sink.take()
+    yield sink.take()
@@ -0,0 +1,299 @@
+"""
+Bulk import of GTFS feeds.
+
+Feed files are streamed in chunks into temporary staging tables with `COPY`, and then
+merged into the network tables with a handful of set-based statements, so memory use
+stays bounded however large the feed is. Identifiers are derived from the feed id and
+the GTFS ids, which makes importing the same feed again update it in place.
+
+* Stations become nodes, and so do stops without a parent station.
+* Stops become stops of the node of their parent station (or their own one).
+* Routes become routes, with their `route_type` translated to a type name.
+* The longest trip of every route defines its stops, measured along the way.
+"""
+import csv
+import io
+import zipfile
+from typing import IO, Callable, Iterable, Iterator, Optional, Union
+
+from open_people_transport.crud.exceptions import InvalidFeed
+from open_people_transport.crud.services import JourneyService, StopService
+from open_people_transport.crud.versions import get_table_versions
+from open_people_transport.database.models import Node as SQLNode
+from open_people_transport.database.models import Route as SQLRoute
+from open_people_transport.database.models import RouteStop as SQLRouteStop
+from open_people_transport.database.models import Stop as SQLStop
+from open_people_transport.database.models import Type as SQLType
+from open_people_transport.routing.graph import get_routing_graph
+from open_people_transport.spatial.index import get_stop_index
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+CHUNK_SIZE = 50_000
+
+ROUTE_TYPES = {
+    0: "tram",
+    1: "subway",
+    2: "rail",
+    3: "bus",
+    4: "ferry",
+    5: "cable tram",
+    6: "aerial lift",
+    7: "funicular",
+    11: "trolleybus",
+    12: "monorail",
+}
+
+# Extended route types are grouped by hundreds
+EXTENDED_ROUTE_TYPES = {
+    1: "rail",
+    2: "bus",
+    4: "subway",
+    5: "subway",
+    6: "subway",
+    7: "bus",
+    8: "trolleybus",
+    9: "tram",
+    10: "ferry",
+    12: "ferry",
+    13: "aerial lift",
+    14: "funicular",
+}
+
+STAGING_TABLES = """
+CREATE TEMPORARY TABLE gtfs_stop (
+    gtfs_id text, name text, lat float8, lon float8, location_type int, parent text
+) ON COMMIT DROP;
+CREATE TEMPORARY TABLE gtfs_route (
+    gtfs_id text, number text, type_name text
+) ON COMMIT DROP;
+CREATE TEMPORARY TABLE gtfs_trip (
+    gtfs_id text, route text
+) ON COMMIT DROP;
+CREATE TEMPORARY TABLE gtfs_stop_time (
+    trip text, stop text, sequence int
+) ON COMMIT DROP;
+"""
+
+STAGING_INDEXES = """
+CREATE INDEX ON gtfs_stop (gtfs_id);
+CREATE INDEX ON gtfs_trip (gtfs_id);
+CREATE INDEX ON gtfs_stop_time (trip, sequence);
+ANALYZE gtfs_stop;
+ANALYZE gtfs_route;
+ANALYZE gtfs_trip;
+ANALYZE gtfs_stop_time;
+"""
+
+MERGES = {
+    "node": (
+        """
+        INSERT INTO node (id, name)
+        SELECT DISTINCT ON (node) md5(:feed || ':node:' || node)::uuid, left(name, 32)
+        FROM (
+            SELECT coalesce(nullif(s.parent, ''), s.gtfs_id) AS node,
+                   coalesce(p.name, s.name, '') AS name
+            FROM gtfs_stop s
+            LEFT JOIN gtfs_stop p ON p.gtfs_id = nullif(s.parent, '')
+            WHERE coalesce(s.location_type, 0) = 0
+        ) nodes
+        ORDER BY node
+        ON CONFLICT (id) DO UPDATE SET name = excluded.name
+        """,
+    ),
+    "stop": (
+        """
+        INSERT INTO stop (id, node_id, location)
+        SELECT DISTINCT ON (location) id, node_id, location
+        FROM (
+            SELECT md5(:feed || ':stop:' || gtfs_id)::uuid AS id,
+                   md5(:feed || ':node:' || coalesce(nullif(parent, ''), gtfs_id))::uuid
+                       AS node_id,
+                   ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography AS location
+            FROM gtfs_stop
+            WHERE coalesce(location_type, 0) = 0
+        ) stops
+        WHERE NOT EXISTS (
+            SELECT FROM stop WHERE stop.location = stops.location AND stop.id <> stops.id
+        )
+        ORDER BY location, id
+        ON CONFLICT (id) DO UPDATE
+        SET node_id = excluded.node_id, location = excluded.location
+        """,
+    ),
+    "type": (
+        """
+        INSERT INTO type (name)
+        SELECT DISTINCT type_name FROM gtfs_route
+        ON CONFLICT DO NOTHING
+        """,
+    ),
+    "route": (
+        """
+        INSERT INTO route (id, number, type_name)
+        SELECT md5(:feed || ':route:' || gtfs_id)::uuid, left(number, 6), type_name
+        FROM gtfs_route
+        ON CONFLICT (id) DO UPDATE
+        SET number = excluded.number, type_name = excluded.type_name
+        """,
+    ),
+    "route_stop": (
+        """
+        CREATE TEMPORARY TABLE gtfs_route_stop ON COMMIT DROP AS
+        WITH pattern AS (
+            SELECT DISTINCT ON (trip.route) trip.route, trip.gtfs_id AS trip
+            FROM gtfs_trip trip
+            JOIN gtfs_route route ON route.gtfs_id = trip.route
+            JOIN (
+                SELECT trip, count(*) AS length FROM gtfs_stop_time GROUP BY trip
+            ) length ON length.trip = trip.gtfs_id
+            ORDER BY trip.route, length.length DESC, trip.gtfs_id
+        ), visit AS (
+            SELECT md5(:feed || ':route:' || pattern.route)::uuid AS route_id,
+                   stop.id AS stop_id,
+                   stop_time.sequence,
+                   ST_Distance(
+                       lag(stop.location) OVER (
+                           PARTITION BY pattern.route ORDER BY stop_time.sequence
+                       ),
+                       stop.location
+                   ) AS step
+            FROM pattern
+            JOIN gtfs_stop_time stop_time ON stop_time.trip = pattern.trip
+            JOIN stop ON stop.id = md5(:feed || ':stop:' || stop_time.stop)::uuid
+        )
+        SELECT route_id, stop_id, sequence,
+               round(coalesce(sum(step) OVER (
+                   PARTITION BY route_id ORDER BY sequence
+               ), 0))::int AS distance
+        FROM visit
+        """,
+        """
+        DELETE FROM route_stop
+        WHERE route_id IN (SELECT route_id FROM gtfs_route_stop)
+        """,
+        """
+        INSERT INTO route_stop (route_id, stop_id, distance)
+        SELECT DISTINCT ON (route_id, stop_id) route_id, stop_id, distance
+        FROM gtfs_route_stop
+        ORDER BY route_id, stop_id, sequence
+        """,
+    ),
+}
+
+Row = dict[str, str]
+
+
+def route_type_name(code: str) -> str:
+    value = int(code)
+    if value in ROUTE_TYPES:
+        return ROUTE_TYPES[value]
+    return EXTENDED_ROUTE_TYPES.get(value // 100, "other")
+
+
+def _coordinate(value: Optional[str]) -> Optional[float]:
+    # Stops are located to 7 decimal places, about a centimeter, and feeds that give
+    # more would not fit the API
+    return round(float(value), 7) if value else None
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+
+COLUMNS: dict[str, tuple[str, str, Callable[[Row], Iterable]]] = {
+    "stops.txt": (
+        "gtfs_stop",
+        "gtfs_id, name, lat, lon, location_type, parent",
+        lambda row: (
+            row["stop_id"],
+            row.get("stop_name"),
+            _coordinate(row.get("stop_lat")),
+            _coordinate(row.get("stop_lon")),
+            _int(row.get("location_type")),
+            row.get("parent_station"),
+        ),
+    ),
+    "routes.txt": (
+        "gtfs_route",
+        "gtfs_id, number, type_name",
+        lambda row: (
+            row["route_id"],
+            row.get("route_short_name") or row.get("route_long_name") or "",
+            route_type_name(row["route_type"]),
+        ),
+    ),
+    "trips.txt": (
+        "gtfs_trip",
+        "gtfs_id, route",
+        lambda row: (row["trip_id"], row["route_id"]),
+    ),
+    "stop_times.txt": (
+        "gtfs_stop_time",
+        "trip, stop, sequence",
+        lambda row: (row["trip_id"], row["stop_id"], int(row["stop_sequence"])),
+    ),
+}
+
+
+def _chunks(rows: Iterator[Iterable], size: int) -> Iterator[io.StringIO]:
+    """Group rows into CSV buffers of at most `size` rows each"""
+    while True:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if count == size:
+                break
+        if count == 0:
+            return
+        buffer.seek(0)
+        yield buffer
+
+
+def _stage(cursor, feed: zipfile.ZipFile, name: str) -> None:
+    table, columns, convert = COLUMNS[name]
+    with feed.open(name) as file:
+        reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig"))
+        rows = map(convert, reader)
+        for chunk in _chunks(rows, CHUNK_SIZE):
+            statement = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+            cursor.copy_expert(statement, chunk)
+
+
+def import_feed(
+    session: Session, file: Union[str, IO[bytes]], feed_id: str = "gtfs"
+) -> dict[str, int]:
+    """Import a zipped GTFS feed, returning the numbers of merged rows per table"""
+    try:
+        with zipfile.ZipFile(file) as feed:
+            cursor = session.connection().connection.cursor()
+            cursor.execute(STAGING_TABLES)
+            for name in COLUMNS:
+                _stage(cursor, feed, name)
+            cursor.execute(STAGING_INDEXES)
+    except (zipfile.BadZipFile, KeyError, ValueError) as exc:
+        session.rollback()
+        raise InvalidFeed(exc)
+
+    result = {}
+    try:
+        for table, statements in MERGES.items():
+            for statement in statements:
+                merged = session.execute(text(statement), {"feed": feed_id})
+            result[table] = merged.rowcount
+    except (IntegrityError, DataError) as exc:
+        # Rows that can be staged but not merged, such as stops without coordinates
+        session.rollback()
+        raise InvalidFeed(exc.orig)
+    session.commit()
+    get_table_versions().bump(SQLType, SQLRoute, SQLNode, SQLStop, SQLRouteStop)
+
+    if (index := get_stop_index()).ready:
+        index.build(StopService(session).list())
+    if (graph := get_routing_graph()).ready:
+        JourneyService(session).build_graph(graph)
+    return result
@@ -4,9 +4,28 @@ from strawberry.fastapi import GraphQLRouter
 from uuid_extensions import uuid7
 
 from open_people_transport.crud.exceptions import ResourceException
+from open_people_transport.crud.notifications import get_change_listener
+from open_people_transport.crud.services import (
+    JourneyService,
+    StopService,
+    TypeService,
+)
+from open_people_transport.database import SessionLocal
+from open_people_transport.database.replicas import get_replica_router
 from open_people_transport.graphql.context import get_context
 from open_people_transport.graphql.schema import schema
-from open_people_transport.rest import nodes, routes, stops, types
+from open_people_transport.rest import (
+    admin,
+    gtfs,
+    journeys,
+    nodes,
+    routes,
+    stops,
+    types,
+)
+from open_people_transport.routing.graph import get_routing_graph
+from open_people_transport.settings import get_settings
+from open_people_transport.spatial.index import get_stop_index
 
 graphql_app = GraphQLRouter(schema, context_getter=get_context)
 
@@ -17,6 +36,47 @@ app.include_router(types.router)
 app.include_router(routes.router)
 app.include_router(nodes.router)
 app.include_router(stops.router)
+app.include_router(journeys.router)
+app.include_router(gtfs.router)
+app.include_router(admin.router)
+
+
+@app.on_event("startup")
+def build_stop_index():
+    if get_settings().stop_index:
+        with SessionLocal() as session:
+            get_stop_index().build(StopService(session).list())
+
+
+@app.on_event("startup")
+def build_routing_graph():
+    if get_settings().routing_graph:
+        with SessionLocal() as session:
+            JourneyService(session).build_graph(get_routing_graph())
+
+
+@app.on_event("startup")
+def warm_reference_cache():
+    if get_settings().reference_cache_warm:
+        with SessionLocal() as session:
+            TypeService(session).warm_cache()
+
+
+@app.on_event("startup")
+async def monitor_replicas():
+    get_replica_router().start(get_settings().replica_check_interval)
+
+
+@app.on_event("startup")
+def listen_to_changes():
+    if get_settings().change_notifications:
+        get_change_listener().start()
+
+
+@app.on_event("shutdown")
+def stop_listening_to_changes():
+    if get_settings().change_notifications:
+        get_change_listener().stop()
 
 
 @app.get("/uuid")
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, File, UploadFile
+from open_people_transport.crud.reference import get_reference_cache
+from open_people_transport.crud.services import TransferService
+from open_people_transport.database import get_pool_statistics, get_session
+from open_people_transport.database.pool import pool_statistics
+from open_people_transport.database.replicas import get_replica_router
+from open_people_transport.gtfs.importer import import_feed
+from sqlalchemy.orm import Session
+from starlette.status import HTTP_202_ACCEPTED
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def rebuild_transfers(session: Session) -> None:
+    # The session of the request is only closed once its background tasks are done
+    TransferService(session).rebuild()
+
+
+@router.post("/gtfs", response_model=dict[str, int], responses={400: {}})
+def import_gtfs_feed(
+    background_tasks: BackgroundTasks,
+    feed: UploadFile = File(...),
+    feed_id: str = "gtfs",
+    db: Session = Depends(get_session),
+):
+    result = import_feed(db, feed.file, feed_id)
+    # New stops are only connected to their neighbors once the response is sent
+    background_tasks.add_task(rebuild_transfers, db)
+    return result
+
+
+@router.post("/transfers", status_code=HTTP_202_ACCEPTED)
+def rebuild_stop_transfers(
+    background_tasks: BackgroundTasks, db: Session = Depends(get_session)
+):
+    background_tasks.add_task(rebuild_transfers, db)
+
+
+@router.get("/pool", response_model=dict[str, dict[str, float]])
+def read_pool_statistics():
+    # Every worker process has pools of its own
+    statistics = get_pool_statistics()
+    for i, replica in enumerate(get_replica_router().replicas):
+        statistics[f"replica-{i}"] = pool_statistics(replica.engine.pool)
+    return statistics
+
+
+@router.get("/caches", response_model=dict[str, dict[str, int]])
+def read_cache_statistics():
+    return {"reference": get_reference_cache().statistics()}
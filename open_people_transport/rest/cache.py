@@ -0,0 +1,107 @@
+"""
+Cache of serialized responses, kept until the tables they were read from change.
+
+Responses are cached per path and query along with the versions of their tables, and
+tagged with a hash of their body. A conditional request whose tag matches the cached
+response is answered with 304 straight away, without reading or serializing anything.
+
+Only responses read from the primary are cached. A replica may not have caught up with
+the writes that the versions of this process count yet, and what is read from it would
+otherwise be kept as current. Cached responses are served to reads from replicas too.
+"""
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+from fastapi import Request, Response
+from open_people_transport.crud.versions import get_table_versions
+from open_people_transport.database.replicas import reads_from_replica
+from open_people_transport.rest.responses import render
+from open_people_transport.settings import get_settings
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    versions: tuple[int, ...]
+    body: bytes
+    etag: str
+    headers: dict[str, str]
+
+
+class ResponseCache:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._responses: OrderedDict[Key, CachedResponse] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    async def respond(
+        self,
+        request: Request,
+        response: Response,
+        session: AsyncSession,
+        tables: Sequence[str],
+        load: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """
+        Response to `request` with the content returned by `load`, which is read from
+        `tables` with `session` and may set headers on `response`
+        """
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        # Versions are taken before loading, so that a write in the meantime makes the
+        # cached response stale rather than fresh
+        versions = get_table_versions().get(tables)
+        cached = self._responses.get(key)
+        if cached is None or cached.versions != versions:
+            cached = await self._load(versions, request, response, load)
+            if not reads_from_replica(session):
+                self._put(key, cached)
+        else:
+            self._responses.move_to_end(key)
+        headers = cached.headers | {"ETag": cached.etag}
+        if matches(request.headers.get("If-None-Match"), cached.etag):
+            return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(cached.body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    async def _load(
+        versions: tuple[int, ...],
+        request: Request,
+        response: Response,
+        load: Callable[[], Awaitable[Any]],
+    ) -> CachedResponse:
+        body = render(request, response, await load()).body
+        return CachedResponse(
+            versions=versions,
+            body=body,
+            etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            headers=dict(response.headers),
+        )
+
+    def _put(self, key: Key, cached: CachedResponse) -> None:
+        if self.size <= 0:
+            return
+        self._responses[key] = cached
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.size:
+            self._responses.popitem(last=False)
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether the `If-None-Match` header lists `etag`, compared weakly"""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@lru_cache
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(get_settings().response_cache_size)
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from open_people_transport.database import get_session
+from open_people_transport.gtfs.exporter import export_feed
+from sqlalchemy.orm import Session
+
+router = APIRouter(prefix="/gtfs", tags=["gtfs"])
+
+
+@router.get("/feed.zip", response_class=StreamingResponse)
+def export_gtfs_feed(db: Session = Depends(get_session)):
+    return StreamingResponse(
+        export_feed(db),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="feed.zip"'},
+    )
@@ -0,0 +1,33 @@
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+from open_people_transport.core.models import Journey, Reachability
+from open_people_transport.crud.services import JourneyService
+from open_people_transport.database import get_session
+from sqlalchemy.orm import Session
+
+router = APIRouter(prefix="/journeys", tags=["journeys"])
+
+MAX_DISTANCE = 200_000
+
+MAX_TRANSFERS = 5
+
+
+@router.get("/", response_model=Journey, responses={404: {}})
+def read_journey(
+    from_stop: UUID = Query(..., alias="from"),
+    to_stop: UUID = Query(..., alias="to"),
+    db: Session = Depends(get_session),
+):
+    return JourneyService(db).plan(from_stop, to_stop)
+
+
+@router.get("/reachable", response_model=Reachability, responses={404: {}})
+def read_reachable_stops(
+    from_stops: list[UUID] = Query(..., alias="from"),
+    distance: int = Query(5000, gt=0, le=MAX_DISTANCE),
+    transfers: int = Query(1, ge=0, le=MAX_TRANSFERS),
+    hull: bool = False,
+    db: Session = Depends(get_session),
+):
+    return JourneyService(db).reachable(from_stops, distance, transfers, hull)
@@ -1,29 +1,51 @@
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from open_people_transport.core.models import Node
-from open_people_transport.crud.services import NodeService
-from open_people_transport.database import get_session
-from sqlalchemy.orm import Session
+from open_people_transport.crud.async_services import AsyncNodeService
+from open_people_transport.database.replicas import (
+    get_read_session,
+    get_write_session,
+)
+from open_people_transport.rest.cache import get_response_cache
+from open_people_transport.rest.pagination import MAX_LIMIT, set_next_link
+from open_people_transport.rest.responses import FastJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-router = APIRouter(prefix="/nodes", tags=["nodes"])
+router = APIRouter(
+    prefix="/nodes", tags=["nodes"], default_response_class=FastJSONResponse
+)
 
 
 @router.get("/", response_model=list[Node])
-def read_nodes(db: Session = Depends(get_session)):
-    return NodeService(db).list()
+async def read_nodes(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    after: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    async def load() -> list[Node]:
+        nodes = await AsyncNodeService(db).list(limit=limit, after=after)
+        set_next_link(request, response, nodes, limit, lambda node: node.id)
+        return nodes
+
+    return await get_response_cache().respond(request, response, db, ["node"], load)
 
 
 @router.put("/", response_model=Node, responses={409: {}})
-def create_or_update_node(node: Node, db: Session = Depends(get_session)):
-    return NodeService(db).update(node)
+async def create_or_update_node(
+    node: Node, db: AsyncSession = Depends(get_write_session)
+):
+    return await AsyncNodeService(db).update(node)
 
 
 @router.get("/{node_id}", response_model=Node, responses={404: {}})
-def read_node(node_id: UUID, db: Session = Depends(get_session)):
-    return NodeService(db).get(node_id)
+async def read_node(node_id: UUID, db: AsyncSession = Depends(get_read_session)):
+    return await AsyncNodeService(db).get(node_id)
 
 
 @router.delete("/{node_id}", responses={409: {}})
-def delete_node(node_id: UUID, db: Session = Depends(get_session)):
-    return NodeService(db).delete(node_id)
+async def delete_node(node_id: UUID, db: AsyncSession = Depends(get_write_session)):
+    return await AsyncNodeService(db).delete(node_id)
@@ -0,0 +1,19 @@
+from typing import Any, Callable, Optional, Sequence
+
+from fastapi import Request, Response
+
+MAX_LIMIT = 1000
+
+
+def set_next_link(
+    request: Request,
+    response: Response,
+    items: Sequence[Any],
+    limit: Optional[int],
+    cursor: Callable[[Any], Any],
+) -> None:
+    """Point the `Link` header to the page after `items`, if it may not be empty"""
+    if limit is None or len(items) < limit:
+        return
+    url = request.url.include_query_params(limit=limit, after=cursor(items[-1]))
+    response.headers["Link"] = f'<{url}>; rel="next"'
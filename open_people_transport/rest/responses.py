@@ -0,0 +1,76 @@
+"""
+Fast serialization of responses.
+
+Routers choose `FastJSONResponse` as their default response class to have it render
+their responses. Contents rendered with `render` skip the validation against the
+response model and the conversion by `jsonable_encoder` that FastAPI applies to what
+an endpoint returns, since the services already return validated core models.
+
+List endpoints stream their rows as newline-delimited JSON to clients that accept it,
+batch by batch as they are read, instead of rendering the whole list at once.
+"""
+from decimal import Decimal
+from typing import Any, AsyncIterator
+
+import orjson
+import pydantic
+from fastapi import Request, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+NDJSON = "application/x-ndjson"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, pydantic.BaseModel):
+        # Fields of a model that has already been validated, as they are
+        return value.__dict__
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson, which serializes UUIDs and datetimes itself and
+    pydantic models by their fields
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+def response_class(request: Request) -> type[Response]:
+    """Default response class of the route serving `request`"""
+    value = request.scope["route"].response_class
+    return value.value if isinstance(value, DefaultPlaceholder) else value
+
+
+def render(request: Request, response: Response, content: Any) -> Response:
+    """
+    Response to `request` with `content` and the headers set on `response`, rendered
+    by the response class of the route
+    """
+    cls = response_class(request)
+    if not issubclass(cls, FastJSONResponse):
+        content = jsonable_encoder(content)
+    return cls(content, headers=dict(response.headers))
+
+
+def streams(request: Request) -> bool:
+    """Whether the client asks for the response as newline-delimited JSON"""
+    return NDJSON in request.headers.get("Accept", "")
+
+
+def stream(batches: AsyncIterator[list[Any]]) -> StreamingResponse:
+    """Newline-delimited JSON response, written batch by batch as they arrive"""
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for batch in batches:
+            yield b"".join(
+                orjson.dumps(item, default=_default, option=orjson.OPT_APPEND_NEWLINE)
+                for item in batch
+            )
+
+    return StreamingResponse(lines(), media_type=NDJSON)
@@ -1,66 +1,130 @@
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from open_people_transport.core.models import Route, RouteStop
-from open_people_transport.crud.services import RouteService, RouteStopService
-from open_people_transport.database import get_session
-from sqlalchemy.orm import Session
-
-router = APIRouter(prefix="/routes", tags=["routes"])
+from open_people_transport.crud.async_services import (
+    AsyncRouteService,
+    AsyncRouteStopService,
+)
+from open_people_transport.database.replicas import (
+    get_read_session,
+    get_write_session,
+)
+from open_people_transport.rest.cache import get_response_cache
+from open_people_transport.rest.pagination import MAX_LIMIT, set_next_link
+from open_people_transport.rest.responses import (
+    NDJSON,
+    FastJSONResponse,
+    render,
+    stream,
+    streams,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter(
+    prefix="/routes", tags=["routes"], default_response_class=FastJSONResponse
+)
 routes_router = APIRouter()
 stops_router = APIRouter(prefix="/{route_id}/stops")
 
 
 @routes_router.get("/", response_model=list[Route])
-def read_routes(db: Session = Depends(get_session)):
-    return RouteService(db).list()
+async def read_routes(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    after: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    async def load() -> list[Route]:
+        routes = await AsyncRouteService(db).list(limit=limit, after=after)
+        set_next_link(request, response, routes, limit, lambda route: route.id)
+        return routes
+
+    return await get_response_cache().respond(request, response, db, ["route"], load)
 
 
 @routes_router.put("/", response_model=Route, responses={409: {}})
-def create_or_update_route(route: Route, db: Session = Depends(get_session)):
-    return RouteService(db).update(route)
+async def create_or_update_route(
+    route: Route, db: AsyncSession = Depends(get_write_session)
+):
+    return await AsyncRouteService(db).update(route)
 
 
 @routes_router.get("/{route_id}", response_model=Route, responses={404: {}})
-def read_route(route_id: UUID, db: Session = Depends(get_session)):
-    return RouteService(db).get(route_id)
+async def read_route(route_id: UUID, db: AsyncSession = Depends(get_read_session)):
+    return await AsyncRouteService(db).get(route_id)
 
 
 @routes_router.delete("/{route_id}", responses={409: {}})
-def delete_route(route_id: UUID, db: Session = Depends(get_session)):
-    return RouteService(db).delete(route_id)
+async def delete_route(route_id: UUID, db: AsyncSession = Depends(get_write_session)):
+    return await AsyncRouteService(db).delete(route_id)
 
 
-@stops_router.get("/", response_model=list[RouteStop])
-def read_route_stops(route_id: UUID, db: Session = Depends(get_session)):
-    return RouteStopService(db).list(route_id=route_id)
+@stops_router.get(
+    "/", response_model=list[RouteStop], responses={200: {"content": {NDJSON: {}}}}
+)
+async def read_route_stops(
+    route_id: UUID,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    after: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    if streams(request):
+        return stream(
+            AsyncRouteStopService(db).stream(
+                route_id=route_id, limit=limit, after=after
+            )
+        )
+    route_stops = await AsyncRouteStopService(db).list(
+        route_id=route_id, limit=limit, after=after
+    )
+    set_next_link(
+        request, response, route_stops, limit, lambda route_stop: route_stop.distance
+    )
+    return render(request, response, route_stops)
+
+
+@stops_router.put("/", response_model=list[RouteStop], responses={404: {}, 409: {}})
+async def replace_route_stops(
+    route_id: UUID,
+    stop_ids: list[UUID],
+    db: AsyncSession = Depends(get_write_session),
+):
+    return await AsyncRouteStopService(db).replace(route_id=route_id, stop_ids=stop_ids)
 
 
-@stops_router.put("/{stop_id}", response_model=RouteStop, responses={409: {}})
-def create_route_stop(
+@stops_router.put("/{stop_id}", response_model=RouteStop, responses={404: {}, 409: {}})
+async def create_route_stop(
     route_id: UUID,
     stop_id: UUID,
-    db: Session = Depends(get_session),
+    after_stop: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_write_session),
 ):
-    return RouteStopService(db).create(route_id=route_id, stop_id=stop_id)
+    return await AsyncRouteStopService(db).create(
+        route_id=route_id, stop_id=stop_id, after_stop=after_stop
+    )
 
 
 @stops_router.get("/{stop_id}", response_model=RouteStop, responses={404: {}})
-def read_route_stop(
+async def read_route_stop(
     route_id: UUID,
     stop_id: UUID,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
-    return RouteStopService(db).get(route_id=route_id, stop_id=stop_id)
+    return await AsyncRouteStopService(db).get(route_id=route_id, stop_id=stop_id)
 
 
 @stops_router.delete("/{stop_id}", responses={409: {}})
-def delete_route_stop(
+async def delete_route_stop(
     route_id: UUID,
     stop_id: UUID,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_write_session),
 ):
-    return RouteStopService(db).delete(route_id=route_id, stop_id=stop_id)
+    return await AsyncRouteStopService(db).delete(route_id=route_id, stop_id=stop_id)
 
 
 router.include_router(routes_router)
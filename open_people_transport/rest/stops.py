@@ -1,29 +1,82 @@
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
-from open_people_transport.core.models import Stop
-from open_people_transport.crud.services import StopService
-from open_people_transport.database import get_session
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
+from open_people_transport.core.models import NearbyStop, Stop, Transfer
+from open_people_transport.crud.async_services import (
+    AsyncStopService,
+    AsyncTransferService,
+)
+from open_people_transport.database.replicas import (
+    get_read_session,
+    get_write_session,
+)
+from open_people_transport.rest.cache import get_response_cache
+from open_people_transport.rest.pagination import MAX_LIMIT, set_next_link
+from open_people_transport.rest.responses import (
+    NDJSON,
+    FastJSONResponse,
+    stream,
+    streams,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 
-router = APIRouter(prefix="/stops", tags=["stops"])
+router = APIRouter(
+    prefix="/stops", tags=["stops"], default_response_class=FastJSONResponse
+)
 
+MAX_RADIUS = 50_000
 
-@router.get("/", response_model=list[Stop])
-def read_stops(db: Session = Depends(get_session)):
-    return StopService(db).list()
+
+@router.get("/", response_model=list[Stop], responses={200: {"content": {NDJSON: {}}}})
+async def read_stops(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    after: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    if streams(request):
+        return stream(AsyncStopService(db).stream(limit=limit, after=after))
+
+    async def load() -> list[Stop]:
+        stops = await AsyncStopService(db).list(limit=limit, after=after)
+        set_next_link(request, response, stops, limit, lambda stop: stop.id)
+        return stops
+
+    return await get_response_cache().respond(request, response, db, ["stop"], load)
 
 
 @router.put("/", response_model=Stop, responses={409: {}})
-def create_or_update_stop(stop: Stop, db: Session = Depends(get_session)):
-    return StopService(db).update(stop)
+async def create_or_update_stop(
+    stop: Stop, db: AsyncSession = Depends(get_write_session)
+):
+    return await AsyncStopService(db).update(stop)
+
+
+@router.get("/nearby", response_model=list[NearbyStop])
+async def read_nearby_stops(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(500, gt=0, le=MAX_RADIUS),
+    limit: int = Query(20, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_read_session),
+):
+    return await AsyncStopService(db).nearby(lat, lon, radius, limit)
 
 
 @router.get("/{stop_id}", response_model=Stop, responses={404: {}})
-def read_stop(stop_id: UUID, db: Session = Depends(get_session)):
-    return StopService(db).get(stop_id)
+async def read_stop(stop_id: UUID, db: AsyncSession = Depends(get_read_session)):
+    return await AsyncStopService(db).get(stop_id)
+
+
+@router.get("/{stop_id}/transfers", response_model=list[Transfer], responses={404: {}})
+async def read_stop_transfers(
+    stop_id: UUID, db: AsyncSession = Depends(get_read_session)
+):
+    return await AsyncTransferService(db).list(stop_id)
 
 
 @router.delete("/{stop_id}", responses={409: {}})
-def delete_stop(stop_id: UUID, db: Session = Depends(get_session)):
-    return StopService(db).delete(stop_id)
+async def delete_stop(stop_id: UUID, db: AsyncSession = Depends(get_write_session)):
+    return await AsyncStopService(db).delete(stop_id)
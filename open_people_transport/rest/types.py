@@ -1,32 +1,55 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from open_people_transport.core.models import Type
-from open_people_transport.crud.services import TypeService
-from open_people_transport.database import get_session
-from sqlalchemy.orm import Session
+from open_people_transport.crud.async_services import AsyncTypeService
+from open_people_transport.database.replicas import (
+    get_read_session,
+    get_write_session,
+)
+from open_people_transport.rest.cache import get_response_cache
+from open_people_transport.rest.pagination import MAX_LIMIT, set_next_link
+from open_people_transport.rest.responses import FastJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-router = APIRouter(prefix="/types", tags=["types"])
+router = APIRouter(
+    prefix="/types", tags=["types"], default_response_class=FastJSONResponse
+)
 
 
 @router.get("/", response_model=list[Type])
-def read_types(db: Session = Depends(get_session)):
-    return TypeService(db).list()
+async def read_types(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    async def load() -> list[Type]:
+        types = await AsyncTypeService(db).list(limit=limit, after=after)
+        set_next_link(request, response, types, limit, lambda type: type.name)
+        return types
+
+    return await get_response_cache().respond(request, response, db, ["type"], load)
 
 
 @router.put("/", response_model=Type, responses={409: {}})
-def create_type(type: Type, db: Session = Depends(get_session)):
-    return TypeService(db).create(type)
+async def create_type(type: Type, db: AsyncSession = Depends(get_write_session)):
+    return await AsyncTypeService(db).create(type)
 
 
 @router.get("/{type_name}", response_model=Type, responses={404: {}})
-def read_type(type_name: str, db: Session = Depends(get_session)):
-    return TypeService(db).get(type_name)
+async def read_type(type_name: str, db: AsyncSession = Depends(get_read_session)):
+    return await AsyncTypeService(db).get(type_name)
 
 
 @router.put("/{type_name}", response_model=Type, responses={409: {}})
-def update_type(type_name: str, type: Type, db: Session = Depends(get_session)):
-    return TypeService(db).update(type_name, type)
+async def update_type(
+    type_name: str, type: Type, db: AsyncSession = Depends(get_write_session)
+):
+    return await AsyncTypeService(db).update(type_name, type)
 
 
 @router.delete("/{type_name}", responses={409: {}})
-def delete_type(type_name: str, db: Session = Depends(get_session)):
-    return TypeService(db).delete(type_name)
+async def delete_type(type_name: str, db: AsyncSession = Depends(get_write_session)):
+    return await AsyncTypeService(db).delete(type_name)
@@ -0,0 +1,362 @@
+"""
+Journey planning over the routes of the network.
+
+Passengers change routes for free between the stops of the same node, so every node is
+a single vertex of the graph. Every route contributes an edge from the node of each of
+its stops to the node of the next one, weighted by the distance between the stops.
+
+The edges of every route are kept in arrays of their own, indexed by stop slots that
+never move, so a change to a route only replaces its arrays. Before the next query
+they are concatenated and sorted into compressed sparse rows. Searches relax all edges
+leaving the nodes improved by the previous step at once, with array operations, which
+keeps the number of interpreted steps down to the number of hops of the journey.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from threading import RLock
+from typing import Any, Callable, Hashable, Iterable, Optional, TypeVar
+from uuid import UUID
+
+import numpy as np
+from open_people_transport.core.models import (
+    Journey,
+    JourneyLeg,
+    ReachableStop,
+    RouteStop,
+)
+from open_people_transport.settings import get_settings
+
+from .reach import Network, reach, sweep
+
+# Part of a journey: route, stop slots it goes from and to, and distance
+Hop = tuple[int, int, int, int]
+
+
+UNREACHED = np.iinfo(np.int64).max
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class _Rows:
+    """Edges grouped by the node they leave, in compressed sparse row form"""
+
+    starts: np.ndarray
+    origins: np.ndarray
+    targets: np.ndarray
+    weights: np.ndarray
+    routes: np.ndarray
+    from_stops: np.ndarray
+    to_stops: np.ndarray
+
+    @classmethod
+    def sort(
+        cls,
+        origins: np.ndarray,
+        targets: np.ndarray,
+        size: int,
+        *edges: np.ndarray,
+    ) -> "_Rows":
+        order = np.argsort(origins, kind="stable")
+        starts = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(origins, minlength=size), out=starts[1:])
+        return cls(starts, *(column[order] for column in (origins, targets, *edges)))
+
+    def hop(self, edge: int) -> Hop:
+        return (
+            int(self.routes[edge]),
+            int(self.from_stops[edge]),
+            int(self.to_stops[edge]),
+            int(self.weights[edge]),
+        )
+
+    def leaving(self, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """All edges leaving any of `nodes`, along with the node each one leaves"""
+        firsts = self.starts[nodes]
+        counts = self.starts[nodes + 1] - firsts
+        ends = np.cumsum(counts)
+        edges = np.repeat(firsts - ends + counts, counts) + np.arange(ends[-1])
+        return edges, np.repeat(nodes, counts)
+
+
+@dataclass(frozen=True)
+class _Compiled:
+    rows: _Rows
+    stop_ids: list[Optional[UUID]]
+    route_ids: list[UUID]
+    nodes: np.ndarray
+    size: int
+    network: Network
+
+
+class RoutingGraph:
+    def __init__(self) -> None:
+        self.ready = False
+        self._lock = RLock()
+        self._version = 0
+        self._clear()
+
+    def build(
+        self, stops: Iterable[tuple[UUID, UUID]], route_stops: Iterable[RouteStop]
+    ) -> None:
+        """Build the graph from `(stop_id, node_id)` pairs and all route stops"""
+        with self._lock:
+            self._clear()
+            for stop_id, node_id in stops:
+                self._set_stop(stop_id, node_id)
+            routes: dict[UUID, list[RouteStop]] = {}
+            for route_stop in route_stops:
+                routes.setdefault(route_stop.route_id, []).append(route_stop)
+            for route_id, values in routes.items():
+                self._set_route(route_id, values)
+            self.ready = True
+
+    def set_stop(self, stop_id: UUID, node_id: UUID) -> None:
+        """Add a new stop or move an existing one to another node"""
+        with self._lock:
+            self._set_stop(stop_id, node_id)
+            self._invalidate()
+
+    def remove_stop(self, stop_id: UUID) -> None:
+        with self._lock:
+            slot = self._slots.pop(stop_id, None)
+            if slot is not None:
+                self._ids[slot] = None
+                self._free.append(slot)
+                self._invalidate()
+
+    def set_route(self, route_id: UUID, route_stops: Iterable[RouteStop]) -> None:
+        """Replace all stops of a route"""
+        with self._lock:
+            self._set_route(route_id, route_stops)
+            self._invalidate()
+
+    def remove_route(self, route_id: UUID) -> None:
+        with self._lock:
+            if self._routes.pop(route_id, None) is not None:
+                self._invalidate()
+
+    def plan(self, from_stop: UUID, to_stop: UUID) -> Optional[Journey]:
+        """The shortest journey between two stops, or None if there is none"""
+        with self._lock:
+            graph = self._compile()
+            source = self._nodes[self._slots[from_stop]]
+            target = self._nodes[self._slots[to_stop]]
+        hops = self._search(graph, source, target)
+        if hops is None:
+            return None
+        legs = self._legs(graph, hops)
+        return Journey(
+            from_stop_id=from_stop,
+            to_stop_id=to_stop,
+            distance=sum(leg.distance for leg in legs),
+            legs=legs,
+        )
+
+    def reachable(
+        self, from_stops: Iterable[UUID], max_distance: int, max_transfers: int
+    ) -> list[ReachableStop]:
+        """
+        Stops that can be reached from any of `from_stops` riding at most
+        `max_distance` meters and changing routes at most `max_transfers` times
+        """
+        with self._lock:
+            graph = self._compile()
+            sources = np.array([self._nodes[self._slots[id]] for id in from_stops])
+        best, rides = reach(graph.network, sources, max_distance, max_transfers)
+        (slots,) = np.nonzero(best[graph.nodes] != UNREACHED)
+        nodes = graph.nodes[slots]
+        return [
+            ReachableStop(
+                stop_id=stop_id, distance=distance, transfers=max(ride - 1, 0)
+            )
+            for stop_id, distance, ride in zip(
+                map(graph.stop_ids.__getitem__, slots.tolist()),
+                best[nodes].tolist(),
+                rides[nodes].tolist(),
+            )
+            if stop_id is not None
+        ]
+
+    def sweep(
+        self,
+        from_stops: Iterable[UUID],
+        max_distance: int,
+        max_transfers: int,
+        processes: Optional[int] = None,
+    ) -> dict[UUID, int]:
+        """Numbers of nodes reachable from every stop, counted in a process pool"""
+        with self._lock:
+            graph = self._compile()
+            from_stops = list(from_stops)
+            origins = [self._nodes[self._slots[id]] for id in from_stops]
+        counts = sweep(graph.network, origins, max_distance, max_transfers, processes)
+        return dict(zip(from_stops, map(int, counts)))
+
+    def cached(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        Result of `compute`, kept until the graph changes or enough newer results
+        push it out
+        """
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            version = self._version
+        value = compute()
+        with self._lock:
+            if version == self._version:
+                self._cache[key] = value
+                while len(self._cache) > get_settings().routing_cache_size:
+                    self._cache.popitem(last=False)
+        return value
+
+    def __contains__(self, stop_id: UUID) -> bool:
+        return stop_id in self._slots
+
+    def _clear(self) -> None:
+        self._slots: dict[UUID, int] = {}
+        self._ids: list[Optional[UUID]] = []
+        self._nodes: list[int] = []
+        self._node_slots: dict[UUID, int] = {}
+        self._free: list[int] = []
+        self._routes: dict[UUID, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._compiled: Optional[_Compiled] = None
+        self._cache: OrderedDict[Hashable, Any] = OrderedDict()
+        self._version += 1
+
+    def _invalidate(self) -> None:
+        self._compiled = None
+        self._version += 1
+        self._cache.clear()
+
+    def _set_stop(self, stop_id: UUID, node_id: UUID) -> None:
+        node = self._node_slots.setdefault(node_id, len(self._node_slots))
+        slot = self._slots.get(stop_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._ids)
+                self._ids.append(None)
+                self._nodes.append(node)
+            self._slots[stop_id] = slot
+        self._ids[slot] = stop_id
+        self._nodes[slot] = node
+
+    def _set_route(self, route_id: UUID, route_stops: Iterable[RouteStop]) -> None:
+        values = sorted(
+            (value.distance, self._slots[value.stop_id])
+            for value in route_stops
+            if value.stop_id in self._slots
+        )
+        distances = np.array([distance for distance, _ in values], dtype=np.int64)
+        slots = np.array([slot for _, slot in values], dtype=np.int64)
+        self._routes[route_id] = (slots[:-1], slots[1:], np.diff(distances))
+
+    def _compile(self) -> _Compiled:
+        if self._compiled is not None:
+            return self._compiled
+        route_ids = list(self._routes)
+        parts = [self._routes[route_id] for route_id in route_ids]
+        empty = np.zeros(0, dtype=np.int64)
+        from_stops, to_stops, weights = (
+            np.concatenate([part[i] for part in parts] + [empty]) for i in range(3)
+        )
+        routes = np.repeat(np.arange(len(parts)), [len(part[0]) for part in parts])
+        nodes = np.array(self._nodes, dtype=np.int64)
+        origins, targets = nodes[from_stops], nodes[to_stops]
+        size = len(self._node_slots)
+        edges = (weights, routes, from_stops, to_stops)
+        self._compiled = _Compiled(
+            rows=_Rows.sort(origins, targets, size, *edges),
+            stop_ids=list(self._ids),
+            route_ids=route_ids,
+            nodes=nodes,
+            size=size,
+            network=Network.from_hops(routes, origins, targets, weights, size),
+        )
+        return self._compiled
+
+    @staticmethod
+    def _search(graph: _Compiled, source: int, target: int) -> Optional[list[Hop]]:
+        """
+        Hops of a shortest path between two nodes. Paths are only followed for as long
+        as they are shorter than the best one found to the target so far.
+        """
+        rows = graph.rows
+        distances = np.full(graph.size, UNREACHED)
+        via = np.full(graph.size, -1)
+        distances[source] = 0
+        frontier = np.array([source])
+        while frontier.size:
+            edges, origins = rows.leaving(frontier)
+            totals = distances[origins] + rows.weights[edges]
+            nodes = rows.targets[edges]
+            better = (totals < distances[nodes]) & (totals < distances[target])
+            edges, totals, nodes = edges[better], totals[better], nodes[better]
+            # Keep the shortest of the improvements to every node
+            order = np.lexsort((totals, nodes))
+            edges, totals, nodes = edges[order], totals[order], nodes[order]
+            first = np.ones(len(nodes), dtype=bool)
+            first[1:] = nodes[1:] != nodes[:-1]
+            frontier = nodes[first]
+            distances[frontier] = totals[first]
+            via[frontier] = edges[first]
+
+        if distances[target] == UNREACHED:
+            return None
+        hops = []
+        node = target
+        while node != source:
+            edge = int(via[node])
+            hops.append(rows.hop(edge))
+            node = int(rows.origins[edge])
+        hops.reverse()
+        return hops
+
+    @classmethod
+    def _legs(cls, graph: _Compiled, hops: list[Hop]) -> list[JourneyLeg]:
+        """
+        Join consecutive hops along the same route into legs, staying on the route of
+        the previous leg wherever it goes the same way as the route found for a hop
+        """
+        legs: list[Hop] = []
+        for hop in hops:
+            if legs and legs[-1][0] != hop[0]:
+                hop = cls._stay(graph, legs[-1], hop) or hop
+            route, from_stop, to_stop, distance = hop
+            if legs and legs[-1][0] == route and legs[-1][2] == from_stop:
+                legs[-1] = (route, legs[-1][1], to_stop, legs[-1][3] + distance)
+            else:
+                legs.append(hop)
+        return [
+            JourneyLeg(
+                route_id=graph.route_ids[route],
+                from_stop_id=graph.stop_ids[from_stop],
+                to_stop_id=graph.stop_ids[to_stop],
+                distance=distance,
+            )
+            for route, from_stop, to_stop, distance in legs
+        ]
+
+    @staticmethod
+    def _stay(graph: _Compiled, leg: Hop, hop: Hop) -> Optional[Hop]:
+        """The same hop, but along the route of `leg`, if it's just as short"""
+        route, _, stop, _ = leg
+        rows, node = graph.rows, graph.nodes[stop]
+        for edge in range(rows.starts[node], rows.starts[node + 1]):
+            if (
+                rows.routes[edge] == route
+                and rows.from_stops[edge] == stop
+                and rows.targets[edge] == graph.nodes[hop[2]]
+                and rows.weights[edge] <= hop[3]
+            ):
+                return rows.hop(edge)
+        return None
+
+
+@lru_cache
+def get_routing_graph() -> RoutingGraph:
+    return RoutingGraph()
@@ -0,0 +1,121 @@
+"""
+Bounded reachability over the routes of the network.
+
+The search goes in rounds, one per ride. Every route is laid out as the nodes of its
+stops along with their distances from its start, and all routes are concatenated into
+a few flat arrays. Boarding a route at a stop costs the distance the node of the stop
+was reached at minus the distance of the stop along the route, so the best way to get
+to every stop of every route in a round is a running minimum of these costs. Running
+minimums of all routes are taken at once with a single accumulation, by lifting every
+route above all routes after it.
+
+Nothing in here depends on anything but the arrays, so a network can be handed to
+worker processes to sweep over many origins in parallel.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Iterable, Optional
+
+import numpy as np
+
+UNREACHED = np.iinfo(np.int64).max
+
+
+@dataclass(frozen=True)
+class Network:
+    """Stops of all routes in order, as their nodes and distances along the route"""
+
+    nodes: np.ndarray
+    distances: np.ndarray
+    # Number of routes after the route of every stop
+    lifts: np.ndarray
+    size: int
+
+    @classmethod
+    def from_hops(
+        cls,
+        routes: np.ndarray,
+        origins: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray,
+        size: int,
+    ) -> "Network":
+        """
+        Network of the hops between consecutive stops of all routes, given grouped by
+        route and in order along it, over `size` nodes
+        """
+        lifts = (routes.max(initial=0) - routes).astype(np.int64)
+        firsts = np.flatnonzero(np.diff(routes, prepend=-1))
+        totals = np.cumsum(weights)
+        lengths = np.diff(np.append(firsts, len(routes)))
+        totals -= np.repeat(totals[firsts] - weights[firsts], lengths)
+        return cls(
+            nodes=np.insert(targets, firsts, origins[firsts]),
+            distances=np.insert(totals, firsts, 0),
+            lifts=np.insert(lifts, firsts, lifts[firsts]),
+            size=size,
+        )
+
+
+def reach(
+    network: Network, sources: np.ndarray, max_distance: int, max_transfers: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Shortest distances to all nodes from the nearest of `sources`, riding at most
+    `max_distance` meters and changing routes at most `max_transfers` times, along
+    with the number of rides they take. Nodes out of reach are left `UNREACHED`.
+    """
+    best = np.full(network.size, UNREACHED)
+    rides = np.full(network.size, -1)
+    best[sources] = rides[sources] = 0
+    if not len(network.nodes):
+        return best, rides
+    # Gap between routes wider than the range of costs of boarding any of them
+    beyond = max_distance + 1
+    lifts = network.lifts * (beyond + int(network.distances.max()) + 1)
+    labels = best
+    for ride in range(1, max_transfers + 2):
+        boarding = labels[network.nodes]
+        costs = np.where(boarding <= max_distance, boarding - network.distances, beyond)
+        arrivals = np.minimum.accumulate(costs + lifts) - lifts + network.distances
+        within = arrivals <= max_distance
+        found = np.full(network.size, UNREACHED)
+        np.minimum.at(found, network.nodes[within], arrivals[within])
+        improved = found < best
+        if not improved.any():
+            break
+        best[improved] = found[improved]
+        rides[improved] = ride
+        # Only the nodes reached sooner than before are worth boarding from again
+        labels = np.where(improved, found, UNREACHED)
+    return best, rides
+
+
+_network: Optional[Network] = None
+
+
+def _start_worker(network: Network) -> None:
+    global _network
+    _network = network
+
+
+def _count(origin: int, max_distance: int, max_transfers: int) -> int:
+    assert _network is not None
+    best, _ = reach(_network, np.array([origin]), max_distance, max_transfers)
+    return int(np.count_nonzero(best != UNREACHED))
+
+
+def sweep(
+    network: Network,
+    origins: Iterable[int],
+    max_distance: int,
+    max_transfers: int,
+    processes: Optional[int] = None,
+) -> np.ndarray:
+    """Numbers of nodes reachable from each of `origins`, counted in worker processes"""
+    count = partial(_count, max_distance=max_distance, max_transfers=max_transfers)
+    with ProcessPoolExecutor(
+        processes, initializer=_start_worker, initargs=(network,)
+    ) as pool:
+        return np.fromiter(pool.map(count, origins, chunksize=64), dtype=np.int64)
@@ -0,0 +1,76 @@
+"""
+Distances along routes, computed over whole arrays of coordinates at once.
+"""
+from typing import Optional
+
+import numpy as np
+
+from .geodesy import EARTH_RADIUS
+
+Shape = tuple[np.ndarray, np.ndarray]
+
+
+def haversine_steps(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in meters between consecutive points given in degrees"""
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin(np.diff(lats) / 2) ** 2
+        + np.cos(lats[:-1]) * np.cos(lats[1:]) * np.sin(np.diff(lons) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def along_shape(lats: np.ndarray, lons: np.ndarray, shape: Shape) -> np.ndarray:
+    """
+    Distances in meters from the start of a shape polyline to the points nearest to
+    each of the stops, which are matched to the shape in order so that a route
+    passing the same place twice is measured correctly.
+    """
+    shape_lats, shape_lons = shape
+    lengths = haversine_steps(shape_lats, shape_lons)
+    starts = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+    # Project onto every segment in a plane tangent to the middle of that segment,
+    # which is precise enough at the scale of a segment
+    scale = np.cos(np.radians((shape_lats[:-1] + shape_lats[1:]) / 2))
+    dx = np.diff(shape_lons) * scale
+    dy = np.diff(shape_lats)
+    squared = np.maximum(dx**2 + dy**2, 1e-18)
+    result = np.empty(len(lats))
+    first, lowest = 0, 0.0
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        px = (lon - shape_lons[first:-1]) * scale[first:]
+        py = lat - shape_lats[first:-1]
+        t = np.clip((px * dx[first:] + py * dy[first:]) / squared[first:], 0, 1)
+        # Never back along the segment of the previous stop either
+        t[0] = max(t[0], lowest)
+        offsets = (px - t * dx[first:]) ** 2 + (py - t * dy[first:]) ** 2
+        segment = first + int(np.argmin(offsets))
+        lowest = t[segment - first]
+        result[i] = starts[segment] + lowest * lengths[segment]
+        first = segment
+    return result
+
+
+def route_distances(
+    lats: np.ndarray, lons: np.ndarray, shape: Optional[Shape] = None
+) -> np.ndarray:
+    """
+    Distances in meters from the first stop of a route to every one of its stops, along
+    its shape if there is one, or else in straight lines from stop to stop.
+    """
+    if len(lats) == 0:
+        return np.zeros(0)
+    if shape is not None and len(shape[0]) > 1:
+        distances = along_shape(lats, lons, shape)
+        return distances - distances[0]
+    return np.concatenate(([0.0], np.cumsum(haversine_steps(lats, lons))))
+
+
+def positions(distances: np.ndarray, start: int = 0) -> np.ndarray:
+    """
+    Whole meters from `start`, nudged forward where needed to be strictly increasing,
+    so that stops closer together than a meter still keep their order.
+    """
+    steps = np.arange(len(distances))
+    rounded = start + np.rint(distances).astype(np.int64)
+    return np.maximum.accumulate(rounded - steps) + steps
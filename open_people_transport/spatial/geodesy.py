@@ -0,0 +1,17 @@
+from math import asin, cos, radians, sin, sqrt
+
+# Mean Earth radius in meters
+EARTH_RADIUS = 6_371_008.8
+
+# Length of one degree of latitude in meters
+METERS_PER_DEGREE = EARTH_RADIUS * radians(1)
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters between two points given in degrees"""
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = (
+        sin((lat2 - lat1) / 2) ** 2
+        + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * asin(sqrt(min(a, 1.0)))
@@ -0,0 +1,198 @@
+import heapq
+from array import array
+from functools import lru_cache
+from math import ceil, cos, floor, pi, radians
+from threading import RLock
+from typing import Iterable, Iterator, Optional
+from uuid import UUID
+
+from open_people_transport.core.models import NearbyStop, Stop
+from open_people_transport.settings import get_settings
+
+from .geodesy import EARTH_RADIUS, METERS_PER_DEGREE, haversine
+
+Cell = tuple[int, int]
+
+
+class StopIndex:
+    """
+    In-memory grid index of stop locations.
+
+    Coordinates are kept in flat float arrays addressed by slot, and every grid cell
+    holds the slots of the stops inside it, so a lookup only has to measure the stops
+    in the few cells around the requested area.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self.ready = False
+        self._columns = ceil(360 / cell_size)
+        self._lock = RLock()
+        self._clear()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def build(self, stops: Iterable[Stop]) -> None:
+        with self._lock:
+            self._clear()
+            for stop in stops:
+                self._insert(stop)
+            self.ready = True
+
+    def add(self, stop: Stop) -> None:
+        """Insert a new stop or move an existing one"""
+        with self._lock:
+            self._remove(stop.id)
+            self._insert(stop)
+
+    def remove(self, id: UUID) -> None:
+        with self._lock:
+            self._remove(id)
+
+    def within(
+        self, lat: float, lon: float, radius: float, limit: int
+    ) -> list[NearbyStop]:
+        """Stops within `radius` meters from a point, nearest first"""
+        with self._lock:
+            found = heapq.nsmallest(limit, self._within(lat, lon, radius))
+            return [self._nearby_stop(slot, distance) for distance, slot in found]
+
+    def nearest(self, lat: float, lon: float, limit: int) -> list[NearbyStop]:
+        """The `limit` stops nearest to a point, however far they are"""
+        radius = self.cell_size * METERS_PER_DEGREE
+        with self._lock:
+            while True:
+                found = self.within(lat, lon, radius, limit)
+                if len(found) >= min(limit, len(self)) or radius > pi * EARTH_RADIUS:
+                    return found
+                radius *= 2
+
+    def bbox(self, south: float, west: float, north: float, east: float) -> list[Stop]:
+        """Stops inside a bounding box; `west` may be greater than `east`"""
+        with self._lock:
+            lat_span = (south, north)
+            if west <= east:
+                lon_span = (west, east)
+            else:
+                lon_span = (west, east + 360)
+            return [
+                self._stop(slot)
+                for slot in self._candidates(lat_span, lon_span)
+                if south <= self._lats[slot] <= north
+                and (
+                    west <= self._lons[slot] <= east
+                    if west <= east
+                    else not east < self._lons[slot] < west
+                )
+            ]
+
+    def pairs(self, radius: float) -> Iterator[tuple[UUID, UUID, float]]:
+        """
+        Every pair of distinct stops within `radius` meters from each other, in both
+        orders, along with the distance between them
+        """
+        with self._lock:
+            for slot, id in enumerate(self._ids):
+                if id is None:
+                    continue
+                lat, lon = self._lats[slot], self._lons[slot]
+                for distance, other in self._within(lat, lon, radius):
+                    if other != slot:
+                        yield id, self._ids[other], distance
+
+    def _clear(self) -> None:
+        self._lats = array("d")
+        self._lons = array("d")
+        self._ids: list[Optional[UUID]] = []
+        self._node_ids: list[Optional[UUID]] = []
+        self._slots: dict[UUID, int] = {}
+        self._free: list[int] = []
+        self._cells: dict[Cell, list[int]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        row = floor((lat + 90) / self.cell_size)
+        column = floor((lon + 180) / self.cell_size) % self._columns
+        return row, column
+
+    def _insert(self, stop: Stop) -> None:
+        lat, lon = float(stop.lat), float(stop.lon)
+        if self._free:
+            slot = self._free.pop()
+            self._lats[slot], self._lons[slot] = lat, lon
+            self._ids[slot], self._node_ids[slot] = stop.id, stop.node_id
+        else:
+            slot = len(self._ids)
+            self._lats.append(lat)
+            self._lons.append(lon)
+            self._ids.append(stop.id)
+            self._node_ids.append(stop.node_id)
+        self._slots[stop.id] = slot
+        self._cells.setdefault(self._cell(lat, lon), []).append(slot)
+
+    def _remove(self, id: UUID) -> None:
+        slot = self._slots.pop(id, None)
+        if slot is None:
+            return
+        cell = self._cell(self._lats[slot], self._lons[slot])
+        self._cells[cell].remove(slot)
+        if not self._cells[cell]:
+            del self._cells[cell]
+        self._ids[slot] = self._node_ids[slot] = None
+        self._free.append(slot)
+
+    def _within(
+        self, lat: float, lon: float, radius: float
+    ) -> Iterator[tuple[float, int]]:
+        lat_span = radius / METERS_PER_DEGREE
+        # Meridians converge, so the same distance spans more degrees of longitude
+        # the closer it gets to a pole
+        shrink = cos(radians(min(abs(lat) + lat_span, 90.0)))
+        lon_span = min(180.0, lat_span / max(shrink, 1e-9))
+        candidates = self._candidates(
+            (lat - lat_span, lat + lat_span), (lon - lon_span, lon + lon_span)
+        )
+        for slot in candidates:
+            distance = haversine(lat, lon, self._lats[slot], self._lons[slot])
+            if distance <= radius:
+                yield distance, slot
+
+    def _candidates(
+        self, lat_span: tuple[float, float], lon_span: tuple[float, float]
+    ) -> Iterator[int]:
+        """Slots of the stops in all cells overlapping an area"""
+        first_row, first_column = self._cell(lat_span[0], lon_span[0])
+        last_row, _ = self._cell(lat_span[1], lon_span[1])
+        width = floor((lon_span[1] + 180) / self.cell_size) - floor(
+            (lon_span[0] + 180) / self.cell_size
+        )
+        columns = {
+            (first_column + offset) % self._columns
+            for offset in range(min(width, self._columns - 1) + 1)
+        }
+        rows = range(first_row, last_row + 1)
+        if len(rows) * len(columns) > len(self._cells):
+            # Cheaper to go over the occupied cells than over the whole area
+            cells: Iterable[Cell] = [
+                cell for cell in self._cells if cell[0] in rows and cell[1] in columns
+            ]
+        else:
+            cells = ((row, column) for row in rows for column in columns)
+        for cell in cells:
+            yield from self._cells.get(cell, ())
+
+    def _stop(self, slot: int) -> Stop:
+        return Stop(
+            id=self._ids[slot],
+            node_id=self._node_ids[slot],
+            lat=self._lats[slot],
+            lon=self._lons[slot],
+        )
+
+    def _nearby_stop(self, slot: int, distance: float) -> NearbyStop:
+        return NearbyStop(**self._stop(slot).dict(), distance=distance)
+
+
+@lru_cache
+def get_stop_index() -> StopIndex:
+    return StopIndex(get_settings().stop_index_cell_size)
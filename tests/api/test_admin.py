@@ -0,0 +1,48 @@
+import random
+
+from open_people_transport.crud.services import TransferService
+from open_people_transport.database.models import Transfer
+from sqlalchemy import select
+
+from .test_nodes import test_create_node
+from .test_stops import mock_stop
+
+URL = "/admin/pool"
+
+
+def test_read_pool_statistics(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data) == {"sync", "async"}
+    for statistics in data.values():
+        assert statistics["size"] == 5
+        assert statistics["checked_out"] <= statistics["checkouts"]
+        assert statistics["timeouts"] == statistics["waits"] == 0
+
+
+def read_transfers(session):
+    return {
+        (row.from_stop_id, row.to_stop_id): (row.distance, row.duration)
+        for row in session.scalars(select(Transfer))
+    }
+
+
+def test_rebuild_transfers(client, session):
+    random.seed(0)
+    node = test_create_node(client)
+    # Spread over about 500 meters, so that some of them are within walking distance
+    for _ in range(30):
+        data = mock_stop(node) | {
+            "lat": 55.75 + random.randint(0, 4500) / 1_000_000,
+            "lon": 37.6 + random.randint(0, 8000) / 1_000_000,
+        }
+        assert client.put("/stops/", json=data).status_code == 200
+    # Found one stop at a time as they were added
+    connected = read_transfers(session)
+    assert connected
+    assert TransferService(session).rebuild() == len(connected)
+    assert read_transfers(session) == connected
+    response = client.post("/admin/transfers")
+    assert response.status_code == 202
+    assert read_transfers(session) == connected
@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .test_journeys import create_line, create_stop
+from .test_nodes import test_create_node
+from .test_route_stops import test_create_route_stop
+from .test_routes import test_create_route
+from .test_stops import test_create_stop
+
+URL = "/graphql"
+
+NESTED_QUERY = """
+{
+  routes {
+    number
+    type { name }
+    routeStops {
+      distance
+      stop {
+        node { name stops { id } }
+        routeStops { route { number } }
+      }
+    }
+  }
+}
+"""
+
+CYCLIC_QUERY = """
+{
+  routes {
+    routeStops {
+      route { number }
+      stop { routeStops { route { routeStops { stop { id } } } } }
+    }
+  }
+}
+"""
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    # GraphQL queries run on the async engine, which sync engine events are not
+    # fired for, so listen to all engines
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_network(client, size):
+    stops = [test_create_stop(client) for _ in range(size)]
+    for _ in range(size):
+        route = test_create_route(client)
+        for stop in stops:
+            test_create_route_stop(client, route, stop)
+
+
+def query_statement_count(client, query):
+    with count_statements() as statements:
+        response = client.post(URL, json={"query": query})
+    assert response.status_code == 200 and "errors" not in response.json()
+    return len(statements)
+
+
+def test_nested_query_statement_count(client):
+    create_network(client, 2)
+    small = query_statement_count(client, NESTED_QUERY)
+    create_network(client, 5)
+    large = query_statement_count(client, NESTED_QUERY)
+    assert small == large
+
+
+def test_cyclic_query_statement_count(client):
+    create_network(client, 2)
+    small = query_statement_count(client, CYCLIC_QUERY)
+    create_network(client, 5)
+    large = query_statement_count(client, CYCLIC_QUERY)
+    assert small == large
+
+
+ROUTE_STOPS_PAGE_QUERY = """
+query ($after: String) {
+  routesConnection(first: 1) {
+    edges {
+      node {
+        routeStopsConnection(first: 2, after: $after) {
+          edges { node { distance } }
+          pageInfo { hasNextPage endCursor }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def query_route_stops_page(client, after=None):
+    json = {"query": ROUTE_STOPS_PAGE_QUERY, "variables": {"after": after}}
+    response = client.post(URL, json=json)
+    assert response.status_code == 200 and "errors" not in response.json()
+    (route,) = response.json()["data"]["routesConnection"]["edges"]
+    return route["node"]["routeStopsConnection"]
+
+
+def test_route_stops_connection(client):
+    route = test_create_route(client)
+    data = [test_create_route_stop(client, route) for _ in range(3)]
+    page = query_route_stops_page(client)
+    distances = [edge["node"]["distance"] for edge in page["edges"]]
+    assert distances == [data[0]["distance"], data[1]["distance"]]
+    assert page["pageInfo"]["hasNextPage"]
+    page = query_route_stops_page(client, page["pageInfo"]["endCursor"])
+    distances = [edge["node"]["distance"] for edge in page["edges"]]
+    assert distances == [data[2]["distance"]]
+    assert not page["pageInfo"]["hasNextPage"]
+
+
+def test_stop_coordinates(client):
+    stop = test_create_stop(client)
+    response = client.post(URL, json={"query": "{ stops { id lat lng } }"})
+    assert response.status_code == 200 and "errors" not in response.json()
+    (data,) = response.json()["data"]["stops"]
+    assert data == {"id": stop["id"], "lat": stop["lat"], "lng": stop["lon"]}
+
+
+JOURNEY_QUERY = """
+query ($from: UUID!, $to: UUID!) {
+  journey(fromStop: $from, toStop: $to) {
+    legs { route { number } fromStop { id } toStop { id } }
+  }
+}
+"""
+
+
+def create_chain(client, length):
+    """Stops at both ends of `length` routes, each one going on from the last one"""
+    nodes = [test_create_node(client) for _ in range(length + 1)]
+    stops = []
+    for i in range(length):
+        stops.append(create_stop(client, nodes[i], 55.75, 37.6 + i / 100))
+        stops.append(create_stop(client, nodes[i + 1], 55.7501, 37.61 + i / 100))
+        create_line(client, stops[-2:])
+    return stops[0], stops[-1]
+
+
+def query_journey_statement_count(client, from_stop, to_stop, length):
+    json = {"query": JOURNEY_QUERY, "variables": {"from": from_stop, "to": to_stop}}
+    with count_statements() as statements:
+        response = client.post(URL, json=json)
+    assert response.status_code == 200 and "errors" not in response.json()
+    assert len(response.json()["data"]["journey"]["legs"]) == length
+    return len(statements)
+
+
+def test_journey_statement_count(client):
+    short = create_chain(client, 2)
+    long = create_chain(client, 5)
+    # The first journey planned builds the routing graph
+    query_journey_statement_count(client, *short, 2)
+    small = query_journey_statement_count(client, *short, 2)
+    large = query_journey_statement_count(client, *long, 5)
+    assert small == large
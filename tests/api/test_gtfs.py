@@ -0,0 +1,115 @@
+import csv
+import io
+import zipfile
+
+FEED = {
+    "stops.txt": (
+        "stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n"
+        "S1,Central,55.75,37.61,1,\n"
+        "P1,Central A,55.7501,37.6101,0,S1\n"
+        "P2,Central B,55.7502,37.6102,0,S1\n"
+        "P3,Park,55.76,37.62,,\n"
+    ),
+    "routes.txt": ("route_id,route_short_name,route_type\n" "R1,42,3\n"),
+    "trips.txt": ("route_id,service_id,trip_id\n" "R1,daily,T1\n" "R1,daily,T2\n"),
+    "stop_times.txt": (
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "T1,08:00:00,08:00:00,P1,1\n"
+        "T1,08:05:00,08:05:00,P3,2\n"
+        "T2,09:00:00,09:00:00,P2,1\n"
+    ),
+}
+
+
+def mock_feed(files=FEED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as feed:
+        for name, content in files.items():
+            feed.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_import_feed(client):
+    files = {"feed": ("feed.zip", mock_feed(), "application/zip")}
+    response = client.post("/admin/gtfs", files=files)
+    assert response.status_code == 200
+    nodes = client.get("/nodes/").json()
+    assert sorted(node["name"] for node in nodes) == ["Central", "Park"]
+    assert len(client.get("/stops/").json()) == 3
+    (route,) = client.get("/routes/").json()
+    assert route["number"] == "42" and route["type_name"] == "bus"
+    route_stops = client.get(f"/routes/{route['id']}/stops/").json()
+    assert [route_stop["distance"] for route_stop in route_stops][0] == 0
+    assert len(route_stops) == 2 and route_stops[1]["distance"] > 1000
+
+
+def test_reimport_feed(client):
+    files = {"feed": ("feed.zip", mock_feed(), "application/zip")}
+    assert client.post("/admin/gtfs", files=files).status_code == 200
+    assert client.post("/admin/gtfs", files=files).status_code == 200
+    assert len(client.get("/stops/").json()) == 3
+    assert len(client.get("/routes/").json()) == 1
+
+
+def test_import_precise_coordinates(client):
+    stops = (
+        "stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n"
+        "S1,Central,55.75,37.61,1,\n"
+        "P1,Central A,55.750123456789,37.610123456789,0,S1\n"
+        "P2,Central B,55.75024999999,37.61029999999,0,S1\n"
+        "P3,Park,55.7600000004,37.6199999996,,\n"
+    )
+    feed = mock_feed(FEED | {"stops.txt": stops})
+    files = {"feed": ("feed.zip", feed, "application/zip")}
+    assert client.post("/admin/gtfs", files=files).status_code == 200
+    response = client.get("/stops/")
+    assert response.status_code == 200
+    coordinates = sorted((stop["lat"], stop["lon"]) for stop in response.json())
+    assert coordinates == [
+        (55.7501235, 37.6101235),
+        (55.75025, 37.6103),
+        (55.76, 37.62),
+    ]
+
+
+def test_import_invalid_feed(client):
+    files = {"feed": ("feed.zip", b"not a zip", "application/zip")}
+    response = client.post("/admin/gtfs", files=files)
+    assert response.status_code == 400
+
+
+def test_import_feed_without_coordinates(client):
+    stops = (
+        "stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n"
+        "P1,Central,55.75,37.61,0,\n"
+        "P3,Park,,,0,\n"
+    )
+    feed = mock_feed(FEED | {"stops.txt": stops})
+    files = {"feed": ("feed.zip", feed, "application/zip")}
+    response = client.post("/admin/gtfs", files=files)
+    assert response.status_code == 400
+    assert client.get("/nodes/").json() == client.get("/stops/").json() == []
+
+
+def test_export_feed(client):
+    files = {"feed": ("feed.zip", mock_feed(), "application/zip")}
+    assert client.post("/admin/gtfs", files=files).status_code == 200
+    response = client.get("/gtfs/feed.zip")
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as feed:
+        assert {"agency.txt", "stops.txt", "routes.txt"} <= set(feed.namelist())
+        stops = feed.read("stops.txt").decode().splitlines()
+        stop_times = feed.read("stop_times.txt").decode().splitlines()
+    assert len(stops) == 1 + 2 + 3
+    assert len(stop_times) == 1 + 2
+    # Stop times are made up at 6 m/s from 08:00, the departure from the first stop
+    first, last = csv.DictReader(stop_times)
+    assert first["arrival_time"] == first["departure_time"] == "08:00:00"
+    seconds = 8 * 3600 + round(float(last["shape_dist_traveled"]) / 6)
+    hours, seconds = divmod(seconds, 3600)
+    time = f"{hours:02}:{seconds // 60:02}:{seconds % 60:02}"
+    assert last["arrival_time"] == last["departure_time"] == time > "08:00:00"
+    response = client.post(
+        "/admin/gtfs", files={"feed": ("feed.zip", response.content)}
+    )
+    assert response.status_code == 200
@@ -0,0 +1,161 @@
+from uuid import UUID
+
+from open_people_transport.routing.graph import get_routing_graph
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from uuid_extensions import uuid7
+
+from .test_nodes import test_create_node
+from .test_routes import test_create_route
+from .test_stops import mock_stop
+
+URL = "/journeys/"
+
+
+def create_stop(client, node, lat, lon):
+    data = mock_stop(node) | {"lat": lat, "lon": lon}
+    assert client.put("/stops/", json=data).status_code == 200
+    return data["id"]
+
+
+def create_line(client, stop_ids):
+    route = test_create_route(client)
+    response = client.put(f"/routes/{route['id']}/stops/", json=stop_ids)
+    assert response.status_code == 200
+    return route["id"]
+
+
+def test_read_journey(client):
+    nodes = [test_create_node(client) for _ in range(4)]
+    first = [create_stop(client, nodes[i], 55.75, 37.6 + i / 100) for i in range(3)]
+    transfer = create_stop(client, nodes[1], 55.7501, 37.61)
+    last = create_stop(client, nodes[3], 55.76, 37.61)
+    first_route = create_line(client, first)
+    second_route = create_line(client, [transfer, last])
+    response = client.get(URL, params={"from": first[0], "to": last})
+    assert response.status_code == 200
+    data = response.json()
+    assert [leg["route_id"] for leg in data["legs"]] == [first_route, second_route]
+    assert [(leg["from_stop_id"], leg["to_stop_id"]) for leg in data["legs"]] == [
+        (first[0], first[1]),
+        (transfer, last),
+    ]
+    assert data["distance"] == sum(leg["distance"] for leg in data["legs"])
+    response = client.get(URL, params={"from": first[0], "to": first[2]})
+    assert response.status_code == 200
+    assert [leg["route_id"] for leg in response.json()["legs"]] == [first_route]
+
+
+def test_read_journey_not_found(client):
+    nodes = [test_create_node(client) for _ in range(2)]
+    stops = [create_stop(client, nodes[i], 55.75, 37.6 + i / 100) for i in range(2)]
+    create_line(client, stops)
+    response = client.get(URL, params={"from": stops[1], "to": stops[0]})
+    assert response.status_code == 404
+    response = client.get(URL, params={"from": stops[0], "to": str(uuid7())})
+    assert response.status_code == 404
+
+
+def read_legs(client, from_stop, to_stop):
+    response = client.get(URL, params={"from": from_stop, "to": to_stop})
+    if response.status_code == 404:
+        return None
+    assert response.status_code == 200
+    return [
+        (leg["route_id"], leg["from_stop_id"], leg["to_stop_id"])
+        for leg in response.json()["legs"]
+    ]
+
+
+def test_read_journey_after_changes(client):
+    nodes = [test_create_node(client) for _ in range(4)]
+    first = [create_stop(client, nodes[i], 55.75, 37.6 + i / 100) for i in range(3)]
+    last = create_stop(client, nodes[3], 55.76, 37.61)
+    first_route = create_line(client, first)
+    assert read_legs(client, first[0], first[2]) == [(first_route, *first[::2])]
+    # The graph is built by the first journey planned, and changed along with the
+    # tables from then on
+    graph = get_routing_graph()
+    assert graph.ready
+    assert read_legs(client, first[0], last) is None
+    transfer = create_stop(client, nodes[1], 55.7501, 37.61)
+    second_route = create_line(client, [transfer, last])
+    assert read_legs(client, first[0], last) == [
+        (first_route, first[0], first[1]),
+        (second_route, transfer, last),
+    ]
+    # Moved to the node of the last stop of the first route
+    data = mock_stop(nodes[2], transfer) | {"lat": 55.7501, "lon": 37.62}
+    assert client.put("/stops/", json=data).status_code == 200
+    assert read_legs(client, first[0], last) == [
+        (first_route, first[0], first[2]),
+        (second_route, transfer, last),
+    ]
+    url = f"/routes/{second_route}/stops/"
+    assert client.put(url, json=[]).status_code == 200
+    assert client.delete(f"/routes/{second_route}").status_code == 200
+    assert read_legs(client, first[0], last) is None
+    url = f"/routes/{first_route}/stops/"
+    assert client.put(url + last).status_code == 200
+    assert read_legs(client, first[0], last) == [(first_route, first[0], last)]
+    assert client.delete(url + last).status_code == 200
+    assert read_legs(client, first[0], last) is None
+    assert client.delete(f"/stops/{transfer}").status_code == 200
+    assert UUID(transfer) not in graph
+    assert read_legs(client, first[0], first[1]) == [(first_route, *first[:2])]
+
+
+def read_reachable_stops(client, params):
+    response = client.get(URL + "reachable", params=params)
+    assert response.status_code == 200
+    return {stop["stop_id"]: stop for stop in response.json()["stops"]}
+
+
+def test_read_reachable_stops(client):
+    nodes = [test_create_node(client) for _ in range(4)]
+    first = [create_stop(client, nodes[i], 55.75, 37.6 + i / 100) for i in range(3)]
+    transfer = create_stop(client, nodes[1], 55.7501, 37.61)
+    last = create_stop(client, nodes[3], 55.76, 37.61)
+    create_line(client, first)
+    create_line(client, [transfer, last])
+    params = {"from": first[0], "distance": 10_000, "transfers": 1}
+    stops = read_reachable_stops(client, params)
+    assert set(stops) == {*first, transfer, last}
+    assert stops[first[0]]["distance"] == 0
+    assert stops[transfer]["distance"] == stops[first[1]]["distance"]
+    assert stops[last]["transfers"] == 1 and stops[first[2]]["transfers"] == 0
+    stops = read_reachable_stops(client, params | {"transfers": 0})
+    assert set(stops) == {*first, transfer}
+    stops = read_reachable_stops(client, params | {"distance": 1000})
+    assert set(stops) == {first[0], first[1], transfer}
+    response = client.get(URL + "reachable", params=params | {"hull": True})
+    assert response.status_code == 200
+    assert response.json()["hull"]["type"] == "Polygon"
+    response = client.get(URL + "reachable", params={"from": str(uuid7())})
+    assert response.status_code == 404
+
+
+def test_read_reachable_stops_cached(client):
+    nodes = [test_create_node(client) for _ in range(4)]
+    stops = [create_stop(client, nodes[i], 55.75, 37.6 + i / 100) for i in range(4)]
+    route = create_line(client, stops[:3])
+    params = {"from": stops[0], "distance": 10_000, "transfers": 0, "hull": True}
+    response = client.get(URL + "reachable", params=params)
+    assert response.status_code == 200
+    data = response.json()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(URL + "reachable", params=params)
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+    # Served from the cache, hull included
+    assert response.status_code == 200 and response.json() == data
+    assert not any("ST_ConcaveHull" in statement for statement in statements)
+    response = client.put(f"/routes/{route}/stops/", json=stops)
+    assert response.status_code == 200
+    assert set(read_reachable_stops(client, params)) == set(stops)
@@ -47,6 +47,17 @@ def test_read_nodes(client):
     assert response.status_code == 200 and response.json() == [data1, data2]
 
 
+def test_read_nodes_paginated(client):
+    data = sorted(
+        (test_create_node(client) for _ in range(3)), key=lambda node: node["id"]
+    )
+    response = client.get(URL, params={"limit": 2})
+    assert response.status_code == 200 and response.json() == data[:2]
+    response = client.get(response.links["next"]["url"])
+    assert response.status_code == 200 and response.json() == data[2:]
+    assert "next" not in response.links
+
+
 def test_update_node(client):
     data1 = test_create_node(client)
     data2 = mock_node(id=data1["id"])
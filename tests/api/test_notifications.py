@@ -0,0 +1,135 @@
+import importlib
+import queue
+from uuid import uuid4
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from open_people_transport.crud.notifications import (
+    Change,
+    ChangeListener,
+    apply_changes,
+    rebuild_caches,
+)
+from open_people_transport.crud.versions import get_table_versions
+from open_people_transport.database.models import Node as SQLNode
+from open_people_transport.database.models import Stop as SQLStop
+from open_people_transport.spatial.index import get_stop_index
+from sqlalchemy import delete, insert, text
+from sqlalchemy.orm import sessionmaker
+
+migration = importlib.import_module(
+    "open_people_transport.database.migrations.versions."
+    "4d9a61c2b7e8_notify_table_changes"
+)
+
+
+def migrate(engine, step):
+    with engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            step()
+
+
+@pytest.fixture()
+def listener(session):
+    """
+    Listener to the testing database, with the triggers of the migration, along with
+    queues of the changes it applied and of its resets
+    """
+    engine = session.get_bind()
+    migrate(engine, migration.upgrade)
+    sessions = sessionmaker(bind=engine, future=True)
+    get_stop_index.cache_clear()
+    get_stop_index().build([])
+    applied, resets = queue.Queue(), queue.Queue()
+
+    def apply(changes):
+        apply_changes(changes, sessions)
+        applied.put(changes)
+
+    def reset():
+        rebuild_caches(sessions)
+        resets.put(True)
+
+    listener = ChangeListener(engine.url, apply, reset)
+    listener.RETRY_TIME = 0.5
+    listener.start()
+    try:
+        assert listener.listening.wait(5)
+        yield listener, applied, resets
+    finally:
+        listener.stop()
+        get_stop_index.cache_clear()
+        migrate(engine, migration.downgrade)
+
+
+def create_node(session, applied):
+    node_id = uuid4()
+    session.execute(insert(SQLNode).values(id=node_id, name="node"))
+    session.commit()
+    assert applied.get(timeout=5) == [Change("node", "INSERT", ((str(node_id),),))]
+    return node_id
+
+
+def stop_row(node_id, lat, lon):
+    return {
+        "id": uuid4(),
+        "node_id": node_id,
+        "location": f"SRID=4326;POINT({lon} {lat})",
+    }
+
+
+def nearby_stop_ids(lat, lon):
+    return [stop.id for stop in get_stop_index().within(lat, lon, 10, 100)]
+
+
+def test_notified_changes(session, listener):
+    _, applied, _ = listener
+    node_id = create_node(session, applied)
+    (version,) = get_table_versions().get(["stop"])
+    row = stop_row(node_id, 55.75, 37.6)
+    session.execute(insert(SQLStop).values(row))
+    session.commit()
+    assert applied.get(timeout=5) == [Change("stop", "INSERT", ((str(row["id"]),),))]
+    assert get_table_versions().get(["stop"]) == (version + 1,)
+    assert nearby_stop_ids(55.75, 37.6) == [row["id"]]
+    # Too many rows changed at once for their keys to be sent, so the index is rebuilt
+    rows = [stop_row(node_id, 55.76, 37.6 + i / 10_000) for i in range(60)]
+    session.execute(insert(SQLStop).values(rows))
+    session.commit()
+    (change,) = applied.get(timeout=5)
+    assert change.table == "stop" and change.keys is None
+    assert len(get_stop_index()) == 61
+    session.execute(delete(SQLStop).where(SQLStop.id == row["id"]))
+    session.commit()
+    assert applied.get(timeout=5) == [Change("stop", "DELETE", ((str(row["id"]),),))]
+    assert nearby_stop_ids(55.75, 37.6) == []
+    assert len(get_stop_index()) == 60
+
+
+def test_changes_after_reconnecting(session, listener):
+    listener, applied, resets = listener
+    node_id = create_node(session, applied)
+    session.execute(
+        text(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+            "WHERE query = 'LISTEN table_changes' AND pid <> pg_backend_pid()"
+        )
+    )
+    session.commit()
+    # Likely not heard of, and found again once the caches are rebuilt
+    missed = stop_row(node_id, 55.75, 37.6)
+    session.execute(insert(SQLStop).values(missed))
+    session.commit()
+    assert resets.get(timeout=5)
+    assert listener.listening.wait(5)
+    assert nearby_stop_ids(55.75, 37.6) == [missed["id"]]
+    row = stop_row(node_id, 55.76, 37.6)
+    session.execute(insert(SQLStop).values(row))
+    session.commit()
+    while (changes := applied.get(timeout=5)) != [
+        Change("stop", "INSERT", ((str(row["id"]),),))
+    ]:
+        # The missed stop, if it was heard of before the connection was closed
+        assert changes == [Change("stop", "INSERT", ((str(missed["id"]),),))]
+    assert nearby_stop_ids(55.76, 37.6) == [row["id"]]
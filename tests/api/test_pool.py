@@ -0,0 +1,61 @@
+import asyncio
+
+from open_people_transport.database import async_url
+from open_people_transport.database.pool import (
+    UnnamedStatementConnection,
+    engine_options,
+    limit_statements,
+)
+from open_people_transport.settings import Settings
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+
+def test_statement_timeout_per_transaction(session):
+    engine = create_engine(session.get_bind().url, future=True)
+    limit_statements(engine, Settings(pgbouncer=True, statement_timeout=1234))
+    try:
+        # Every transaction sets it anew, not only the first one of a checkout
+        with engine.connect() as connection:
+            for _ in range(3):
+                with connection.begin():
+                    timeout = connection.scalar(text("SHOW statement_timeout"))
+                    assert timeout == "1234ms"
+    finally:
+        engine.dispose()
+
+
+def test_pgbouncer_connect_args():
+    settings = Settings(pgbouncer=True, statement_timeout=1234)
+    assert engine_options(settings, asynchronous=True)["connect_args"] == {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "connection_class": UnnamedStatementConnection,
+    }
+    assert "connect_args" not in engine_options(settings)
+
+
+def test_pgbouncer_unnamed_statements(session):
+    connect_args = engine_options(Settings(pgbouncer=True), asynchronous=True)[
+        "connect_args"
+    ]
+    engine = create_async_engine(
+        async_url(session.get_bind().url),
+        poolclass=NullPool,
+        connect_args=connect_args,
+        future=True,
+    )
+
+    async def prepared_statements():
+        async with engine.connect() as connection:
+            for i in range(3):
+                assert await connection.scalar(text(f"SELECT {i}")) == i
+            statement = text("SELECT count(*) FROM pg_prepared_statements")
+            return await connection.scalar(statement)
+
+    try:
+        # None is left on the server connection for the next client to run into
+        assert asyncio.run(prepared_statements()) == 0
+    finally:
+        asyncio.run(engine.dispose())
@@ -1,7 +1,11 @@
 import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from uuid_extensions import uuid7
 
+from .test_nodes import test_create_node
 from .test_routes import test_create_route
-from .test_stops import test_create_stop
+from .test_stops import mock_stop, read_lines, test_create_stop
 
 
 def mock_route_stop(route, stop):
@@ -50,6 +54,162 @@ def test_read_route_stops(client):
     assert response.status_code == 200 and response.json() == [data1, data2]
 
 
+def test_read_route_stops_paginated(client):
+    route = test_create_route(client)
+    data = [test_create_route_stop(client, route) for _ in range(3)]
+    response = client.get(f"/routes/{route['id']}/stops/", params={"limit": 2})
+    assert response.status_code == 200 and response.json() == data[:2]
+    response = client.get(response.links["next"]["url"])
+    assert response.status_code == 200 and response.json() == data[2:]
+    assert "next" not in response.links
+
+
+def test_read_route_stops_streamed(client):
+    route = test_create_route(client)
+    url = f"/routes/{route['id']}/stops/"
+    assert read_lines(client, url) == []
+    data = [test_create_route_stop(client, route) for _ in range(3)]
+    assert read_lines(client, url) == data
+    assert read_lines(client, url, params={"after": data[0]["distance"]}) == data[1:]
+
+
+def insert_route_stop(client, route, after=None):
+    stop = test_create_stop(client)
+    params = {"after_stop": after} if after else {}
+    response = client.put(f"/routes/{route['id']}/stops/{stop['id']}", params=params)
+    assert response.status_code == 200
+    return stop["id"]
+
+
+def read_route_stop_ids(client, route):
+    response = client.get(f"/routes/{route['id']}/stops/")
+    assert response.status_code == 200
+    distances = [data["distance"] for data in response.json()]
+    assert len(set(distances)) == len(distances)
+    return [data["stop_id"] for data in response.json()]
+
+
+def test_insert_route_stops_after_first(client):
+    route = test_create_route(client)
+    first = insert_route_stop(client, route)
+    inserted = [insert_route_stop(client, route, first) for _ in range(30)]
+    assert read_route_stop_ids(client, route) == [first] + inserted[::-1]
+
+
+def test_insert_route_stops_after_each_other(client):
+    route = test_create_route(client)
+    first = insert_route_stop(client, route)
+    last = insert_route_stop(client, route)
+    expected = [first]
+    for _ in range(30):
+        expected.append(insert_route_stop(client, route, expected[-1]))
+    assert read_route_stop_ids(client, route) == expected + [last]
+
+
+def test_move_route_stop(client):
+    route = test_create_route(client)
+    stops = [insert_route_stop(client, route) for _ in range(3)]
+    url = f"/routes/{route['id']}/stops/{stops[2]}"
+    response = client.put(url, params={"after_stop": stops[0]})
+    assert response.status_code == 200
+    assert read_route_stop_ids(client, route) == [stops[0], stops[2], stops[1]]
+    response = client.put(url, params={"after_stop": str(uuid7())})
+    assert response.status_code == 404
+
+
+def test_replace_route_stops(client):
+    route = test_create_route(client)
+    stops = [test_create_stop(client)["id"] for _ in range(3)]
+    url = f"/routes/{route['id']}/stops/"
+    response = client.put(url, json=stops)
+    assert response.status_code == 200
+    assert [data["stop_id"] for data in response.json()] == stops
+    response = client.put(url, json=[stops[2], stops[0]])
+    assert response.status_code == 200
+    assert [data["stop_id"] for data in response.json()] == [stops[2], stops[0]]
+    response = client.get(url)
+    assert [data["stop_id"] for data in response.json()] == [stops[2], stops[0]]
+
+
+def test_replace_route_stops_locks_route(client):
+    route = test_create_route(client)
+    stop = test_create_stop(client)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.put(f"/routes/{route['id']}/stops/", json=[stop["id"]])
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    assert any(
+        statement.startswith("SELECT route.id") and "FOR UPDATE" in statement
+        for statement in statements
+    )
+
+
+def test_replace_route_stops_invalid(client):
+    route = test_create_route(client)
+    stop = test_create_stop(client)
+    data = test_create_route_stop(client, route, stop)
+    url = f"/routes/{route['id']}/stops/"
+    response = client.put(url, json=[stop["id"], stop["id"]])
+    assert response.status_code == 409
+    response = client.put(url, json=[str(uuid7())])
+    assert response.status_code == 404
+    response = client.put(f"/routes/{uuid7()}/stops/", json=[stop["id"]])
+    assert response.status_code == 404
+    response = client.get(url)
+    assert response.status_code == 200 and response.json() == [data]
+
+
+def test_route_stop_distances(client):
+    route = test_create_route(client)
+    node = test_create_node(client)
+    stops = [mock_stop(node) | {"lat": 55.75, "lon": 37.6 + i / 100} for i in range(3)]
+    for stop in stops:
+        assert client.put("/stops/", json=stop).status_code == 200
+    url = f"/routes/{route['id']}/stops/"
+    response = client.put(url, json=[stop["id"] for stop in stops])
+    assert response.status_code == 200
+    # 0.01 degrees of longitude at 55.75 degrees of latitude
+    assert [data["distance"] for data in response.json()] == [0, 626, 1252]
+    stops[1]["lat"] = 55.76
+    assert client.put("/stops/", json=stops[1]).status_code == 200
+    response = client.get(url)
+    assert [data["distance"] for data in response.json()] == [0, 1276, 2552]
+    response = client.delete(url + stops[1]["id"])
+    assert response.status_code == 200
+    response = client.get(url)
+    assert [data["distance"] for data in response.json()] == [0, 1252]
+
+
+def test_route_stop_distances_close_together(client):
+    route = test_create_route(client)
+    node = test_create_node(client)
+    # 0.00001 degrees of longitude are 0.63 meters, so consecutive stops are one
+    # meter apart and inserting between them renumbers the route
+    stops = [
+        mock_stop(node) | {"lat": 55.75, "lon": 37.6 + i / 100_000} for i in range(4)
+    ]
+    for stop in stops:
+        assert client.put("/stops/", json=stop).status_code == 200
+    url = f"/routes/{route['id']}/stops/"
+    response = client.put(url, json=[stops[0]["id"], stops[2]["id"], stops[3]["id"]])
+    assert response.status_code == 200
+    assert [data["distance"] for data in response.json()] == [0, 1, 2]
+    response = client.put(url + stops[1]["id"], params={"after_stop": stops[0]["id"]})
+    assert response.status_code == 200
+    response = client.get(url)
+    assert [data["stop_id"] for data in response.json()] == [
+        stop["id"] for stop in stops
+    ]
+    assert [data["distance"] for data in response.json()] == [0, 1, 2, 3]
+
+
 @pytest.mark.skip(reason="/stops/.../routes/ endpoint not yet implemented")
 def test_read_stop_routes(client):
     stop = test_create_stop(client)
@@ -52,6 +52,17 @@ def test_read_routes(client):
     assert response.status_code == 200 and response.json() == [data1, data2]
 
 
+def test_read_routes_paginated(client):
+    data = sorted(
+        (test_create_route(client) for _ in range(3)), key=lambda route: route["id"]
+    )
+    response = client.get(URL, params={"limit": 2})
+    assert response.status_code == 200 and response.json() == data[:2]
+    response = client.get(response.links["next"]["url"])
+    assert response.status_code == 200 and response.json() == data[2:]
+    assert "next" not in response.links
+
+
 def test_update_route(client):
     data1 = test_create_route(client)
     type2 = test_create_type(client)
@@ -62,6 +73,15 @@ def test_update_route(client):
     assert response.status_code == 200 and response.json() == [data2]
 
 
+def test_update_route_unknown_type(client):
+    data1 = test_create_route(client)
+    data2 = mock_route({"name": "unknown"}, id=data1["id"])
+    response = client.put(URL, json=data2)
+    assert response.status_code == 409
+    response = client.get(URL)
+    assert response.status_code == 200 and response.json() == [data1]
+
+
 def test_delete_route(client):
     data = test_create_route(client)
     response = client.delete(URL + data["id"])
@@ -1,6 +1,9 @@
+import json
 import random
 from uuid import UUID
 
+from open_people_transport.crud.services import StopService
+from open_people_transport.spatial.index import get_stop_index
 from uuid_extensions import uuid7
 
 from .test_nodes import test_create_node
@@ -52,6 +55,77 @@ def test_read_stops(client):
     assert response.status_code == 200 and response.json() == [data1, data2]
 
 
+def read_lines(client, url, **kwargs):
+    headers = {"Accept": "application/x-ndjson"}
+    response = client.get(url, headers=headers, **kwargs)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_read_stops_streamed(client):
+    assert read_lines(client, URL) == []
+    data = [test_create_stop(client) for _ in range(3)]
+    # A cached JSON response is not served to clients asking for a stream
+    assert client.get(URL).json() == data
+    assert read_lines(client, URL) == data
+    data.sort(key=lambda stop: stop["id"])
+    assert read_lines(client, URL, params={"limit": 2}) == data[:2]
+
+
+def test_read_stops_paginated(client):
+    data = sorted(
+        (test_create_stop(client) for _ in range(3)), key=lambda stop: stop["id"]
+    )
+    response = client.get(URL, params={"limit": 2})
+    assert response.status_code == 200 and response.json() == data[:2]
+    response = client.get(response.links["next"]["url"])
+    assert response.status_code == 200 and response.json() == data[2:]
+    assert "next" not in response.links
+
+
+def test_read_nearby_stops(client):
+    node = test_create_node(client)
+    near, far, outside = (
+        mock_stop(node) | {"lat": 10.0, "lon": lon} for lon in (10.001, 10.002, 10.01)
+    )
+    for data in (outside, far, near):
+        assert client.put(URL, json=data).status_code == 200
+    response = client.get(
+        URL + "nearby", params={"lat": 10.0, "lon": 10.0, "radius": 500}
+    )
+    assert response.status_code == 200
+    json = response.json()
+    distances = [stop.pop("distance") for stop in json]
+    assert json == [near, far]
+    assert 100 < distances[0] < 120 and 210 < distances[1] < 230
+
+
+def test_read_nearby_stops_indexed(client, session):
+    node = test_create_node(client)
+    near, far, outside = (
+        mock_stop(node) | {"lat": 10.0, "lon": lon} for lon in (10.001, 10.002, 10.01)
+    )
+    for data in (outside, near):
+        assert client.put(URL, json=data).status_code == 200
+    index = get_stop_index()
+    index.build(StopService(session).list())
+    # Stops written from now on are added to and removed from the index as they are
+    assert client.put(URL, json=far).status_code == 200
+    params = {"lat": 10.0, "lon": 10.0, "radius": 500}
+    response = client.get(URL + "nearby", params=params)
+    assert response.status_code == 200
+    json = response.json()
+    distances = [stop.pop("distance") for stop in json]
+    assert json == [near, far]
+    assert 100 < distances[0] < 120 and 210 < distances[1] < 230
+    assert client.delete(URL + near["id"]).status_code == 200
+    response = client.get(URL + "nearby", params=params)
+    assert response.status_code == 200
+    assert [stop["id"] for stop in response.json()] == [far["id"]]
+    assert len(index) == 2
+
+
 def test_update_stop(client):
     data1 = test_create_stop(client)
     node2 = test_create_node(client)
@@ -62,9 +136,54 @@ def test_update_stop(client):
     assert response.status_code == 200 and response.json() == [data2]
 
 
+def test_create_stop_conflict(client):
+    data1 = test_create_stop(client)
+    data2 = mock_stop({"id": data1["node_id"]}) | {
+        "lat": data1["lat"],
+        "lon": data1["lon"],
+    }
+    response = client.put(URL, json=data2)
+    assert response.status_code == 409
+    response = client.get(URL)
+    assert response.status_code == 200 and response.json() == [data1]
+
+
 def test_delete_stop(client):
     data = test_create_stop(client)
     response = client.delete(URL + data["id"])
     assert response.status_code == 200 and response.json() == None
     response = client.get(URL)
     assert response.status_code == 200 and response.json() == []
+
+
+def read_transfer_stop_ids(client, stop):
+    response = client.get(URL + stop["id"] + "/transfers")
+    assert response.status_code == 200
+    return [transfer["to_stop_id"] for transfer in response.json()]
+
+
+def test_read_stop_transfers(client):
+    node = test_create_node(client)
+    # 0.001 and 0.002 degrees of longitude on the equator are 111 and 222 meters
+    stops = [mock_stop(node) | {"lat": 0.0, "lon": lon} for lon in (0, 0.001, 0.002)]
+    for data in stops:
+        assert client.put(URL, json=data).status_code == 200
+    response = client.get(URL + stops[0]["id"] + "/transfers")
+    assert response.status_code == 200
+    json = response.json()
+    assert [transfer["to_stop_id"] for transfer in json] == [
+        stops[1]["id"],
+        stops[2]["id"],
+    ]
+    distances = [transfer["distance"] for transfer in json]
+    assert 110 <= distances[0] <= 112 and 221 <= distances[1] <= 224
+    assert read_transfer_stop_ids(client, stops[2]) == [stops[1]["id"], stops[0]["id"]]
+    stops[2]["lon"] = 0.01
+    assert client.put(URL, json=stops[2]).status_code == 200
+    assert read_transfer_stop_ids(client, stops[0]) == [stops[1]["id"]]
+    assert read_transfer_stop_ids(client, stops[2]) == []
+    response = client.delete(URL + stops[1]["id"])
+    assert response.status_code == 200
+    assert read_transfer_stop_ids(client, stops[0]) == []
+    response = client.get(URL + stops[1]["id"] + "/transfers")
+    assert response.status_code == 404
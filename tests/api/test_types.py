@@ -17,6 +17,12 @@ def test_create_type(client):
     return data
 
 
+def test_create_type_conflict(client):
+    data = test_create_type(client)
+    response = client.put(URL, json=data)
+    assert response.status_code == 409
+
+
 def test_read_type(client):
     data = test_create_type(client)
     response = client.get(URL + data["name"])
@@ -34,6 +40,43 @@ def test_read_types(client):
     assert response.status_code == 200 and response.json() == [data1, data2]
 
 
+def test_read_types_paginated(client):
+    # Lowercase only, which every collation the database may have orders alike
+    names = sorted(mock_type()["name"].lower() for _ in range(3))
+    data = [{"name": name} for name in names]
+    for type in data:
+        assert client.put(URL, json=type).status_code == 200
+    response = client.get(URL, params={"limit": 2})
+    assert response.status_code == 200 and response.json() == data[:2]
+    response = client.get(response.links["next"]["url"])
+    assert response.status_code == 200 and response.json() == data[2:]
+    assert "next" not in response.links
+
+
+def test_read_types_not_modified(client):
+    test_create_type(client)
+    response = client.get(URL)
+    etag = response.headers["ETag"]
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["ETag"] == etag
+    data = test_create_type(client)
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert data in response.json()
+
+
+def test_read_type_cached(client):
+    data = test_create_type(client)
+    assert client.get(URL + data["name"]).json() == data
+    assert client.get(URL + data["name"]).json() == data
+    statistics = client.get("/admin/caches").json()["reference"]
+    assert statistics["hits"] >= 1 and statistics["size"] >= 1
+    data2 = mock_type()
+    assert client.put(URL + data["name"], json=data2).status_code == 200
+    assert client.get(URL + data["name"]).status_code == 404
+    assert client.get(URL + data2["name"]).json() == data2
+
+
 def test_update_type(client):
     data1 = test_create_type(client)
     data2 = mock_type()
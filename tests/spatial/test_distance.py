@@ -0,0 +1,49 @@
+import numpy as np
+from open_people_transport.spatial.distance import (
+    along_shape,
+    haversine_steps,
+    positions,
+    route_distances,
+)
+from open_people_transport.spatial.geodesy import METERS_PER_DEGREE, haversine
+
+
+def test_haversine_steps():
+    lats, lons = np.array([55.75, 55.75, 55.76]), np.array([37.6, 37.61, 37.61])
+    steps = haversine_steps(lats, lons)
+    assert np.allclose(
+        steps, [haversine(55.75, 37.6, 55.75, 37.61), 0.01 * METERS_PER_DEGREE]
+    )
+
+
+def test_route_distances():
+    lats, lons = np.zeros(3), np.array([0, 0.001, 0.003])
+    expected = np.array([0, 0.001, 0.003]) * METERS_PER_DEGREE
+    assert np.allclose(route_distances(lats, lons), expected)
+    assert len(route_distances(np.zeros(0), np.zeros(0))) == 0
+
+
+def test_along_shape():
+    # An L-shaped road east and then north, with stops a little off it
+    shape = (np.array([0, 0, 0.002]), np.array([0, 0.002, 0.002]))
+    lats, lons = np.array([-0.00001, -0.00001, 0.001]), np.array([0.0005, 0.002, 0.002])
+    distances = along_shape(lats, lons, shape)
+    expected = np.array([0.0005, 0.002, 0.003]) * METERS_PER_DEGREE
+    assert np.allclose(distances, expected, atol=0.5)
+    measured = route_distances(lats, lons, shape)
+    assert np.allclose(measured, expected - expected[0], atol=0.5)
+
+
+def test_along_shape_loop():
+    # Out and back along the same street: the same place is passed twice, and the
+    # stop served on the way back is matched to the second pass
+    shape = (np.zeros(3), np.array([0, 0.002, 0]))
+    lats, lons = np.zeros(3), np.array([0.001, 0.002, 0.001])
+    distances = along_shape(lats, lons, shape)
+    expected = np.array([0.001, 0.002, 0.003]) * METERS_PER_DEGREE
+    assert np.allclose(distances, expected, atol=0.5)
+
+
+def test_positions():
+    assert positions(np.array([0, 0.4, 0.6, 1.2, 10.4])).tolist() == [0, 1, 2, 3, 10]
+    assert positions(np.array([0, 5.0]), 100).tolist() == [100, 105]
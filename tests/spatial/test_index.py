@@ -0,0 +1,113 @@
+from uuid import uuid4
+
+from open_people_transport.core.models import Stop
+from open_people_transport.spatial.index import StopIndex
+
+NODE_ID = uuid4()
+
+
+def stop(lat, lon, id=None):
+    return Stop(id=id or uuid4(), node_id=NODE_ID, lat=lat, lon=lon)
+
+
+def ids(stops):
+    return [stop.id for stop in stops]
+
+
+def test_within():
+    index = StopIndex(0.01)
+    # 0.001 and 0.002 degrees of longitude on the equator are 111 and 222 meters
+    near, far, outside = stop(0, 0.001), stop(0, 0.002), stop(0, 0.01)
+    index.build([outside, far, near])
+    found = index.within(0, 0, 500, 20)
+    assert ids(found) == [near.id, far.id]
+    assert 110 < found[0].distance < 112 and 221 < found[1].distance < 224
+    assert ids(index.within(0, 0, 500, 1)) == [near.id]
+    assert index.within(10, 10, 500, 20) == []
+
+
+def test_within_across_cells():
+    index = StopIndex(0.001)
+    stops = [stop(0, 0.0005 * i) for i in range(-6, 7)]
+    index.build(stops)
+    found = index.within(0, 0, 200, 20)
+    assert sorted(ids(found)) == sorted(ids(stops[3:10]))
+
+
+def test_nearest():
+    index = StopIndex(0.01)
+    near, far, farther = stop(0, 0.5), stop(0, 1), stop(0, 2)
+    index.build([farther, far, near])
+    assert ids(index.nearest(0, 0, 2)) == [near.id, far.id]
+    assert ids(index.nearest(0, 0, 5)) == [near.id, far.id, farther.id]
+    assert StopIndex(0.01).nearest(0, 0, 5) == []
+
+
+def test_bbox():
+    index = StopIndex(0.01)
+    inside, north, west = stop(10, 10), stop(10.2, 10), stop(10, 9.8)
+    index.build([inside, north, west])
+    assert ids(index.bbox(9.9, 9.9, 10.1, 10.1)) == [inside.id]
+    assert sorted(ids(index.bbox(9.9, 9.7, 10.3, 10.1))) == sorted(
+        ids([inside, north, west])
+    )
+
+
+def test_antimeridian():
+    index = StopIndex(0.01)
+    east, west, elsewhere = stop(0, 179.9995), stop(0, -179.9995), stop(0, 0)
+    index.build([east, west, elsewhere])
+    found = index.within(0, 179.9999, 500, 20)
+    assert ids(found) == [east.id, west.id]
+    assert sorted(ids(index.bbox(-1, 179.9, 1, -179.9))) == sorted(ids([east, west]))
+    assert ids(index.bbox(-1, -1, 1, 1)) == [elsewhere.id]
+
+
+def test_add_and_remove():
+    index = StopIndex(0.01)
+    first, second = stop(0, 0), stop(0, 0.001)
+    index.build([first])
+    index.add(second)
+    assert ids(index.within(0, 0, 500, 20)) == [first.id, second.id]
+    index.remove(first.id)
+    assert ids(index.within(0, 0, 500, 20)) == [second.id]
+    assert len(index) == 1
+    index.remove(first.id)
+    assert len(index) == 1
+
+
+def test_move():
+    index = StopIndex(0.01)
+    moved = stop(0, 0)
+    index.build([moved])
+    index.add(stop(10, 10, id=moved.id))
+    assert index.within(0, 0, 500, 20) == []
+    assert ids(index.within(10, 10, 500, 20)) == [moved.id]
+    assert len(index) == 1
+
+
+def test_slot_reuse():
+    index = StopIndex(0.01)
+    stops = [stop(0, 0.001 * i) for i in range(3)]
+    index.build(stops)
+    index.remove(stops[1].id)
+    added = stop(0, 0.0015)
+    index.add(added)
+    # The slot of the removed stop is taken over rather than a new one appended
+    assert len(index._ids) == 3 and len(index) == 3
+    found = index.within(0, 0.0015, 10, 20)
+    assert ids(found) == [added.id]
+    assert found[0].lat == 0 and float(found[0].lon) == 0.0015
+
+
+def test_pairs():
+    index = StopIndex(0.001)
+    # 0.001 degrees of longitude on the equator are 111 meters
+    stops = [stop(0, 0.001 * i) for i in range(4)]
+    index.build(stops)
+    pairs = {(a, b): distance for a, b, distance in index.pairs(150)}
+    expected = {(a.id, b.id) for a, b in zip(stops, stops[1:])}
+    assert set(pairs) == expected | {(b, a) for a, b in expected}
+    for (a, b), distance in pairs.items():
+        assert distance == pairs[b, a] and 111 < distance < 112
+    assert list(StopIndex(0.001).pairs(150)) == []